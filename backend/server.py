@@ -1,9 +1,13 @@
 
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, UploadFile, File, Form, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne, UpdateOne, DeleteOne, ReplaceOne, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from bson import ObjectId
+from bson.errors import InvalidId
 import os
 import logging
 import asyncio
@@ -11,15 +15,30 @@ from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone, timedelta
+import time
+import json
+import base64
+import bisect
+import hashlib
+from datetime import datetime, timezone, timedelta, time as dt_time
 import httpx
 import csv
 import io
 import re
 from openpyxl import load_workbook
-from tradingview_ta import TA_Handler, Interval
+from tradingview_ta import TA_Handler, Interval, get_multiple_analysis
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import importlib.util
+from collections import OrderedDict, deque
 from bs4 import BeautifulSoup
-import requests
+import numpy as np
+import orjson
+
+try:
+    import msgpack  # optional: enables application/msgpack responses
+except ImportError:
+    msgpack = None
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -47,12 +66,305 @@ db = client[os.environ['DB_NAME']]
 ALPHA_VANTAGE_KEY = os.environ.get('ALPHA_VANTAGE_KEY', 'demo')
 ALPHA_VANTAGE_BASE = "https://www.alphavantage.co/query"
 
+# Quote cache config (seconds)
+QUOTE_CACHE_TTL = float(os.environ.get('QUOTE_CACHE_TTL', '60'))
+QUOTE_CACHE_STALE_TTL = float(os.environ.get('QUOTE_CACHE_STALE_TTL', '900'))
+QUOTE_CACHE_NEGATIVE_TTL = float(os.environ.get('QUOTE_CACHE_NEGATIVE_TTL', '30'))
+# Batched quote fetching
+QUOTE_BATCH_SIZE = int(os.environ.get('QUOTE_BATCH_SIZE', '20'))  # symbols per Yahoo spark request
+QUOTE_FETCH_CONCURRENCY = int(os.environ.get('QUOTE_FETCH_CONCURRENCY', '8'))
+# Quote provider chain: overall deadline, hedging and circuit breakers
+QUOTE_REQUEST_DEADLINE = float(os.environ.get('QUOTE_REQUEST_DEADLINE', '8'))
+QUOTE_HEDGE_PERCENTILE = float(os.environ.get('QUOTE_HEDGE_PERCENTILE', '0.9'))
+QUOTE_HEDGE_DEFAULT_DELAY = float(os.environ.get('QUOTE_HEDGE_DEFAULT_DELAY', '1.5'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get('CIRCUIT_RESET_TIMEOUT', '30'))
+
+# Thread pool for blocking provider calls (tradingview_ta, requests, sync httpx)
+BLOCKING_IO_WORKERS = int(os.environ.get('BLOCKING_IO_WORKERS', '16'))
+
+# Shared upstream HTTP clients
+HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('HTTP_KEEPALIVE_EXPIRY', '30'))
+HTTP2_ENABLED = os.environ.get('HTTP2_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+# Background market data ingestion (B3 trading hours, America/Sao_Paulo)
+MARKET_INGEST_ENABLED = os.environ.get('MARKET_INGEST_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+MARKET_INGEST_INTERVAL = float(os.environ.get('MARKET_INGEST_INTERVAL', '60'))
+B3_SESSION_OPEN = dt_time(9, 55)
+B3_SESSION_CLOSE = dt_time(18, 30)  # after the closing call, so the official close is captured
+
+# Daily price history (backfilled from Yahoo's chart API, then appended)
+PRICE_HISTORY_ENABLED = os.environ.get('PRICE_HISTORY_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+PRICE_HISTORY_SYNC_INTERVAL = float(os.environ.get('PRICE_HISTORY_SYNC_INTERVAL', '21600'))
+PRICE_HISTORY_CONCURRENCY = int(os.environ.get('PRICE_HISTORY_CONCURRENCY', '4'))
+
+# Shared dividend events catalog (Investidor10 scraped once per ticker per day)
+DIVIDEND_CATALOG_ENABLED = os.environ.get('DIVIDEND_CATALOG_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+DIVIDEND_CATALOG_CHECK_INTERVAL = float(os.environ.get('DIVIDEND_CATALOG_CHECK_INTERVAL', '3600'))
+DIVIDEND_CATALOG_RETRY_INTERVAL = float(os.environ.get('DIVIDEND_CATALOG_RETRY_INTERVAL', '3600'))
+DIVIDEND_CATALOG_CONCURRENCY = int(os.environ.get('DIVIDEND_CATALOG_CONCURRENCY', '5'))
+
+# Lot edits queue a per-(user, portfolio, ticker) dividend resync, run after this quiet period
+DIVIDEND_RESYNC_DEBOUNCE = float(os.environ.get('DIVIDEND_RESYNC_DEBOUNCE', '2'))
+DIVIDEND_RESYNC_CONCURRENCY = int(os.environ.get('DIVIDEND_RESYNC_CONCURRENCY', '4'))
+
+# Summary snapshots are buffered and upserted in the background
+SNAPSHOT_FLUSH_INTERVAL = float(os.environ.get('SNAPSHOT_FLUSH_INTERVAL', '30'))
+
+# Computed portfolio state cache (approximate serialized bytes)
+PORTFOLIO_CACHE_MAX_BYTES = int(os.environ.get('PORTFOLIO_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# Listing endpoints: max page size and how many documents are encoded per streamed chunk
+LISTING_MAX_LIMIT = int(os.environ.get('LISTING_MAX_LIMIT', '1000'))
+LISTING_BATCH_SIZE = int(os.environ.get('LISTING_BATCH_SIZE', '500'))
+
+# Data version documents (ETags, computed-state cache keys) are cached per worker this long
+DATA_VERSION_CACHE_TTL = float(os.environ.get('DATA_VERSION_CACHE_TTL', '2'))
+
+# Server-push channel (SSE): heartbeat/version check interval, per-connection queue, client retry
+PUSH_HEARTBEAT_INTERVAL = float(os.environ.get('PUSH_HEARTBEAT_INTERVAL', '15'))
+PUSH_QUEUE_SIZE = int(os.environ.get('PUSH_QUEUE_SIZE', '256'))
+PUSH_RETRY_MS = int(os.environ.get('PUSH_RETRY_MS', '5000'))
+
+# Worker identity for scheduler leases (only one worker runs each periodic job)
+WORKER_ID = f"worker_{uuid.uuid4().hex[:8]}"
+
+# Session -> user cache (other workers only see a logout once their entry expires)
+SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', '120'))
+SESSION_CACHE_MAX_ENTRIES = int(os.environ.get('SESSION_CACHE_MAX_ENTRIES', '10000'))
+
+# Admin endpoints (disabled when no token is configured)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
 api_router = APIRouter(prefix="/api")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# ==================== BLOCKING IO EXECUTOR ====================
+
+class BlockingExecutor:
+    """
+    Dedicated, bounded thread pool for synchronous provider calls so a slow upstream
+    never blocks the event loop. Tracks how many calls are waiting for a free worker.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="provider-io")
+        self._lock = threading.Lock()
+        self.queued = 0  # submitted, waiting for a worker
+        self.running = 0
+        self.stats = {"submitted": 0, "completed": 0, "errors": 0, "max_queue_depth": 0}
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool and await its result"""
+        with self._lock:
+            self.queued += 1
+            self.stats["submitted"] += 1
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queued)
+        
+        def call():
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+            try:
+                return fn(*args)
+            except Exception:
+                with self._lock:
+                    self.stats["errors"] += 1
+                raise
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.stats["completed"] += 1
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, call)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "max_workers": self.max_workers,
+            "queue_depth": self.queued,
+            "running": self.running,
+        }
+
+
+blocking_executor = BlockingExecutor(BLOCKING_IO_WORKERS)
+
+
+async def run_blocking(fn, *args):
+    """Run a blocking provider call on the bounded executor"""
+    return await blocking_executor.run(fn, *args)
+
+# ==================== SHARED HTTP CLIENTS ====================
+
+BROWSER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# Per-provider timeouts (seconds), overridable with <PROVIDER>_TIMEOUT / <PROVIDER>_CONNECT_TIMEOUT
+HTTP_PROVIDER_TIMEOUTS = {
+    "yahoo": (30.0, 10.0),
+    "alpha_vantage": (30.0, 10.0),
+    "investidor10": (15.0, 10.0),
+    "auth": (10.0, 5.0),
+}
+
+
+class HttpClientPool:
+    """
+    One long-lived httpx client per upstream provider, so TLS sessions and keep-alive
+    connections survive across requests. Async clients serve the event loop; sync
+    clients serve scrapers running on the blocking executor.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._sync_clients = {}
+        self._lock = threading.Lock()
+        self.http2 = HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+        if HTTP2_ENABLED and not self.http2:
+            logger.warning("HTTP2_ENABLED is set but the 'h2' package is not installed - using HTTP/1.1")
+
+    def _options(self, provider: str) -> dict:
+        read_timeout, connect_timeout = HTTP_PROVIDER_TIMEOUTS.get(provider, (15.0, 10.0))
+        env_prefix = provider.upper()
+        read_timeout = float(os.environ.get(f"{env_prefix}_TIMEOUT", read_timeout))
+        connect_timeout = float(os.environ.get(f"{env_prefix}_CONNECT_TIMEOUT", connect_timeout))
+        return {
+            "timeout": httpx.Timeout(read_timeout, connect=connect_timeout),
+            "limits": httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            "headers": {"User-Agent": BROWSER_USER_AGENT},
+            "follow_redirects": True,
+            "http2": self.http2,
+        }
+
+    def get(self, provider: str) -> httpx.AsyncClient:
+        http_client = self._clients.get(provider)
+        if http_client is None or http_client.is_closed:
+            http_client = httpx.AsyncClient(**self._options(provider))
+            self._clients[provider] = http_client
+        return http_client
+
+    def get_sync(self, provider: str) -> httpx.Client:
+        with self._lock:
+            http_client = self._sync_clients.get(provider)
+            if http_client is None or http_client.is_closed:
+                http_client = httpx.Client(**self._options(provider))
+                self._sync_clients[provider] = http_client
+            return http_client
+
+    def start(self):
+        for provider in HTTP_PROVIDER_TIMEOUTS:
+            self.get(provider)
+
+    async def aclose(self):
+        for http_client in self._clients.values():
+            await http_client.aclose()
+        with self._lock:
+            for http_client in self._sync_clients.values():
+                http_client.close()
+        self._clients.clear()
+        self._sync_clients.clear()
+
+    @staticmethod
+    def _pool_stats(http_client) -> dict:
+        # httpcore does not expose counters, so derive them from the connection list
+        pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        return {
+            "connections": len(connections),
+            "idle": sum(1 for c in connections if c.is_idle()),
+            "active": sum(1 for c in connections if not c.is_idle() and not c.is_closed()),
+            "pending_requests": len(getattr(pool, "_requests", []) or []),
+        }
+
+    def snapshot(self) -> dict:
+        stats = {"http2": self.http2, "max_connections": HTTP_MAX_CONNECTIONS, "providers": {}}
+        for provider, http_client in self._clients.items():
+            stats["providers"][provider] = self._pool_stats(http_client)
+        for provider, http_client in list(self._sync_clients.items()):
+            stats["providers"][f"{provider}_sync"] = self._pool_stats(http_client)
+        return stats
+
+
+http_clients = HttpClientPool()
+
+# ==================== RESPONSE ENCODING ====================
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _encode_default(value):
+    """Values found in Mongo documents and computed views that the encoders don't handle natively"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):  # orjson handles these itself; msgpack doesn't
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def dumps_json(content) -> bytes:
+    return orjson.dumps(content, default=_encode_default, option=ORJSON_OPTIONS)
+
+
+def dumps_msgpack(content) -> bytes:
+    return msgpack.packb(content, default=_encode_default, use_bin_type=True)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; default response class of the API router"""
+    
+    def render(self, content) -> bytes:
+        return dumps_json(content)
+
+
+class MsgPackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPES[0]
+    
+    def render(self, content) -> bytes:
+        return dumps_msgpack(content)
+
+
+def wants_msgpack(request: Request) -> bool:
+    if msgpack is None:
+        return False
+    accept = request.headers.get("accept", "")
+    return any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def encoded_response(request: Request, content, response: Optional[Response] = None) -> Response:
+    """
+    Serialize straight from the returned documents (FastAPI's jsonable_encoder pass is skipped),
+    as MessagePack when the client asks for it. Headers already set on the injected `response`
+    (ETag, X-Cache) are carried over.
+    """
+    headers = {}
+    if response is not None:
+        headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "content-type")}
+    headers["Vary"] = "Accept"
+    response_class = MsgPackResponse if wants_msgpack(request) else FastJSONResponse
+    return response_class(content, headers=headers)
+
 # ==================== HELPER FUNCTIONS ====================
 
 def detect_asset_type(ticker: str) -> str:
@@ -89,13 +401,14 @@ def detect_asset_type_from_investidor10(ticker: str) -> dict:
     Detect asset type and sector by checking if ticker exists on Investidor10.
     Checks both https://investidor10.com.br/acoes/ and https://investidor10.com.br/fiis/
     Returns dict with asset_type, name, sector, and source.
+    Blocking: call it through run_blocking() from async code.
     """
     ticker = ticker.upper().strip()
     
     # Try stocks first
     try:
         url_acao = f"https://investidor10.com.br/acoes/{ticker.lower()}/"
-        response = httpx.get(url_acao, timeout=10.0, follow_redirects=True)
+        response = http_clients.get_sync("investidor10").get(url_acao, timeout=10.0)
         
         # Only consider valid if status is 200 (not 410 or other errors)
         if response.status_code == 200:
@@ -138,7 +451,7 @@ def detect_asset_type_from_investidor10(ticker: str) -> dict:
     # Try FIIs
     try:
         url_fii = f"https://investidor10.com.br/fiis/{ticker.lower()}/"
-        response = httpx.get(url_fii, timeout=10.0, follow_redirects=True)
+        response = http_clients.get_sync("investidor10").get(url_fii, timeout=10.0)
         
         # Only consider valid if status is 200
         if response.status_code == 200:
@@ -348,6 +661,64 @@ class AnalysisRequest(BaseModel):
 
 # ==================== AUTH HELPERS ====================
 
+class SessionCache:
+    """
+    In-process session_token -> User cache so authenticated requests skip MongoDB.
+    An entry lives at most `ttl` seconds and never past the session's expires_at.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # session_token -> (User, valid_until)
+        self._tokens_by_user = {}  # user_id -> {session_token}
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, session_token: str) -> Optional[User]:
+        entry = self._entries.get(session_token)
+        if entry:
+            user, valid_until = entry
+            if time.time() < valid_until:
+                self.stats["hits"] += 1
+                return user
+            self._drop(session_token)
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, session_token: str, user: User, expires_at: datetime):
+        valid_until = min(time.time() + self.ttl, expires_at.timestamp())
+        self._drop(session_token)
+        self._entries[session_token] = (user, valid_until)
+        self._tokens_by_user.setdefault(user.user_id, set()).add(session_token)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self, session_token: str):
+        if self._drop(session_token):
+            self.stats["invalidations"] += 1
+
+    def invalidate_user(self, user_id: str):
+        for session_token in list(self._tokens_by_user.get(user_id, ())):
+            self.invalidate(session_token)
+
+    def _drop(self, session_token: str) -> bool:
+        entry = self._entries.pop(session_token, None)
+        if not entry:
+            return False
+        tokens = self._tokens_by_user.get(entry[0].user_id)
+        if tokens:
+            tokens.discard(session_token)
+            if not tokens:
+                del self._tokens_by_user[entry[0].user_id]
+        return True
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "entries": len(self._entries), "ttl": self.ttl}
+
+
+session_cache = SessionCache(SESSION_CACHE_TTL, SESSION_CACHE_MAX_ENTRIES)
+
+
 async def get_current_user(request: Request) -> User:
     session_token = request.cookies.get("session_token")
     if not session_token:
@@ -358,9 +729,20 @@ async def get_current_user(request: Request) -> User:
     if not session_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    session_doc = await db.user_sessions.find_one({"session_token": session_token}, {"_id": 0})
-    if not session_doc:
+    cached_user = session_cache.get(session_token)
+    if cached_user:
+        return cached_user
+    
+    # Session and user in a single round trip
+    docs = await db.user_sessions.aggregate([
+        {"$match": {"session_token": session_token}},
+        {"$limit": 1},
+        {"$lookup": {"from": "users", "localField": "user_id", "foreignField": "user_id", "as": "user"}},
+        {"$project": {"_id": 0, "user._id": 0}},
+    ]).to_list(1)
+    if not docs:
         raise HTTPException(status_code=401, detail="Invalid session")
+    session_doc = docs[0]
     
     expires_at = session_doc["expires_at"]
     if isinstance(expires_at, str):
@@ -370,11 +752,12 @@ async def get_current_user(request: Request) -> User:
     if expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=401, detail="Session expired")
     
-    user_doc = await db.users.find_one({"user_id": session_doc["user_id"]}, {"_id": 0})
-    if not user_doc:
+    if not session_doc.get("user"):
         raise HTTPException(status_code=401, detail="User not found")
     
-    return User(**user_doc)
+    user = User(**session_doc["user"][0])
+    session_cache.put(session_token, user, expires_at)
+    return user
 
 # ==================== AUTH ROUTES ====================
 
@@ -384,14 +767,13 @@ async def exchange_session(request: Request, response: Response):
     if not session_id:
         raise HTTPException(status_code=400, detail="Missing session ID")
     
-    async with httpx.AsyncClient() as http_client:
-        resp = await http_client.get(
-            "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-            headers={"X-Session-ID": session_id}
-        )
-        if resp.status_code != 200:
-            raise HTTPException(status_code=401, detail="Invalid session")
-        data = resp.json()
+    resp = await http_clients.get("auth").get(
+        "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
+        headers={"X-Session-ID": session_id}
+    )
+    if resp.status_code != 200:
+        raise HTTPException(status_code=401, detail="Invalid session")
+    data = resp.json()
     
     user_id = f"user_{uuid.uuid4().hex[:12]}"
     existing_user = await db.users.find_one({"email": data["email"]}, {"_id": 0})
@@ -415,10 +797,11 @@ async def exchange_session(request: Request, response: Response):
     expires_at = datetime.now(timezone.utc) + timedelta(days=7)
     
     await db.user_sessions.delete_many({"user_id": user_id})
+    session_cache.invalidate_user(user_id)
     await db.user_sessions.insert_one({
         "user_id": user_id,
         "session_token": session_token,
-        "expires_at": expires_at.isoformat(),
+        "expires_at": expires_at,  # BSON date so the TTL index can expire it
         "created_at": datetime.now(timezone.utc).isoformat()
     })
     
@@ -444,13 +827,14 @@ async def logout(request: Request, response: Response):
     session_token = request.cookies.get("session_token")
     if session_token:
         await db.user_sessions.delete_many({"session_token": session_token})
+        session_cache.invalidate(session_token)
     response.delete_cookie(key="session_token", path="/")
     return {"message": "Logged out"}
 
 # ==================== INVESTIDOR10 SCRAPER ====================
 
 def fetch_investidor10_fundamentals(ticker: str) -> dict:
-    """Fetch fundamental data from Investidor10 for valuation"""
+    """Fetch fundamental data from Investidor10 for valuation (blocking - use run_blocking())"""
     data = {
         "ticker": ticker.upper(),
         "current_price": None,
@@ -478,11 +862,9 @@ def fetch_investidor10_fundamentals(ticker: str) -> dict:
         # Use base ticker for company data (remove 3/4 suffix for some searches)
         base_ticker = ticker.upper()
         url = f"https://investidor10.com.br/acoes/{base_ticker.lower()}/"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        }
+        http_client = http_clients.get_sync("investidor10")
         
-        response = requests.get(url, headers=headers, timeout=15)
+        response = http_client.get(url, timeout=15)
         
         if response.status_code != 200:
             logger.error(f"Investidor10 fundamentals returned status {response.status_code} for {ticker}")
@@ -567,8 +949,8 @@ def fetch_investidor10_fundamentals(ticker: str) -> dict:
         # Get indicators from API if ticker_id found
         if ticker_id:
             api_url = f'https://investidor10.com.br/api/historico-indicadores/{ticker_id}/10?v=2'
-            api_response = requests.get(api_url, headers=headers, timeout=10)
-            if api_response.ok:
+            api_response = http_client.get(api_url, timeout=10)
+            if api_response.is_success:
                 api_data = api_response.json()
                 
                 # Extract current values from API (index 0 = current/TTM)
@@ -643,10 +1025,10 @@ def fetch_investidor10_fundamentals(ticker: str) -> dict:
 
 
 def fetch_investidor10_dividends_sync(ticker: str) -> List[dict]:
-    """Busca histórico de dividendos de forma síncrona (para uso em endpoints simples)."""
+    """Busca histórico de dividendos de forma síncrona (bloqueante - use via run_blocking())."""
     url = f"https://investidor10.com.br/acoes/{ticker.lower()}/"
     try:
-        response = httpx.get(url, timeout=15.0, follow_redirects=True)
+        response = http_clients.get_sync("investidor10").get(url, timeout=15.0)
         if response.status_code != 200:
             return []
 
@@ -722,13 +1104,19 @@ def is_undefined_payment_date(pagamento_str: str) -> bool:
     
     return False
 
-async def fetch_investidor10_dividends_async(client: httpx.AsyncClient, ticker: str, page: int = 1) -> List[dict]:
-    """Busca histórico de dividendos e bonificações de forma rápida e assíncrona."""
+async def fetch_investidor10_dividends_async(client: httpx.AsyncClient, ticker: str, page: int = 1) -> Optional[List[dict]]:
+    """
+    Busca histórico de dividendos e bonificações de forma rápida e assíncrona.
+    Returns [] past the last page (404 or no table) and None when the fetch failed.
+    """
     url = f"https://investidor10.com.br/acoes/{ticker.lower()}/?page={page}"
     try:
         response = await client.get(url, timeout=15.0)
-        if response.status_code != 200:
+        if response.status_code == 404:
             return []
+        if response.status_code != 200:
+            logger.warning(f"{ticker} pág {page}: status {response.status_code}")
+            return None
 
         soup = BeautifulSoup(response.content, 'lxml')
         table = soup.find('table', id='table-dividends-history')
@@ -786,18 +1174,20 @@ async def fetch_investidor10_dividends_async(client: httpx.AsyncClient, ticker:
         return dividends
     except Exception as e:
         logger.error(f"Erro ao buscar {ticker} pág {page}: {e}")
-        return []
+        return None
 
 
-async def fetch_investidor10_fii_dividends_async(client: httpx.AsyncClient, ticker: str, page: int = 1) -> List[dict]:
-    """Busca histórico de proventos de FIIs do Investidor10."""
+async def fetch_investidor10_fii_dividends_async(client: httpx.AsyncClient, ticker: str, page: int = 1) -> Optional[List[dict]]:
+    """Busca histórico de proventos de FIIs do Investidor10 ([] past the last page, None on failure)."""
     # FIIs usam URL diferente
     url = f"https://investidor10.com.br/fiis/{ticker.lower()}/?page={page}"
     try:
         response = await client.get(url, timeout=15.0)
+        if response.status_code == 404:
+            return []
         if response.status_code != 200:
             logger.warning(f"FII {ticker}: status {response.status_code}")
-            return []
+            return None
 
         soup = BeautifulSoup(response.content, 'lxml')
         
@@ -865,12 +1255,44 @@ async def fetch_investidor10_fii_dividends_async(client: httpx.AsyncClient, tick
         return dividends
     except Exception as e:
         logger.error(f"Erro ao buscar FII {ticker} pág {page}: {e}")
-        return []
+        return None
 
 # ==================== TRADINGVIEW INTEGRATION ====================
 
+def _tradingview_quote_from_analysis(ticker: str, analysis) -> dict:
+    indicators = analysis.indicators
+    close_price = indicators.get("close", 0)
+    open_price = indicators.get("open", 0)
+    high_price = indicators.get("high", 0)
+    low_price = indicators.get("low", 0)
+    volume = indicators.get("volume", 0)
+    change = indicators.get("change", 0)
+    change_percent = indicators.get("change", 0)
+    
+    # Calculate change if not available
+    if close_price and open_price and not change:
+        change = close_price - open_price
+        change_percent = ((close_price - open_price) / open_price) * 100 if open_price else 0
+    
+    return {
+        "ticker": ticker,
+        "price": round(close_price, 2) if close_price else 0,
+        "open": round(open_price, 2) if open_price else 0,
+        "high": round(high_price, 2) if high_price else 0,
+        "low": round(low_price, 2) if low_price else 0,
+        "change": round(change, 2) if change else 0,
+        "change_percent": round(change_percent, 2) if change_percent else 0,
+        "volume": int(volume) if volume else 0,
+        "recommendation": analysis.summary.get("RECOMMENDATION", "NEUTRAL"),
+        "source": "tradingview"
+    }
+
+
 def fetch_tradingview_quote(ticker: str) -> dict:
-    """Fetch real-time quote from TradingView - with improved error handling for K8s"""
+    """
+    Fetch real-time quote from TradingView - with improved error handling for K8s.
+    Blocking: call it through run_blocking() from async code.
+    """
     try:
         handler = TA_Handler(
             symbol=ticker,
@@ -879,39 +1301,43 @@ def fetch_tradingview_quote(ticker: str) -> dict:
             interval=Interval.INTERVAL_1_DAY
         )
         analysis = handler.get_analysis()
-        
-        indicators = analysis.indicators
-        close_price = indicators.get("close", 0)
-        open_price = indicators.get("open", 0)
-        high_price = indicators.get("high", 0)
-        low_price = indicators.get("low", 0)
-        volume = indicators.get("volume", 0)
-        change = indicators.get("change", 0)
-        change_percent = indicators.get("change", 0)
-        
-        # Calculate change if not available
-        if close_price and open_price and not change:
-            change = close_price - open_price
-            change_percent = ((close_price - open_price) / open_price) * 100 if open_price else 0
-        
-        return {
-            "ticker": ticker,
-            "price": round(close_price, 2) if close_price else 0,
-            "open": round(open_price, 2) if open_price else 0,
-            "high": round(high_price, 2) if high_price else 0,
-            "low": round(low_price, 2) if low_price else 0,
-            "change": round(change, 2) if change else 0,
-            "change_percent": round(change_percent, 2) if change_percent else 0,
-            "volume": int(volume) if volume else 0,
-            "recommendation": analysis.summary.get("RECOMMENDATION", "NEUTRAL"),
-            "source": "tradingview"
-        }
+        return _tradingview_quote_from_analysis(ticker, analysis)
     except Exception as e:
         # Log at debug level to avoid flooding logs in production when network is unavailable
         logger.debug(f"TradingView unavailable for {ticker}: {type(e).__name__}")
     
     return None
 
+
+def fetch_tradingview_quotes_batch(tickers: List[str]) -> Optional[dict]:
+    """
+    Fetch many quotes from TradingView in a single scanner request.
+    Blocking: call it through run_blocking() from async code.
+    Returns {ticker: quote} only for tickers with a valid price, or None if the request failed.
+    """
+    if not tickers:
+        return {}
+    
+    quotes = {}
+    try:
+        analyses = get_multiple_analysis(
+            screener="brazil",
+            interval=Interval.INTERVAL_1_DAY,
+            symbols=[f"BMFBOVESPA:{t}" for t in tickers]
+        )
+        for symbol, analysis in analyses.items():
+            if analysis is None:
+                continue
+            ticker = symbol.split(":", 1)[1]
+            quote = _tradingview_quote_from_analysis(ticker, analysis)
+            if quote["price"] > 0:
+                quotes[ticker] = quote
+    except Exception as e:
+        logger.debug(f"TradingView batch unavailable for {len(tickers)} tickers: {type(e).__name__}")
+        return None
+    
+    return quotes
+
 # ==================== YAHOO FINANCE INTEGRATION (PRIMARY) ====================
 
 async def fetch_yahoo_finance_quote(ticker: str) -> dict:
@@ -925,30 +1351,29 @@ async def fetch_yahoo_finance_quote(ticker: str) -> dict:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
         
-        # Use longer timeout and connection pooling for K8s environment
-        async with httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=10.0)) as http_client:
-            resp = await http_client.get(url, headers=headers)
-            data = resp.json()
+        # Shared keep-alive client (timeouts configured per provider in HttpClientPool)
+        resp = await http_clients.get("yahoo").get(url, headers=headers)
+        data = resp.json()
+        
+        if 'chart' in data and 'result' in data['chart'] and data['chart']['result']:
+            result = data['chart']['result'][0]
+            meta = result.get('meta', {})
             
-            if 'chart' in data and 'result' in data['chart'] and data['chart']['result']:
-                result = data['chart']['result'][0]
-                meta = result.get('meta', {})
-                
-                price = meta.get('regularMarketPrice', 0)
-                previous_close = meta.get('previousClose', 0)
+            price = meta.get('regularMarketPrice', 0)
+            previous_close = meta.get('previousClose', 0)
+            
+            if price and price > 0:
+                change = price - previous_close if previous_close else 0
+                change_percent = (change / previous_close * 100) if previous_close else 0
                 
-                if price and price > 0:
-                    change = price - previous_close if previous_close else 0
-                    change_percent = (change / previous_close * 100) if previous_close else 0
-                    
-                    return {
-                        "ticker": ticker,
-                        "price": round(price, 2),
-                        "change": round(change, 2),
-                        "change_percent": round(change_percent, 2),
-                        "previous_close": previous_close,
-                        "source": "yahoo_finance"
-                    }
+                return {
+                    "ticker": ticker,
+                    "price": round(price, 2),
+                    "change": round(change, 2),
+                    "change_percent": round(change_percent, 2),
+                    "previous_close": previous_close,
+                    "source": "yahoo_finance"
+                }
     except httpx.ConnectError:
         logger.debug(f"Yahoo Finance connection error for {ticker} - network may be restricted")
     except httpx.TimeoutException:
@@ -958,6 +1383,106 @@ async def fetch_yahoo_finance_quote(ticker: str) -> dict:
     
     return None
 
+async def fetch_yahoo_finance_quotes_batch(tickers: List[str]) -> Optional[dict]:
+    """
+    Fetch quotes for many tickers in a single request using Yahoo's spark endpoint.
+    Returns {ticker: quote} only for the symbols that came back with a valid price
+    (possibly none), or None when the request itself failed.
+    """
+    if not tickers:
+        return {}
+    
+    symbols = ",".join(f"{t}.SA" for t in tickers)
+    url = "https://query1.finance.yahoo.com/v7/finance/spark"
+    quotes = {}
+    
+    try:
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        }
+        
+        resp = await http_clients.get("yahoo").get(url, headers=headers, params={"symbols": symbols, "range": "1d", "interval": "1d"})
+        if resp.status_code >= 400:
+            logger.debug(f"Yahoo Finance batch status {resp.status_code} for {len(tickers)} tickers")
+            return None
+        data = resp.json()
+        
+        for item in (data.get("spark") or {}).get("result") or []:
+            symbol = item.get("symbol", "")
+            ticker = symbol[:-3] if symbol.endswith(".SA") else symbol
+            responses = item.get("response") or []
+            if not responses:
+                continue
+            meta = responses[0].get("meta", {})
+            
+            price = meta.get("regularMarketPrice", 0)
+            previous_close = meta.get("previousClose") or meta.get("chartPreviousClose") or 0
+            
+            if price and price > 0:
+                change = price - previous_close if previous_close else 0
+                change_percent = (change / previous_close * 100) if previous_close else 0
+                
+                quotes[ticker] = {
+                    "ticker": ticker,
+                    "price": round(price, 2),
+                    "change": round(change, 2),
+                    "change_percent": round(change_percent, 2),
+                    "previous_close": previous_close,
+                    "source": "yahoo_finance"
+                }
+    except httpx.ConnectError:
+        logger.debug(f"Yahoo Finance batch connection error for {len(tickers)} tickers")
+        return None
+    except httpx.TimeoutException:
+        logger.debug(f"Yahoo Finance batch timeout for {len(tickers)} tickers")
+        return None
+    except Exception as e:
+        logger.debug(f"Yahoo Finance batch unavailable: {type(e).__name__}")
+        return None
+    
+    return quotes
+
+async def fetch_yahoo_price_history(ticker: str, start_ord: Optional[int] = None) -> List[tuple]:
+    """
+    Daily bars (date, open, high, low, close, volume) from Yahoo's chart API.
+    Full history when start_ord is None, otherwise from that day ordinal until now.
+    """
+    url = f"https://query1.finance.yahoo.com/v8/finance/chart/{ticker}.SA"
+    params = {"interval": "1d"}
+    if start_ord is None:
+        params["range"] = "max"
+    else:
+        params["period1"] = int(datetime.fromordinal(start_ord).replace(tzinfo=timezone.utc).timestamp())
+        params["period2"] = int(time.time())
+    
+    bars = {}
+    try:
+        resp = await http_clients.get("yahoo").get(url, params=params)
+        result = ((resp.json().get("chart") or {}).get("result") or [None])[0]
+        if not result:
+            return []
+        quote = ((result.get("indicators") or {}).get("quote") or [{}])[0]
+        gmtoffset = (result.get("meta") or {}).get("gmtoffset", -10800)
+        for i, ts in enumerate(result.get("timestamp") or []):
+            close = (quote.get("close") or [])[i]
+            if close is None:
+                continue
+            day = datetime.fromtimestamp(ts + gmtoffset, tz=timezone.utc).strftime("%Y-%m-%d")
+            bars[day] = (
+                day,
+                quote["open"][i],
+                quote["high"][i],
+                quote["low"][i],
+                close,
+                quote["volume"][i],
+            )
+    except httpx.TimeoutException:
+        logger.debug(f"Yahoo Finance history timeout for {ticker}")
+    except Exception as e:
+        logger.debug(f"Yahoo Finance history unavailable for {ticker}: {type(e).__name__}")
+    
+    return [bars[day] for day in sorted(bars)]
+
 # ==================== ALPHA VANTAGE INTEGRATION (BACKUP) ====================
 
 async def fetch_alpha_vantage_quote(ticker: str) -> dict:
@@ -966,28 +1491,27 @@ async def fetch_alpha_vantage_quote(ticker: str) -> dict:
     av_ticker = f"{ticker}.SAO"
     
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=10.0)) as http_client:
-            resp = await http_client.get(
-                ALPHA_VANTAGE_BASE,
-                params={
-                    "function": "GLOBAL_QUOTE",
-                    "symbol": av_ticker,
-                    "apikey": ALPHA_VANTAGE_KEY
-                }
-            )
-            data = resp.json()
-            
-            if "Global Quote" in data and data["Global Quote"]:
-                quote = data["Global Quote"]
-                return {
-                    "ticker": ticker,
-                    "price": float(quote.get("05. price", 0)),
-                    "change": float(quote.get("09. change", 0)),
-                    "change_percent": quote.get("10. change percent", "0%").replace("%", ""),
-                    "volume": int(quote.get("06. volume", 0)),
-                    "latest_trading_day": quote.get("07. latest trading day", ""),
-                    "source": "alpha_vantage"
-                }
+        resp = await http_clients.get("alpha_vantage").get(
+            ALPHA_VANTAGE_BASE,
+            params={
+                "function": "GLOBAL_QUOTE",
+                "symbol": av_ticker,
+                "apikey": ALPHA_VANTAGE_KEY
+            }
+        )
+        data = resp.json()
+        
+        if "Global Quote" in data and data["Global Quote"]:
+            quote = data["Global Quote"]
+            return {
+                "ticker": ticker,
+                "price": float(quote.get("05. price", 0)),
+                "change": float(quote.get("09. change", 0)),
+                "change_percent": quote.get("10. change percent", "0%").replace("%", ""),
+                "volume": int(quote.get("06. volume", 0)),
+                "latest_trading_day": quote.get("07. latest trading day", ""),
+                "source": "alpha_vantage"
+            }
     except httpx.ConnectError:
         logger.debug(f"Alpha Vantage connection error for {ticker}")
     except httpx.TimeoutException:
@@ -1021,143 +1545,966 @@ BRAZILIAN_STOCKS = {
     "EMBR3": {"ticker": "EMBR3", "name": "Embraer ON", "sector": "Bens Industriais", "current_price": 52.30, "dividend_yield": 0.5},
 }
 
-@api_router.get("/stocks/search/{ticker}")
-async def search_stock(ticker: str):
-    ticker_upper = ticker.upper()
-    
-    # Try TradingView first (most reliable for Brazilian stocks)
-    tv_data = fetch_tradingview_quote(ticker_upper)
-    if tv_data and tv_data["price"] > 0:
-        base_info = BRAZILIAN_STOCKS.get(ticker_upper, {})
-        return {
-            "ticker": ticker_upper,
-            "name": base_info.get("name", f"Ação {ticker_upper}"),
-            "sector": base_info.get("sector", "Outros"),
-            "current_price": tv_data["price"],
-            "dividend_yield": base_info.get("dividend_yield"),
-            "change": tv_data["change"],
-            "change_percent": tv_data["change_percent"],
-            "high": tv_data.get("high"),
-            "low": tv_data.get("low"),
-            "volume": tv_data.get("volume"),
-            "recommendation": tv_data.get("recommendation"),
-            "source": "tradingview"
-        }
-    
-    # Fallback to Alpha Vantage
-    av_data = await fetch_alpha_vantage_quote(ticker_upper)
-    if av_data and av_data["price"] > 0:
-        base_info = BRAZILIAN_STOCKS.get(ticker_upper, {})
-        return {
-            "ticker": ticker_upper,
-            "name": base_info.get("name", f"Ação {ticker_upper}"),
-            "sector": base_info.get("sector", "Outros"),
-            "current_price": av_data["price"],
-            "dividend_yield": base_info.get("dividend_yield"),
-            "change": av_data["change"],
-            "change_percent": av_data["change_percent"],
-            "source": "alpha_vantage"
-        }
-    
-    # Fallback to cache data
-    if ticker_upper in BRAZILIAN_STOCKS:
-        return {**BRAZILIAN_STOCKS[ticker_upper], "source": "cache"}
-    
-    return {
-        "ticker": ticker_upper,
-        "name": f"Ação {ticker_upper}",
-        "sector": "Outros",
-        "current_price": None,
-        "dividend_yield": None,
-        "source": "unknown"
-    }
+# ==================== QUOTE PROVIDER CHAIN ====================
 
-@api_router.get("/stocks/quote/{ticker}")
-async def get_stock_quote(ticker: str):
-    """Get real-time quote for a stock from TradingView"""
-    ticker_upper = ticker.upper()
-    
-    # Try Yahoo Finance first (most reliable)
-    yahoo_data = await fetch_yahoo_finance_quote(ticker_upper)
-    if yahoo_data and yahoo_data["price"] > 0:
-        return yahoo_data
-    
-    # Fallback to TradingView
-    tv_data = fetch_tradingview_quote(ticker_upper)
-    if tv_data and tv_data["price"] > 0:
-        return tv_data
-    
-    # Fallback to Alpha Vantage
-    av_data = await fetch_alpha_vantage_quote(ticker_upper)
-    if av_data:
-        return av_data
-    
-    # Fallback to cache
-    if ticker_upper in BRAZILIAN_STOCKS:
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half_open after `reset_timeout` seconds, letting a single trial call through;
+    half_open -> closed on success, back to open on failure.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_inflight = False
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._trial_inflight = False
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self._trial_inflight:
+            self._trial_inflight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._trial_inflight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._trial_inflight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class QuoteProvider:
+    """A quote source plus the health statistics used to order and hedge it"""
+
+    MIN_SAMPLES = 5
+
+    def __init__(self, name: str, fetch, priority: int):
+        self.name = name
+        self.fetch = fetch  # async (ticker) -> quote dict or None
+        self.priority = priority
+        self.breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+        self.latencies = deque(maxlen=200)
+        self.success_rate = 1.0  # exponentially weighted
+        self.calls = 0
+
+    def record(self, success: bool, latency: Optional[float] = None):
+        self.calls += 1
+        self.success_rate = 0.8 * self.success_rate + 0.2 * (1.0 if success else 0.0)
+        if latency is not None:
+            self.latencies.append(latency)
+        if success:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def latency_percentile(self, p: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    def score(self) -> float:
+        """Expected cost of asking this provider first (lower is better)"""
+        median = self.latency_percentile(0.5)
+        if median is None or len(self.latencies) < self.MIN_SAMPLES:
+            # Not enough data yet: keep the configured order
+            median = 0.5 * (self.priority + 1)
+        return median / max(self.success_rate, 0.05)
+
+    def snapshot(self) -> dict:
+        p50 = self.latency_percentile(0.5)
+        p90 = self.latency_percentile(0.9)
         return {
-            "ticker": ticker_upper,
-            "price": BRAZILIAN_STOCKS[ticker_upper]["current_price"],
-            "change": 0,
-            "change_percent": "0",
-            "source": "cache"
+            "state": self.breaker.state,
+            "calls": self.calls,
+            "success_rate": round(self.success_rate, 3),
+            "p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "p90_ms": round(p90 * 1000) if p90 is not None else None,
         }
-    
-    raise HTTPException(status_code=404, detail="Stock not found")
 
 
-@api_router.get("/stocks/detect-type/{ticker}")
-async def detect_ticker_type(ticker: str):
+class ProviderChain:
     """
-    Detect if ticker is Ação or FII by checking on Investidor10.
-    Checks https://investidor10.com.br/acoes/ and https://investidor10.com.br/fiis/
+    Tries quote providers best-score first under a per-request deadline.
+    If the current provider has not answered within its latency percentile, the next
+    provider is started in parallel (hedged request); the first valid quote wins.
+    Providers with an open circuit breaker are skipped.
     """
-    result = detect_asset_type_from_investidor10(ticker)
-    return result
 
+    def __init__(self, providers: List[QuoteProvider], deadline: float, hedge_percentile: float):
+        self.providers = providers
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.stats = {"requests": 0, "hedges": 0, "deadline_exceeded": 0, "exhausted": 0}
 
-@api_router.get("/stocks/valuation-data/{ticker}")
-async def get_valuation_data(ticker: str):
-    """Get fundamental data for valuation from Investidor10 and other sources"""
-    ticker_upper = ticker.upper()
-    
-    # Get fundamentals from Investidor10
-    fundamentals = fetch_investidor10_fundamentals(ticker_upper)
-    
-    # Get current price from Yahoo Finance (most reliable)
-    yahoo_data = await fetch_yahoo_finance_quote(ticker_upper)
-    if yahoo_data and yahoo_data["price"] > 0:
-        fundamentals["current_price"] = yahoo_data["price"]
-    
-    # Get dividend info from dividend history
-    dividends = fetch_investidor10_dividends_sync(ticker_upper)
-    if dividends:
-        # Calculate annual dividend (sum of dividends from last 12 months by date)
-        from datetime import datetime, timedelta
-        one_year_ago = datetime.now() - timedelta(days=365)
-        
-        annual_dividend = 0
-        for d in dividends:
-            try:
-                # data_com is in YYYY-MM-DD format
-                dividend_date = datetime.strptime(d["data_com"], "%Y-%m-%d")
-                if dividend_date >= one_year_ago:
-                    annual_dividend += d["valor"]
-            except (ValueError, KeyError):
-                continue
+    def provider(self, name: str) -> QuoteProvider:
+        return next(p for p in self.providers if p.name == name)
+
+    def ordered(self) -> List[QuoteProvider]:
+        return sorted(self.providers, key=lambda p: (p.score(), p.priority))
+
+    def _hedge_delay(self, provider: QuoteProvider) -> float:
+        delay = provider.latency_percentile(self.hedge_percentile)
+        if delay is None or len(provider.latencies) < QuoteProvider.MIN_SAMPLES:
+            delay = QUOTE_HEDGE_DEFAULT_DELAY
+        return max(delay, 0.05)
+
+    async def _call(self, provider: QuoteProvider, ticker: str):
+        started = time.monotonic()
+        try:
+            quote = await provider.fetch(ticker)
+        except asyncio.CancelledError:
+            # Hedged out or past the deadline: a slow answer counts as a failure
+            provider.record(False, time.monotonic() - started)
+            raise
+        except Exception as e:
+            logger.debug(f"{provider.name} failed for {ticker}: {type(e).__name__}")
+            quote = None
+        success = bool(quote) and (quote.get("price") or 0) > 0
+        provider.record(success, time.monotonic() - started)
+        return quote if success else None
+
+    async def fetch(self, ticker: str) -> Optional[dict]:
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        candidates = iter(self.ordered())
+        pending = {}  # task -> provider
         
-        fundamentals["dividend_per_share"] = round(annual_dividend, 2)
+        def launch_next() -> bool:
+            for provider in candidates:
+                if provider.breaker.allow():
+                    pending[asyncio.ensure_future(self._call(provider, ticker))] = provider
+                    return True
+            return False
         
-        # Calculate dividend yield
-        if fundamentals["current_price"] and fundamentals["current_price"] > 0:
-            fundamentals["dividend_yield"] = round((annual_dividend / fundamentals["current_price"]) * 100, 2)
-    
-    # Add base info
-    base_info = BRAZILIAN_STOCKS.get(ticker_upper, {})
+        try:
+            if not launch_next():
+                self.stats["exhausted"] += 1
+                return None
+            
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.stats["deadline_exceeded"] += 1
+                    return None
+                
+                newest = list(pending.values())[-1]
+                done, _ = await asyncio.wait(
+                    pending.keys(),
+                    timeout=min(self._hedge_delay(newest), remaining),
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                if not done:
+                    # Slow provider: hedge with the next one, keep waiting on both
+                    if launch_next():
+                        self.stats["hedges"] += 1
+                    continue
+                
+                for task in done:
+                    pending.pop(task)
+                    quote = task.result()
+                    if quote:
+                        return quote
+                    # Failed outright: fail over to the next provider right away
+                    launch_next()
+            
+            self.stats["exhausted"] += 1
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "order": [p.name for p in self.ordered()],
+            "providers": {p.name: p.snapshot() for p in self.providers},
+        }
+
+
+async def _fetch_tradingview_quote_async(ticker: str) -> Optional[dict]:
+    return await run_blocking(fetch_tradingview_quote, ticker)
+
+
+quote_providers = ProviderChain(
+    [
+        QuoteProvider("yahoo_finance", lambda t: fetch_yahoo_finance_quote(t), priority=0),
+        QuoteProvider("tradingview", _fetch_tradingview_quote_async, priority=1),
+        QuoteProvider("alpha_vantage", lambda t: fetch_alpha_vantage_quote(t), priority=2),
+    ],
+    deadline=QUOTE_REQUEST_DEADLINE,
+    hedge_percentile=QUOTE_HEDGE_PERCENTILE,
+)
+
+# ==================== QUOTE CACHE ====================
+
+class QuoteCache:
+    """
+    Process-wide quote cache keyed by ticker.
+    - Fresh entries (younger than ttl) are served directly.
+    - Stale entries (younger than stale_ttl) are served while a background refresh runs.
+    - Concurrent misses for the same ticker share a single upstream fetch (single-flight).
+    - Failed fetches are remembered for negative_ttl to avoid hammering the providers.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float, negative_ttl: float):
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.negative_ttl = negative_ttl
+        self._entries = {}  # ticker -> {"quote", "fetched_at", "checked_at"}
+        self._inflight = {}  # ticker -> asyncio.Task
+        self.stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "refreshes": 0,
+            "errors": 0,
+        }
+
+    async def get(self, ticker: str, loader):
+        """Return the quote for ticker, calling loader(ticker) on a miss."""
+        now = time.monotonic()
+        entry = self._entries.get(ticker)
+        
+        if entry:
+            quote = entry["quote"]
+            if quote and now - entry["fetched_at"] < self.ttl:
+                self.stats["hits"] += 1
+                return quote
+            if quote and now - entry["fetched_at"] < self.stale_ttl:
+                self.stats["stale_hits"] += 1
+                # Only retry upstream once per negative_ttl while serving stale data
+                if ticker not in self._inflight and now - entry["checked_at"] >= self.negative_ttl:
+                    self.stats["refreshes"] += 1
+                    self._start_fetch(ticker, loader)
+                return quote
+            if not quote and now - entry["checked_at"] < self.negative_ttl:
+                self.stats["hits"] += 1
+                return None
+        
+        self.stats["misses"] += 1
+        if ticker in self._inflight:
+            self.stats["coalesced"] += 1
+            task = self._inflight[ticker]
+        else:
+            task = self._start_fetch(ticker, loader)
+        # shield: a cancelled request must not cancel the fetch other waiters depend on
+        return await asyncio.shield(task)
+
+    def _start_fetch(self, ticker: str, loader) -> asyncio.Task:
+        task = asyncio.ensure_future(self._fetch(ticker, loader))
+        self._inflight[ticker] = task
+        return task
+
+    async def _fetch(self, ticker: str, loader):
+        try:
+            quote = await loader(ticker)
+        except Exception as e:
+            logger.debug(f"Quote loader failed for {ticker}: {type(e).__name__}")
+            self.stats["errors"] += 1
+            quote = None
+        finally:
+            self._inflight.pop(ticker, None)
+        
+        now = time.monotonic()
+        entry = self._entries.get(ticker)
+        if quote:
+            self._entries[ticker] = {"quote": quote, "fetched_at": now, "checked_at": now}
+        elif entry and entry["quote"]:
+            # Keep serving the last good quote until it ages out of stale_ttl
+            entry["checked_at"] = now
+            quote = entry["quote"] if now - entry["fetched_at"] < self.stale_ttl else None
+        else:
+            self._entries[ticker] = {"quote": None, "fetched_at": now, "checked_at": now}
+        return quote
+
+    def peek(self, ticker: str) -> Optional[dict]:
+        """Return the quote only if it is still fresh, without touching upstream"""
+        entry = self._entries.get(ticker)
+        if entry and entry["quote"] and time.monotonic() - entry["fetched_at"] < self.ttl:
+            self.stats["hits"] += 1
+            return entry["quote"]
+        return None
+
+    def put(self, ticker: str, quote: dict):
+        """Store a quote fetched outside of get() (e.g. by a batch request)"""
+        now = time.monotonic()
+        self._entries[ticker] = {"quote": quote, "fetched_at": now, "checked_at": now}
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["stale_hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": round((self.stats["hits"] + self.stats["stale_hits"]) / lookups, 4) if lookups else 0,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+        }
+
+
+quote_cache = QuoteCache(QUOTE_CACHE_TTL, QUOTE_CACHE_STALE_TTL, QUOTE_CACHE_NEGATIVE_TTL)
+
+
+async def fetch_quote_from_providers(ticker: str) -> Optional[dict]:
+    """Uncached live quote from the provider chain (Yahoo Finance, TradingView, Alpha Vantage)"""
+    return await quote_providers.fetch(ticker)
+
+
+async def get_quote(ticker: str) -> Optional[dict]:
+    """Get a live quote for ticker through the shared quote cache (None if all providers fail)"""
+    return await quote_cache.get(ticker.upper(), fetch_quote_from_providers)
+
+
+async def fetch_quotes_batch(tickers: List[str]) -> dict:
+    """
+    Get live quotes for many tickers at once.
+    1. Fresh cache entries are used as-is.
+    2. The rest are fetched in chunks of QUOTE_BATCH_SIZE symbols per Yahoo request.
+    3. Symbols Yahoo did not return are tried in one TradingView scanner request.
+       (batch tiers are skipped while the provider's circuit breaker is open)
+    4. Symbols still missing go through the per-ticker provider chain,
+       fanned out concurrently with at most QUOTE_FETCH_CONCURRENCY in flight.
+    Returns {ticker: quote}; tickers no provider could price are left out.
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    quotes = {}
+    
+    missing = []
+    for ticker in tickers:
+        cached = quote_cache.peek(ticker)
+        if cached:
+            quotes[ticker] = cached
+        else:
+            missing.append(ticker)
+    
+    yahoo = quote_providers.provider("yahoo_finance")
+    if missing and yahoo.breaker.allow():
+        chunks = [missing[i:i + QUOTE_BATCH_SIZE] for i in range(0, len(missing), QUOTE_BATCH_SIZE)]
+        for batch in await asyncio.gather(*[fetch_yahoo_finance_quotes_batch(c) for c in chunks]):
+            # Only a failed request counts against the provider; unknown/delisted symbols just don't come back
+            yahoo.record(batch is not None)
+            for ticker, quote in (batch or {}).items():
+                quote_cache.put(ticker, quote)
+                quotes[ticker] = quote
+    
+    still_missing = [t for t in missing if t not in quotes]
+    tradingview = quote_providers.provider("tradingview")
+    if still_missing and tradingview.breaker.allow():
+        tv_quotes = await run_blocking(fetch_tradingview_quotes_batch, still_missing)
+        tradingview.record(tv_quotes is not None)
+        for ticker, quote in (tv_quotes or {}).items():
+            quote_cache.put(ticker, quote)
+            quotes[ticker] = quote
+    
+    still_missing = [t for t in missing if t not in quotes]
+    if still_missing:
+        sem = asyncio.Semaphore(QUOTE_FETCH_CONCURRENCY)
+        
+        async def fetch_one(ticker):
+            async with sem:
+                return ticker, await get_quote(ticker)
+        
+        for ticker, quote in await asyncio.gather(*[fetch_one(t) for t in still_missing]):
+            if quote:
+                quotes[ticker] = quote
+    
+    return quotes
+
+# ==================== MARKET DATA INGESTOR ====================
+
+def is_b3_trading_hours(now: Optional[datetime] = None) -> bool:
+    """True on weekdays between B3_SESSION_OPEN and B3_SESSION_CLOSE (Brasília time)"""
+    now_brt = (now or datetime.now(timezone.utc)).astimezone(BRASIL_TZ)
+    return now_brt.weekday() < 5 and B3_SESSION_OPEN <= now_brt.time() <= B3_SESSION_CLOSE
+
+
+async def acquire_scheduler_lease(name: str, ttl_seconds: float) -> bool:
+    """
+    Take or renew a lease in scheduler_leases so a periodic job runs on one worker only.
+    Returns True while this worker holds the lease.
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        await db.scheduler_leases.find_one_and_update(
+            {"_id": name, "$or": [{"holder": WORKER_ID}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"holder": WORKER_ID, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # Lease exists and is held by another worker
+        return False
+
+
+class MarketDataIngestor:
+    """
+    Periodically refreshes every distinct ticker held by any user into the shared `quotes`
+    collection and an in-memory map, so upstream volume scales with distinct tickers instead
+    of users. The worker holding the lease fetches upstream; the others reload from `quotes`.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.prices = {}  # ticker -> quote (with "updated_ts")
+        self._task = None
+        self._fetched_since_close = True
+        self.stats = {"runs": 0, "tickers": 0, "fetched": 0, "reloads": 0, "on_demand": 0, "errors": 0, "last_run": None}
+
+    def start(self):
+        if MARKET_INGEST_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        await self.reload()
+        while True:
+            try:
+                trading = is_b3_trading_hours()
+                # Outside the session prices don't move: fetch once more to capture the close, then idle
+                if trading or not self._fetched_since_close:
+                    if await acquire_scheduler_lease("market_data_ingest", self.interval * 3):
+                        await self.ingest_once()
+                    else:
+                        await self.reload()
+                    self._fetched_since_close = not trading
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Market data ingest error: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def reload(self):
+        """Load the latest stored quotes into memory"""
+        docs = await db.quotes.find({}, {"_id": 0}).to_list(None)
+        for doc in docs:
+            self._set_price(doc["ticker"], doc)
+        self.stats["reloads"] += 1
+    
+    def _set_price(self, ticker: str, doc: dict):
+        """Store a quote and push it to connected clients when the price moved"""
+        old = self.prices.get(ticker)
+        self.prices[ticker] = doc
+        if old is None or old.get("price") != doc.get("price"):
+            push_hub.publish(f"price:{ticker}", doc)
+
+    async def ingest_once(self):
+        tickers = await db.stocks.distinct("ticker", {"asset_type": {"$ne": "renda_fixa"}})
+        quotes = await self._fetch_and_store(tickers)
+        self.stats["runs"] += 1
+        self.stats["tickers"] = len(tickers)
+        self.stats["fetched"] = len(quotes)
+        self.stats["last_run"] = datetime.now(timezone.utc).isoformat()
+        logger.info(f"Market data ingest: {len(quotes)}/{len(tickers)} tickers refreshed")
+
+    async def _fetch_and_store(self, tickers: List[str]) -> dict:
+        quotes = await fetch_quotes_batch(tickers)
+        if not quotes:
+            return quotes
+        
+        now_ts = time.time()
+        now_iso = datetime.now(timezone.utc).isoformat()
+        operations = []
+        for ticker, quote in quotes.items():
+            doc = {**quote, "ticker": ticker, "updated_at": now_iso, "updated_ts": now_ts}
+            self._set_price(ticker, doc)
+            operations.append(UpdateOne({"ticker": ticker}, {"$set": doc}, upsert=True))
+        await db.quotes.bulk_write(operations, ordered=False)
+        return quotes
+
+    def get(self, ticker: str) -> Optional[dict]:
+        """Latest ingested quote, or None if it is missing or (during the session) out of date"""
+        quote = self.prices.get(ticker)
+        if not quote:
+            return None
+        if is_b3_trading_hours() and time.time() - quote.get("updated_ts", 0) > self.interval * 3:
+            return None
+        return quote
+
+    async def get_prices(self, tickers: List[str]) -> dict:
+        """
+        Latest prices for tickers from memory. Tickers the ingestor has not seen yet (e.g. a
+        position added a moment ago) or whose quote is out of date (see get) are looked up in
+        `quotes`, then fetched once; the last known quote is the fallback if that fails.
+        """
+        prices = {t: quote for t in tickers if (quote := self.get(t))}
+        missing = [t for t in tickers if t not in prices]
+        if missing:
+            docs = await db.quotes.find({"ticker": {"$in": missing}}, {"_id": 0}).to_list(None)
+            for doc in docs:
+                if doc.get("updated_ts", 0) >= self.prices.get(doc["ticker"], {}).get("updated_ts", 0):
+                    self._set_price(doc["ticker"], doc)
+            prices.update({t: quote for t in missing if (quote := self.get(t))})
+            missing = [t for t in missing if t not in prices]
+        if missing:
+            self.stats["on_demand"] += len(missing)
+            prices.update(await self._fetch_and_store(missing))
+            prices.update({t: self.prices[t] for t in missing if t not in prices and t in self.prices})
+        return prices
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "enabled": MARKET_INGEST_ENABLED,
+            "interval": self.interval,
+            "in_memory": len(self.prices),
+            "trading_hours": is_b3_trading_hours(),
+        }
+
+
+market_data = MarketDataIngestor(MARKET_INGEST_INTERVAL)
+
+
+# ==================== PRICE HISTORY ====================
+
+class PriceHistoryStore:
+    """
+    Daily OHLCV bars per ticker in `price_history`, one document per ticker and year holding
+    parallel arrays (dates, open, high, low, close, volume). Each ticker is backfilled once from
+    Yahoo's chart range and then appended by a periodic job under a scheduler lease. Requests
+    only read closes from in-memory NumPy arrays, never upstream.
+    """
+    
+    FIELDS = ("open", "high", "low", "close", "volume")
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._series = {}  # ticker -> (day ordinals int64, closes float64); empty arrays when unknown
+        self._task = None
+        self.stats = {"runs": 0, "backfilled": 0, "appended_bars": 0, "loads": 0, "errors": 0, "last_run": None}
+    
+    def start(self):
+        if PRICE_HISTORY_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            try:
+                if await acquire_scheduler_lease("price_history_sync", self.interval * 2):
+                    await self.sync_all()
+                else:
+                    # Another worker appends bars; drop the arrays so they are reloaded from Mongo
+                    self._series.clear()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Price history sync error: {e}")
+            await asyncio.sleep(self.interval)
+    
+    async def load(self, tickers: List[str]) -> dict:
+        """{ticker: (day ordinals, closes)} for the tickers that have stored history"""
+        missing = [t for t in set(tickers) if t not in self._series]
+        if missing:
+            docs = await db.price_history.find(
+                {"ticker": {"$in": missing}}, {"_id": 0, "ticker": 1, "year": 1, "dates": 1, "close": 1}
+            ).sort([("ticker", 1), ("year", 1)]).to_list(None)
+            grouped = {t: ([], []) for t in missing}
+            for doc in docs:
+                dates, closes = grouped[doc["ticker"]]
+                dates.extend(_parse_day_ordinal(d) for d in doc["dates"])
+                closes.extend(doc["close"])
+            for ticker, (dates, closes) in grouped.items():
+                self._series[ticker] = (np.asarray(dates, dtype=np.int64), np.asarray(closes, dtype=np.float64))
+            self.stats["loads"] += 1
+        return {t: self._series[t] for t in tickers if len(self._series[t][0])}
+    
+    async def sync_all(self):
+        tickers = await db.stocks.distinct("ticker", {"asset_type": {"$ne": "renda_fixa"}})
+        sem = asyncio.Semaphore(PRICE_HISTORY_CONCURRENCY)
+        
+        async def sync(ticker):
+            async with sem:
+                return await self.sync_ticker(ticker)
+        
+        appended = await asyncio.gather(*[sync(t) for t in tickers])
+        self.stats["runs"] += 1
+        self.stats["last_run"] = datetime.now(timezone.utc).isoformat()
+        logger.info(f"Price history sync: {sum(appended)} bars appended for {len(tickers)} tickers")
+    
+    async def sync_ticker(self, ticker: str) -> int:
+        """Backfill or append the bars missing for one ticker; returns how many were stored"""
+        series = (await self.load([ticker])).get(ticker)
+        last_ord = int(series[0][-1]) if series else None
+        today_ord = datetime.now(BRASIL_TZ).toordinal()
+        if last_ord is not None and last_ord >= today_ord - 1:
+            return 0
+        
+        bars = await fetch_yahoo_price_history(ticker, None if last_ord is None else last_ord + 1)
+        # Today's bar is still moving; it is stored once the day is over
+        today = datetime.fromordinal(today_ord).strftime("%Y-%m-%d")
+        last = datetime.fromordinal(last_ord).strftime("%Y-%m-%d") if last_ord is not None else ""
+        bars = [b for b in bars if last < b[0] < today]
+        if not bars:
+            return 0
+        
+        await self._append(ticker, bars)
+        self._series.pop(ticker, None)
+        if last_ord is None:
+            self.stats["backfilled"] += 1
+        self.stats["appended_bars"] += len(bars)
+        return len(bars)
+    
+    async def _append(self, ticker: str, bars: List[tuple]):
+        by_year = {}
+        for bar in bars:
+            by_year.setdefault(int(bar[0][:4]), []).append(bar)
+        now_iso = datetime.now(timezone.utc).isoformat()
+        operations = []
+        for year, year_bars in sorted(by_year.items()):
+            push = {"dates": {"$each": [b[0] for b in year_bars]}}
+            for i, field in enumerate(self.FIELDS, start=1):
+                push[field] = {"$each": [b[i] for b in year_bars]}
+            operations.append(UpdateOne(
+                {"ticker": ticker, "year": year},
+                {"$push": push, "$set": {"updated_at": now_iso}},
+                upsert=True
+            ))
+        await db.price_history.bulk_write(operations)
+    
+    def snapshot(self) -> dict:
+        return {**self.stats, "enabled": PRICE_HISTORY_ENABLED, "interval": self.interval, "in_memory": len(self._series)}
+
+
+price_history = PriceHistoryStore(PRICE_HISTORY_SYNC_INTERVAL)
+
+
+async def get_latest_quote(ticker: str) -> Optional[dict]:
+    """Ingested quote when available, otherwise a live quote through the quote cache"""
+    ticker = ticker.upper()
+    return market_data.get(ticker) or await get_quote(ticker)
+
+@api_router.get("/stocks/search/{ticker}")
+async def search_stock(ticker: str):
+    ticker_upper = ticker.upper()
+    
+    quote = await get_latest_quote(ticker_upper)
+    if quote:
+        base_info = BRAZILIAN_STOCKS.get(ticker_upper, {})
+        return {
+            "ticker": ticker_upper,
+            "name": base_info.get("name", f"Ação {ticker_upper}"),
+            "sector": base_info.get("sector", "Outros"),
+            "current_price": quote["price"],
+            "dividend_yield": base_info.get("dividend_yield"),
+            "change": quote.get("change"),
+            "change_percent": quote.get("change_percent"),
+            "high": quote.get("high"),
+            "low": quote.get("low"),
+            "volume": quote.get("volume"),
+            "recommendation": quote.get("recommendation"),
+            "source": quote["source"]
+        }
+    
+    # Fallback to cache data
+    if ticker_upper in BRAZILIAN_STOCKS:
+        return {**BRAZILIAN_STOCKS[ticker_upper], "source": "cache"}
+    
+    return {
+        "ticker": ticker_upper,
+        "name": f"Ação {ticker_upper}",
+        "sector": "Outros",
+        "current_price": None,
+        "dividend_yield": None,
+        "source": "unknown"
+    }
+
+@api_router.get("/stocks/quote/{ticker}")
+async def get_stock_quote(ticker: str):
+    """Get real-time quote for a stock (cached)"""
+    ticker_upper = ticker.upper()
+    
+    # Latest ingested price, else Yahoo Finance -> TradingView -> Alpha Vantage via the quote cache
+    quote = await get_latest_quote(ticker_upper)
+    if quote:
+        return {k: v for k, v in quote.items() if k != "updated_ts"}
+    
+    # Fallback to cache
+    if ticker_upper in BRAZILIAN_STOCKS:
+        return {
+            "ticker": ticker_upper,
+            "price": BRAZILIAN_STOCKS[ticker_upper]["current_price"],
+            "change": 0,
+            "change_percent": "0",
+            "source": "cache"
+        }
+    
+    raise HTTPException(status_code=404, detail="Stock not found")
+
+
+@api_router.get("/stocks/detect-type/{ticker}")
+async def detect_ticker_type(ticker: str):
+    """
+    Detect if ticker is Ação or FII by checking on Investidor10.
+    Checks https://investidor10.com.br/acoes/ and https://investidor10.com.br/fiis/
+    """
+    result = await run_blocking(detect_asset_type_from_investidor10, ticker)
+    return result
+
+
+@api_router.get("/stocks/valuation-data/{ticker}")
+async def get_valuation_data(ticker: str):
+    """Get fundamental data for valuation from Investidor10 and other sources"""
+    ticker_upper = ticker.upper()
+    
+    # Fundamentals, quote and dividend history are independent - fetch them concurrently
+    fundamentals, quote, dividends = await asyncio.gather(
+        run_blocking(fetch_investidor10_fundamentals, ticker_upper),
+        get_latest_quote(ticker_upper),
+        run_blocking(fetch_investidor10_dividends_sync, ticker_upper),
+    )
+    
+    # Current price from the shared quote cache
+    if quote:
+        fundamentals["current_price"] = quote["price"]
+    
+    # Get dividend info from dividend history
+    if dividends:
+        # Calculate annual dividend (sum of dividends from last 12 months by date)
+        from datetime import datetime, timedelta
+        one_year_ago = datetime.now() - timedelta(days=365)
+        
+        annual_dividend = 0
+        for d in dividends:
+            try:
+                # data_com is in YYYY-MM-DD format
+                dividend_date = datetime.strptime(d["data_com"], "%Y-%m-%d")
+                if dividend_date >= one_year_ago:
+                    annual_dividend += d["valor"]
+            except (ValueError, KeyError):
+                continue
+        
+        fundamentals["dividend_per_share"] = round(annual_dividend, 2)
+        
+        # Calculate dividend yield
+        if fundamentals["current_price"] and fundamentals["current_price"] > 0:
+            fundamentals["dividend_yield"] = round((annual_dividend / fundamentals["current_price"]) * 100, 2)
+    
+    # Add base info
+    base_info = BRAZILIAN_STOCKS.get(ticker_upper, {})
     fundamentals["name"] = base_info.get("name", f"Ação {ticker_upper}")
     fundamentals["sector"] = base_info.get("sector", "Outros")
     
     return fundamentals
 
+# ==================== COMPUTED STATE CACHE ====================
+
+class DataVersions:
+    """
+    Per-user mutation counters in `data_versions`. Stock, dividend and sale mutations and price
+    refreshes bump them; computed portfolio state is cached under the version it was built from,
+    so a bump makes every older entry unreachable on all workers.
+    A portfolio's version combines its own counter with the user-wide one; the all-portfolios
+    view uses `all`, which every bump increments. Alerts have their own `alerts` counter.
+    Version documents are cached in-process for `ttl` seconds (a bump on this worker drops the
+    entry immediately; other workers see it once their entry expires).
+    """
+    
+    def __init__(self, ttl: float = 0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._docs = OrderedDict()  # user_id -> (doc, valid_until)
+        self._epoch = 0  # bumped on every write so a read racing a bump is not cached
+        self.stats = {"hits": 0, "misses": 0}
+    
+    async def _doc(self, user_id: str) -> dict:
+        entry = self._docs.get(user_id)
+        if entry and time.monotonic() < entry[1]:
+            self.stats["hits"] += 1
+            return entry[0]
+        self.stats["misses"] += 1
+        epoch = self._epoch
+        doc = await db.data_versions.find_one({"_id": user_id}) or {}
+        if self.ttl > 0 and epoch == self._epoch:
+            self._docs[user_id] = (doc, time.monotonic() + self.ttl)
+            self._docs.move_to_end(user_id)
+            while len(self._docs) > self.max_entries:
+                self._docs.popitem(last=False)
+        return doc
+    
+    async def get(self, user_id: str, portfolio_id: Optional[str] = None) -> str:
+        doc = await self._doc(user_id)
+        if portfolio_id:
+            return f"{doc.get('wide', 0)}.{(doc.get('portfolios') or {}).get(portfolio_id, 0)}"
+        return str(doc.get("all", 0))
+    
+    async def get_alerts(self, user_id: str) -> str:
+        return str((await self._doc(user_id)).get("alerts", 0))
+    
+    async def bump(self, user_id: str, portfolio_ids=None):
+        """Bump the given portfolios, or the user-wide counter when none (or None) is given"""
+        portfolio_ids = set(portfolio_ids or [None])
+        inc = {"all": 1}
+        if None in portfolio_ids or "" in portfolio_ids:
+            inc["wide"] = 1
+        for portfolio_id in portfolio_ids - {None, ""}:
+            inc[f"portfolios.{portfolio_id}"] = 1
+        await self._inc(user_id, inc)
+        push_hub.publish(f"data:{user_id}")
+    
+    async def bump_alerts(self, user_id: str):
+        await self._inc(user_id, {"alerts": 1})
+        push_hub.publish(f"alerts:{user_id}")
+    
+    async def _inc(self, user_id: str, inc: dict):
+        self._epoch += 1
+        self._docs.pop(user_id, None)
+        await db.data_versions.update_one({"_id": user_id}, {"$inc": inc}, upsert=True)
+        self._docs.pop(user_id, None)
+    
+    def snapshot(self) -> dict:
+        return {**self.stats, "entries": len(self._docs), "ttl": self.ttl}
+
+
+class ComputedStateCache:
+    """LRU of computed portfolio views bounded by an estimate of their serialized size"""
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "oversized": 0}
+    
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[0]
+    
+    def put(self, key, value):
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            self.stats["oversized"] += 1
+            return
+        old = self._entries.pop(key, None)
+        if old:
+            self.bytes -= old[1]
+        self._entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.stats["evictions"] += 1
+    
+    def snapshot(self) -> dict:
+        return {**self.stats, "entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes}
+
+
+data_versions = DataVersions(DATA_VERSION_CACHE_TTL)
+portfolio_cache = ComputedStateCache(PORTFOLIO_CACHE_MAX_BYTES)
+
+
+def brt_day(now: Optional[datetime] = None) -> str:
+    """Current day in BRT (UTC-3); the daily result resets at 00:01 BRT"""
+    return ((now or datetime.now(timezone.utc)) + timedelta(hours=-3)).strftime("%Y-%m-%d")
+
+
+def daily_view_key(now: Optional[datetime] = None) -> str:
+    """
+    Date component of views that depend on today: the BRT day (daily result reference)
+    and the UTC day (dividends received/pending), so they roll over at both midnights.
+    """
+    now = now or datetime.now(timezone.utc)
+    return f"{brt_day(now)}|{now.strftime('%Y-%m-%d')}"
+
+
+async def cached_portfolio_view(user_id: str, portfolio_id: Optional[str], view: str, compute, response: Optional[Response] = None):
+    """
+    Computed state for (user, portfolio, view) at the current data version. Values are shared
+    between requests and must not be mutated. Sets X-Cache: HIT/MISS on the response.
+    """
+    version = await data_versions.get(user_id, portfolio_id)
+    key = (user_id, portfolio_id, view, version)
+    value = portfolio_cache.get(key)
+    hit = value is not None
+    if not hit:
+        value = await compute()
+        portfolio_cache.put(key, value)
+    if response is not None:
+        response.headers["X-Cache"] = "HIT" if hit else "MISS"
+    return value
+
+
+def make_etag(user_id: str, resource: str, version: str) -> str:
+    digest = hashlib.blake2b(f"{user_id}|{resource}|{version}".encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison against an If-None-Match header (list of tags or *)"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    opaque = etag.removeprefix("W/")
+    return "*" in tags or any(tag.removeprefix("W/") == opaque for tag in tags)
+
+
+def conditional_get(*versioned_by: str, daily: bool = False):
+    """
+    Dependency for read endpoints: ETag derived from the user's "data" (default) and/or "alerts" versions.
+    A matching If-None-Match is answered with 304 before the endpoint runs, so only the
+    (cached) version lookup is done. Returns the headers to put on a 200 response;
+    they are already set on the injected Response for endpoints that return plain data.
+    `daily` folds the date in for views that depend on today's date.
+    """
+    async def dependency(request: Request, response: Response, user: User = Depends(get_current_user),
+                         portfolio_id: Optional[str] = None) -> dict:
+        versions = []
+        for kind in versioned_by or ("data",):
+            if kind == "alerts":
+                versions.append(await data_versions.get_alerts(user.user_id))
+            else:
+                versions.append(await data_versions.get(user.user_id, portfolio_id))
+        version = "/".join(versions)
+        if daily:
+            version = f"{version}:{daily_view_key()}"
+        resource = f"{request.url.path}?{request.url.query}|{'msgpack' if wants_msgpack(request) else 'json'}"
+        etag = make_etag(user.user_id, resource, version)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return headers
+    return dependency
+
+
 # ==================== PORTFOLIO MANAGEMENT ROUTES ====================
 
 @api_router.get("/portfolios")
@@ -1180,10 +2527,13 @@ async def get_portfolios(user: User = Depends(get_current_user)):
         portfolios = [doc]
         
         # Update existing stocks/dividends to use this portfolio
-        await db.stocks.update_many(
+        moved = await db.stocks.update_many(
             {"user_id": user.user_id, "$or": [{"portfolio_id": None}, {"portfolio_id": ""}, {"portfolio_id": {"$exists": False}}]},
             {"$set": {"portfolio_id": default_portfolio.portfolio_id}}
         )
+        if moved.modified_count:
+            await position_ledger.invalidate(user.user_id)
+            await data_versions.bump(user.user_id)
         await db.dividends.update_many(
             {"user_id": user.user_id, "$or": [{"portfolio_id": None}, {"portfolio_id": ""}, {"portfolio_id": {"$exists": False}}]},
             {"$set": {"portfolio_id": default_portfolio.portfolio_id}}
@@ -1240,6 +2590,8 @@ async def delete_portfolio(portfolio_id: str, user: User = Depends(get_current_u
     # Delete all stocks and dividends in this portfolio
     await db.stocks.delete_many({"portfolio_id": portfolio_id, "user_id": user.user_id})
     await db.dividends.delete_many({"portfolio_id": portfolio_id, "user_id": user.user_id})
+    await position_ledger.drop_portfolio(user.user_id, portfolio_id)
+    await data_versions.bump(user.user_id, [portfolio_id])
     
     # Delete the portfolio
     await db.portfolios.delete_one({"portfolio_id": portfolio_id, "user_id": user.user_id})
@@ -1247,39 +2599,186 @@ async def delete_portfolio(portfolio_id: str, user: User = Depends(get_current_u
     return {"message": "Portfolio deleted", "deleted_stocks": True}
 
 @api_router.get("/portfolios/{portfolio_id}")
-async def get_portfolio(portfolio_id: str, user: User = Depends(get_current_user)):
+async def get_portfolio(portfolio_id: str, response: Response, user: User = Depends(get_current_user)):
     """Get a specific portfolio with stats"""
     portfolio = await db.portfolios.find_one({"portfolio_id": portfolio_id, "user_id": user.user_id}, {"_id": 0})
     if not portfolio:
         raise HTTPException(status_code=404, detail="Portfolio not found")
     
-    # Add stats
-    stocks = await db.stocks.find({"portfolio_id": portfolio_id, "user_id": user.user_id}, {"_id": 0}).to_list(1000)
-    dividends = await db.dividends.find({"portfolio_id": portfolio_id, "user_id": user.user_id}, {"_id": 0}).to_list(10000)
-    
-    # Bonificações: NOT counted as invested, but counted in current value
-    stocks_without_bonificacao = [s for s in stocks if s.get("operation_type") != "bonificacao"]
+    async def compute_stats():
+        query = {"portfolio_id": portfolio_id, "user_id": user.user_id}
+        stocks = await db.stocks.find(query, {"_id": 0}).to_list(1000)
+        dividends = await db.dividends.find(query, {"_id": 0}).to_list(10000)
+        
+        # Bonificações: NOT counted as invested, but counted in current value
+        stocks_without_bonificacao = [s for s in stocks if s.get("operation_type") != "bonificacao"]
+        
+        return {
+            "stocks_count": len(stocks),
+            "total_invested": sum(s["quantity"] * s["average_price"] for s in stocks_without_bonificacao),
+            "total_current": sum(s["quantity"] * (s.get("current_price") or s["average_price"]) for s in stocks),
+            "total_dividends": sum(d["amount"] for d in dividends),
+        }
     
-    portfolio["stocks_count"] = len(stocks)
-    portfolio["total_invested"] = sum(s["quantity"] * s["average_price"] for s in stocks_without_bonificacao)
-    portfolio["total_current"] = sum(s["quantity"] * (s.get("current_price") or s["average_price"]) for s in stocks)
-    portfolio["total_dividends"] = sum(d["amount"] for d in dividends)
+    # Add stats
+    portfolio.update(await cached_portfolio_view(user.user_id, portfolio_id, "portfolio_stats", compute_stats, response))
     
     return portfolio
 
+# ==================== STREAMED LISTINGS ====================
+
+STOCK_LISTING_SORT = [("_id", ASCENDING)]
+DIVIDEND_LISTING_SORT = [("payment_date", DESCENDING), ("_id", DESCENDING)]
+STOCK_LISTING_FIELDS = frozenset(Stock.model_fields)
+DIVIDEND_LISTING_FIELDS = frozenset(Dividend.model_fields)
+
+def parse_listing_fields(fields: Optional[str], allowed: frozenset, sort_keys: list):
+    """Turn ?fields=a,b into a Mongo projection (sort keys are always fetched for the cursor)"""
+    if not fields:
+        return None, None
+    requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(unknown)}")
+    projection = {f: 1 for f in requested}
+    projection.update({key: 1 for key, _ in sort_keys})
+    return projection, requested
+
+def encode_listing_cursor(doc: dict, sort_keys: list) -> str:
+    """Opaque cursor holding the sort key values of the last document of a page"""
+    values = [str(doc["_id"]) if key == "_id" else doc.get(key) for key, _ in sort_keys]
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def listing_cursor_filter(cursor: str, sort_keys: list) -> dict:
+    """Keyset filter for the documents strictly after the cursor in sort order"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(sort_keys):
+            raise ValueError("cursor length")
+        values = [ObjectId(v) if key == "_id" else v for (key, _), v in zip(sort_keys, values)]
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    # (k1 > v1) or (k1 == v1 and k2 > v2) ... with the comparison flipped for descending keys.
+    # Null/missing values sort before everything else, which $gt/$lt alone would never match
+    clauses = []
+    for i, (key, direction) in enumerate(sort_keys):
+        clause = {k: v for (k, _), v in zip(sort_keys[:i], values[:i])}
+        value = values[i]
+        if value is None:
+            if direction != ASCENDING:
+                continue  # nothing sorts after null in descending order
+            clause[key] = {"$ne": None}
+        elif direction == ASCENDING:
+            clause[key] = {"$gt": value}
+        elif key == "_id":
+            clause[key] = {"$lt": value}
+        else:
+            clause["$or"] = [{key: {"$lt": value}}, {key: None}]
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+def listing_date_range(date_from: Optional[str], date_to: Optional[str]) -> Optional[dict]:
+    """Inclusive YYYY-MM-DD range over a string date field"""
+    date_range = {}
+    if date_from:
+        date_range["$gte"] = date_from
+    if date_to:
+        date_range["$lte"] = date_to
+    return date_range or None
+
+async def _iter_listing_docs(source):
+    if isinstance(source, list):
+        for doc in source:
+            yield doc
+    else:
+        async for doc in source:
+            yield doc
+
+async def _project_listing_docs(source, fields: Optional[list] = None):
+    async for doc in _iter_listing_docs(source):
+        doc.pop("_id", None)
+        if fields is not None:
+            doc = {f: doc[f] for f in fields if f in doc}
+        yield doc
+
+async def stream_json_array(source, fields: Optional[list] = None):
+    """Encode documents as a JSON array, a batch at a time, as they come off the cursor"""
+    yield b"["
+    batch = []
+    first = True
+    async for doc in _project_listing_docs(source, fields):
+        batch.append(dumps_json(doc))
+        if len(batch) >= LISTING_BATCH_SIZE:
+            yield (b"" if first else b",") + b",".join(batch)
+            batch = []
+            first = False
+    if batch:
+        yield (b"" if first else b",") + b",".join(batch)
+    yield b"]"
+
+async def streamed_listing(request: Request, collection, query: dict, sort_keys: list, allowed_fields: frozenset,
+                           fields: Optional[str] = None, limit: Optional[int] = None,
+                           cursor: Optional[str] = None, headers: Optional[dict] = None) -> Response:
+    """Keyset-paginated listing streamed as a JSON array.
+
+    Without `limit` the whole result is streamed (old behaviour, minus the truncation).
+    With `limit` one page is returned and X-Next-Cursor is set when there is more;
+    pages can also be requested as MessagePack (the unbounded stream is JSON only).
+    """
+    projection, requested = parse_listing_fields(fields, allowed_fields, sort_keys)
+    if cursor:
+        query = {**query, **listing_cursor_filter(cursor, sort_keys)}
+    find = collection.find(query, projection).sort(sort_keys)
+
+    headers = dict(headers or {})
+    if limit is None:
+        source = find.batch_size(LISTING_BATCH_SIZE)
+    else:
+        limit = min(limit, LISTING_MAX_LIMIT)
+        # One extra document tells whether there is a next page
+        source = await find.limit(limit + 1).to_list(limit + 1)
+        if len(source) > limit:
+            source = source[:limit]
+            headers["X-Next-Cursor"] = encode_listing_cursor(source[-1], sort_keys)
+        if wants_msgpack(request):
+            page = [doc async for doc in _project_listing_docs(source, requested)]
+            return MsgPackResponse(page, headers={**headers, "Vary": "Accept"})
+    return StreamingResponse(stream_json_array(source, requested), media_type="application/json",
+                             headers={**headers, "Vary": "Accept"})
+
 # ==================== PORTFOLIO STOCKS ROUTES ====================
 
 @api_router.get("/portfolio/stocks")
-async def get_stocks(user: User = Depends(get_current_user), portfolio_id: Optional[str] = None):
-    """Get stocks, optionally filtered by portfolio"""
+async def get_stocks(
+    request: Request,
+    user: User = Depends(get_current_user),
+    etag_headers: dict = Depends(conditional_get()),
+    portfolio_id: Optional[str] = None,
+    ticker: Optional[str] = None,
+    operation_type: Optional[str] = Query(None, alias="type"),
+    asset_type: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+):
+    """Get stocks, optionally filtered by portfolio, ticker, operation type and purchase date"""
     query = {"user_id": user.user_id}
     if portfolio_id:
         query["portfolio_id"] = portfolio_id
-    else:
-        # If no portfolio_id specified, get all stocks (for backwards compatibility)
-        pass
-    stocks = await db.stocks.find(query, {"_id": 0}).to_list(1000)
-    return stocks
+    if ticker:
+        query["ticker"] = ticker.upper().strip()
+    if operation_type:
+        query["operation_type"] = operation_type
+    if asset_type:
+        query["asset_type"] = asset_type
+    purchase_range = listing_date_range(date_from, date_to)
+    if purchase_range:
+        query["purchase_date"] = purchase_range
+    return await streamed_listing(request, db.stocks, query, STOCK_LISTING_SORT, STOCK_LISTING_FIELDS, fields, limit, cursor, etag_headers)
 
 @api_router.post("/portfolio/stocks")
 async def add_stock(stock_data: StockCreate, user: User = Depends(get_current_user)):
@@ -1334,6 +2833,8 @@ async def add_stock(stock_data: StockCreate, user: User = Depends(get_current_us
     doc["created_at"] = doc["created_at"].isoformat()
     doc["updated_at"] = doc["updated_at"].isoformat()
     await db.stocks.insert_one(doc)
+    await position_ledger.touch(user.user_id, portfolio_id, stock.ticker, stock.purchase_date)
+    await data_versions.bump(user.user_id, [portfolio_id])
     return {k: v for k, v in doc.items() if k != "_id"}
 
 @api_router.put("/portfolio/stocks/{stock_id}")
@@ -1363,6 +2864,12 @@ async def update_stock(stock_id: str, stock_data: StockUpdate, user: User = Depe
     
     stock = await db.stocks.find_one({"stock_id": stock_id, "user_id": user.user_id}, {"_id": 0})
     
+    if LEDGER_LOT_FIELDS & update_fields.keys():
+        # Old and new (portfolio, ticker) series; the same key is redone from the earlier date
+        await position_ledger.touch_many(user.user_id, ledger_changes([old_stock, stock]))
+    if update_fields:
+        await data_versions.bump(user.user_id, [old_stock.get("portfolio_id"), stock.get("portfolio_id")])
+    
     # Check if quantity or purchase_date changed - need to recalculate dividends
     new_quantity = stock.get("quantity", 0)
     new_purchase_date = stock.get("purchase_date")
@@ -1371,18 +2878,21 @@ async def update_stock(stock_id: str, stock_data: StockUpdate, user: User = Depe
     date_changed = old_purchase_date != new_purchase_date
     
     if quantity_changed or date_changed:
-        # Re-sync dividends for this ticker automatically
-        resync_result = await resync_dividends_for_ticker(user.user_id, ticker, stock.get("portfolio_id"))
-        logger.info(f"Auto-resynced dividends for {ticker} - quantity: {old_quantity} -> {new_quantity}, result: {resync_result}")
-        stock["dividends_resynced"] = resync_result
+        # Re-sync dividends for this ticker in the background; edits in quick succession share one run
+        for key in {(old_stock.get("portfolio_id"), old_stock.get("ticker")), (stock.get("portfolio_id"), ticker)}:
+            dividend_resync_queue.enqueue(user.user_id, *key)
+        logger.info(f"Queued dividend resync for {ticker} - quantity: {old_quantity} -> {new_quantity}")
+        stock["dividends_resync"] = "queued"
     
     return stock
 
 
 async def resync_dividends_for_ticker(user_id: str, ticker: str, portfolio_id: str = None):
     """
-    Remove proventos existentes de um ticker e re-sincroniza com valores atualizados.
-    Chamado automaticamente quando a quantidade de um ativo é alterada.
+    Recalcula os proventos de um ticker com as quantidades atuais dos lotes.
+    Chamado pela fila de resync quando a quantidade ou a data de um ativo é alterada.
+    The expected rows are diffed against the stored ones and only the differences are written,
+    in one unordered bulk_write.
     """
     # Get all stocks for this ticker
     query = {"user_id": user_id, "ticker": ticker}
@@ -1393,109 +2903,101 @@ async def resync_dividends_for_ticker(user_id: str, ticker: str, portfolio_id: s
     if not user_stocks:
         return {"deleted": 0, "synced": 0, "message": "No stocks found"}
     
-    # Delete all dividends for this ticker
     div_query = {"user_id": user_id, "ticker": ticker}
     if portfolio_id:
         div_query["portfolio_id"] = portfolio_id
     
-    delete_result = await db.dividends.delete_many(div_query)
-    deleted_count = delete_result.deleted_count
-    
     # Determine if FII or stock
     asset_type = user_stocks[0].get("asset_type", detect_asset_type(ticker))
     is_fii = asset_type == "fii"
     
-    # Re-sync dividends for this specific ticker
+    events, existing_docs = await asyncio.gather(
+        dividend_catalog.events(ticker, is_fii),
+        db.dividends.find(div_query, {"_id": 1, "portfolio_id": 1, "ex_date": 1, "payment_date": 1, "type": 1,
+                                      "amount": 1, "unit_value": 1, "quantity": 1}).to_list(None),
+    )
+    if not events:
+        # Catalog unavailable for now: leave the stored dividends alone
+        return {"deleted": 0, "updated": 0, "synced": 0, "ticker": ticker, "message": "Sem proventos no catálogo"}
+    
+    # Only rows inside the period the catalog covers can be judged as no longer owed
+    covered_from = min(div["data_com"] for div in events)
+    covered_to = max(div["data_com"] for div in events)
+    
+    # Expected dividends keyed like the dedup index (repeated rows from the source count once)
     today = datetime.now(timezone.utc).date()
-    synced = 0
+    entitlement = LotEntitlement(user_stocks)
+    expected = {}
+    for div in events:
+        dt_com_obj = datetime.strptime(div["data_com"], "%Y-%m-%d").date()
+        
+        # Skip future dividends
+        if today < dt_com_obj:
+            continue
+        
+        # Check for sales on this date
+        if entitlement.has_sale_on(div["data_com"]):
+            continue
+        
+        # Calculate eligible shares
+        total_eligible_shares, first_lot = entitlement.eligible(dt_com_obj)
+        if total_eligible_shares <= 0:
+            continue
+        
+        # Skip bonificações (handled separately)
+        if div.get("is_bonificacao"):
+            continue
+        
+        eligible_portfolio_id = first_lot.get("portfolio_id") or portfolio_id
+        key = (eligible_portfolio_id, div["data_com"], div["data_pagamento"], div["tipo"])
+        expected.setdefault(key, {
+            "portfolio_id": eligible_portfolio_id,
+            "amount": round(div["valor"] * total_eligible_shares, 2),
+            "unit_value": div["valor"],
+            "quantity": total_eligible_shares,
+        })
     
-    async with httpx.AsyncClient(follow_redirects=True) as client:
-        page = 1
-        while page <= 10:
-            # Use appropriate scraper function
-            if is_fii:
-                data = await fetch_investidor10_fii_dividends_async(client, ticker, page)
-            else:
-                data = await fetch_investidor10_dividends_async(client, ticker, page)
-            
-            if not data:
-                break
-            
-            for div in data:
-                dt_com_obj = datetime.strptime(div["data_com"], "%Y-%m-%d").date()
-                
-                # Skip future dividends
-                if today < dt_com_obj:
-                    continue
-                
-                # Check for sales on this date
-                has_sale_on_date = any(
-                    s.get("operation_type") == "venda" and 
-                    s.get("purchase_date") and
-                    s.get("purchase_date")[:10] == div["data_com"]
-                    for s in user_stocks
-                )
-                if has_sale_on_date:
-                    continue
-                
-                # Calculate eligible shares
-                total_eligible_shares = 0
-                eligible_portfolio_id = None
-                for s in user_stocks:
-                    p_date_str = s.get("purchase_date")
-                    op_type = s.get("operation_type", "compra")
-                    
-                    if not p_date_str or op_type != "compra":
-                        continue
-                    
-                    try:
-                        p_dt = datetime.strptime(p_date_str[:10], "%Y-%m-%d").date()
-                    except:
-                        continue
-                    
-                    if p_dt <= dt_com_obj:
-                        total_eligible_shares += s.get("quantity", 0)
-                        if not eligible_portfolio_id:
-                            eligible_portfolio_id = s.get("portfolio_id")
-                
-                if total_eligible_shares <= 0:
-                    continue
-                
-                # Skip bonificações (handled separately)
-                if div.get("is_bonificacao"):
-                    continue
-                
-                # Calculate total amount
-                total_amount = round(div["valor"] * total_eligible_shares, 2)
-                
-                # Insert dividend
-                await db.dividends.insert_one({
-                    "dividend_id": f"div_{uuid.uuid4().hex[:12]}",
-                    "user_id": user_id,
-                    "ticker": ticker,
-                    "portfolio_id": eligible_portfolio_id or portfolio_id,
-                    "amount": total_amount,
-                    "payment_date": div["data_pagamento"],
-                    "ex_date": div["data_com"],
-                    "type": div["tipo"],
-                    "created_at": datetime.now(timezone.utc).isoformat()
-                })
-                synced += 1
-            
-            # Stop if dividends are too old (2 years)
-            if data:
-                last_div_dt = datetime.strptime(data[-1]["data_com"], "%Y-%m-%d").date()
-                if last_div_dt < (today - timedelta(days=730)):
-                    break
-            page += 1
+    operations = []
+    deleted = updated = 0
+    for doc in existing_docs:
+        key = (doc.get("portfolio_id"), doc.get("ex_date"), doc.get("payment_date"), doc.get("type"))
+        fields = expected.pop(key, None)
+        if fields is None:
+            # No longer owed (or a duplicate of a row already matched)
+            if doc.get("ex_date") and covered_from <= doc["ex_date"] <= covered_to:
+                operations.append(DeleteOne({"_id": doc["_id"]}))
+                deleted += 1
+        elif any(doc.get(field) != value for field, value in fields.items()):
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+            updated += 1
+    
+    created_at = datetime.now(timezone.utc).isoformat()
+    for (_, ex_date, payment_date, div_type), fields in expected.items():
+        operations.append(InsertOne({
+            "dividend_id": f"div_{uuid.uuid4().hex[:12]}",
+            "user_id": user_id,
+            "ticker": ticker,
+            **fields,
+            "payment_date": payment_date,
+            "ex_date": ex_date,
+            "type": div_type,
+            "created_at": created_at
+        }))
     
-    logger.info(f"Resynced {ticker}: deleted {deleted_count}, synced {synced} dividends")
+    # Inserts made meanwhile by a concurrent sync hit the dedup index and are skipped
+    duplicates = await bulk_write_ignoring_duplicates(db.dividends, operations)
+    synced = sum(1 for i, op in enumerate(operations) if isinstance(op, InsertOne) and i not in duplicates)
+    
+    logger.info(f"Resynced {ticker}: deleted {deleted}, updated {updated}, synced {synced} dividends")
+    if operations:
+        await data_versions.bump(user_id, [portfolio_id])
     
     return {
-        "deleted": deleted_count,
+        "deleted": deleted,
+        "updated": updated,
         "synced": synced,
         "ticker": ticker,
-        "message": f"Proventos recalculados: {synced} sincronizados"
+        "message": f"Proventos recalculados: {synced} sincronizados, {updated} atualizados, {deleted} removidos"
     }
 
 @api_router.post("/portfolio/stocks/{stock_id}/sell")
@@ -1559,10 +3061,12 @@ async def sell_stock(stock_id: str, sale_data: dict, user: User = Depends(get_cu
     remaining_to_sell = quantity_sold
     stocks_deleted = 0
     stocks_updated = 0
+    sold_lots = []
     
     for stock in all_stocks:
         if remaining_to_sell <= 0:
             break
+        sold_lots.append(stock)
         
         stock_qty = stock["quantity"]
         
@@ -1583,6 +3087,10 @@ async def sell_stock(stock_id: str, sale_data: dict, user: User = Depends(get_cu
             logger.info(f"Stock {ticker} purchase {stock['stock_id']} updated: {stock_qty} -> {new_qty}")
             remaining_to_sell = 0
     
+    # Lots are reduced in place, so positions change from each sold lot's purchase date
+    await position_ledger.touch_many(user.user_id, ledger_changes(sold_lots))
+    await data_versions.bump(user.user_id, {lot.get("portfolio_id") for lot in sold_lots})
+    
     return {
         "message": "Venda processada com sucesso",
         "ticker": ticker,
@@ -1602,31 +3110,47 @@ async def delete_all_stocks(user: User = Depends(get_current_user)):
     result = await db.stocks.delete_many({"user_id": user.user_id})
     # Also delete related dividends
     await db.dividends.delete_many({"user_id": user.user_id})
+    await position_ledger.invalidate(user.user_id)
+    await data_versions.bump(user.user_id)
     return {"message": f"{result.deleted_count} ações excluídas", "deleted": result.deleted_count}
 
 @api_router.delete("/portfolio/stocks/{stock_id}")
 async def delete_stock(stock_id: str, user: User = Depends(get_current_user)):
-    result = await db.stocks.delete_one({"stock_id": stock_id, "user_id": user.user_id})
-    if result.deleted_count == 0:
+    deleted = await db.stocks.find_one_and_delete(
+        {"stock_id": stock_id, "user_id": user.user_id}, projection=LEDGER_LOT_PROJECTION
+    )
+    if not deleted:
         raise HTTPException(status_code=404, detail="Stock not found")
+    await position_ledger.touch_many(user.user_id, ledger_changes([deleted]))
+    await data_versions.bump(user.user_id, [deleted.get("portfolio_id")])
     return {"message": "Stock deleted"}
 
 
-@api_router.get("/portfolio/ideal-distribution")
-async def get_ideal_distribution(user: User = Depends(get_current_user), portfolio_id: Optional[str] = None):
+@api_router.get("/portfolio/ideal-distribution", dependencies=[Depends(conditional_get())])
+async def get_ideal_distribution(response: Response, user: User = Depends(get_current_user), portfolio_id: Optional[str] = None):
     """
     Analyze current portfolio and suggest ideal distribution based on:
     - Current sector allocation
     - Risk profile
     - Diversification best practices
     """
+    return await cached_portfolio_view(
+        user.user_id, portfolio_id, "ideal_distribution",
+        lambda: compute_ideal_distribution(user.user_id, portfolio_id), response
+    )
+
+
+async def compute_ideal_distribution(user_id: str, portfolio_id: Optional[str] = None) -> dict:
     # Build query
-    query = {"user_id": user.user_id}
+    query = {"user_id": user_id}
     if portfolio_id:
         query["portfolio_id"] = portfolio_id
     
     stocks = await db.stocks.find(query, {"_id": 0}).to_list(1000)
-    
+    return ideal_distribution_from_lots(stocks)
+
+
+def ideal_distribution_from_lots(stocks: List[dict]) -> dict:
     if not stocks:
         return {
             "distribution": [],
@@ -1788,111 +3312,277 @@ async def get_ideal_distribution(user: User = Depends(get_current_user), portfol
     }
 
 
-@api_router.get("/portfolio/summary")
-async def get_portfolio_summary(user: User = Depends(get_current_user), portfolio_id: Optional[str] = None):
+# ==================== SNAPSHOT WRITE-BEHIND ====================
+
+class SnapshotWriter:
+    """
+    Write-behind buffer for the daily summary snapshots. GET /portfolio/summary records the latest
+    totals here instead of writing; updates are coalesced per (user, portfolio, day) and flushed as
+    one upsert each ($setOnInsert keeps the day's reference values), periodically and on shutdown.
+    The day's reference (previous close) is looked up once and cached.
+    """
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._pending = {}     # (user_id, portfolio_id, day) -> {"set": {...}, "insert": {...}}
+        self._references = {}  # (user_id, portfolio_id, day) -> {"reference_gain", "reference_current"}
+        self._task = None
+        self.stats = {"recorded": 0, "flushes": 0, "written": 0, "reference_hits": 0, "reference_misses": 0, "errors": 0}
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Snapshot flush error: {e}")
+    
+    async def reference(self, user_id: str, portfolio_id: Optional[str], day: str, total_gain: float, total_current: float) -> dict:
+        """Reference values (previous close) for the day's result; current totals when there is no history"""
+        key = (user_id, portfolio_id, day)
+        cached = self._references.get(key)
+        if cached:
+            self.stats["reference_hits"] += 1
+            return cached
+        self.stats["reference_misses"] += 1
+        
+        # Yesterday's last totals may still be buffered
+        if any(k[:2] == key[:2] and k[2] < day for k in self._pending):
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Snapshot flush before reference lookup failed: {e}")
+        
+        snapshot_query = {"user_id": user_id, "portfolio_id": portfolio_id}
+        today_snapshot, last_snapshot = await asyncio.gather(
+            db.portfolio_snapshots.find_one({**snapshot_query, "date": day}, {"_id": 0}),
+            db.portfolio_snapshots.find_one({**snapshot_query, "date": {"$lt": day}}, {"_id": 0}, sort=[("date", -1)]),
+        )
+        
+        # O valor de referência é o resultado total do ÚLTIMO snapshot (fechamento anterior)
+        # Se não houver snapshot anterior, usa o resultado atual como base (variação = 0)
+        reference_gain = last_snapshot.get("total_gain", total_gain) if last_snapshot else total_gain
+        reference_current = last_snapshot.get("total_current", total_current) if last_snapshot else total_current
+        if today_snapshot:
+            reference_gain = today_snapshot.get("reference_gain", reference_gain)
+            reference_current = today_snapshot.get("reference_current", reference_current)
+        
+        cached = {"reference_gain": round(reference_gain, 2), "reference_current": round(reference_current, 2)}
+        self._references[key] = cached
+        return cached
+    
+    def record(self, user_id: str, portfolio_id: Optional[str], day: str, totals: dict, reference: dict):
+        """Buffer the latest totals for (user, portfolio, day); later calls overwrite earlier ones"""
+        self._pending[(user_id, portfolio_id, day)] = {"set": totals, "insert": reference}
+        self.stats["recorded"] += 1
+    
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        now_iso = datetime.now(timezone.utc).isoformat()
+        operations = []
+        for (user_id, portfolio_id, day), entry in pending.items():
+            operations.append(UpdateOne(
+                {"user_id": user_id, "portfolio_id": portfolio_id, "date": day},
+                {
+                    "$set": entry["set"],
+                    "$setOnInsert": {
+                        "snapshot_id": f"snap_{uuid.uuid4().hex[:12]}",
+                        **entry["insert"],
+                        "total_dividends": 0,
+                        "created_at": now_iso,
+                    },
+                },
+                upsert=True
+            ))
+        try:
+            await db.portfolio_snapshots.bulk_write(operations, ordered=False)
+        except Exception:
+            # Keep entries that were not superseded meanwhile for the next flush
+            for key, entry in pending.items():
+                self._pending.setdefault(key, entry)
+            raise
+        self.stats["flushes"] += 1
+        self.stats["written"] += len(operations)
+        
+        # References are only needed for the current day
+        latest_day = max(day for _, _, day in pending)
+        for key in [k for k in self._references if k[2] < latest_day]:
+            del self._references[key]
+    
+    def snapshot(self) -> dict:
+        return {**self.stats, "pending": len(self._pending), "references": len(self._references), "interval": self.interval}
+
+
+snapshot_writer = SnapshotWriter(SNAPSHOT_FLUSH_INTERVAL)
+
+
+SUMMARY_ASSET_TYPES = ["acao", "fii", "renda_fixa"]
+
+
+async def aggregate_portfolio_totals(query: dict) -> dict:
+    """
+    Invested/current sums overall and per asset type, computed by Mongo.
+    Only the group totals cross the wire, regardless of how many lots the user has.
+    """
+    pipeline = [
+        {"$match": query},
+        {"$project": {
+            "_id": 0,
+            # Same default as s.get("asset_type", "acao"): only a missing field becomes "acao"
+            "asset_type": {"$cond": [{"$eq": [{"$type": "$asset_type"}, "missing"]}, "acao", "$asset_type"]},
+            # Bonificações should NOT count as invested (you didn't pay for them)
+            "invested": {"$cond": [
+                {"$eq": ["$operation_type", "bonificacao"]},
+                0,
+                {"$multiply": ["$quantity", "$average_price"]}
+            ]},
+            # But bonificações SHOULD count in current value (current_price or average_price)
+            "current": {"$multiply": ["$quantity", {"$cond": ["$current_price", "$current_price", "$average_price"]}]},
+        }},
+        {"$facet": {
+            "totals": [
+                {"$group": {"_id": None, "invested": {"$sum": "$invested"}, "current": {"$sum": "$current"}, "count": {"$sum": 1}}},
+            ],
+            "by_type": [
+                {"$group": {"_id": "$asset_type", "invested": {"$sum": "$invested"}, "current": {"$sum": "$current"}, "count": {"$sum": 1}}},
+            ],
+        }},
+    ]
+    result = await db.stocks.aggregate(pipeline).to_list(1)
+    facets = result[0] if result else {"totals": [], "by_type": []}
+    totals = facets["totals"][0] if facets["totals"] else {"invested": 0, "current": 0, "count": 0}
+    return {
+        "invested": totals["invested"],
+        "current": totals["current"],
+        "count": totals["count"],
+        "by_type": {g["_id"]: g for g in facets["by_type"]},
+    }
+
+
+async def aggregate_dividend_totals(query: dict, today: str) -> dict:
+    """Received (payment_date <= today) and pending dividend sums, computed by Mongo"""
+    pipeline = [
+        {"$match": query},
+        {"$project": {
+            "_id": 0,
+            "amount": 1,
+            "received": {"$lte": [{"$substrCP": [{"$ifNull": ["$payment_date", ""]}, 0, 10]}, today]},
+        }},
+        {"$group": {"_id": "$received", "amount": {"$sum": "$amount"}}},
+    ]
+    groups = await db.dividends.aggregate(pipeline).to_list(None)
+    sums = {g["_id"]: g["amount"] for g in groups}
+    return {"received": sums.get(True, 0), "pending": sums.get(False, 0)}
+
+
+def summarize_lot_totals(stocks: List[dict]) -> dict:
+    """Same result as aggregate_portfolio_totals, for lots already in memory"""
+    totals = {"invested": 0, "current": 0, "count": 0}
+    by_type = {}
+    for lot in stocks:
+        asset_type = lot["asset_type"] if "asset_type" in lot else "acao"
+        invested = 0 if lot.get("operation_type") == "bonificacao" else lot["quantity"] * lot["average_price"]
+        current = lot["quantity"] * (lot.get("current_price") or lot["average_price"])
+        group = by_type.setdefault(asset_type, {"_id": asset_type, "invested": 0, "current": 0, "count": 0})
+        for target in (totals, group):
+            target["invested"] += invested
+            target["current"] += current
+            target["count"] += 1
+    return {**totals, "by_type": by_type}
+
+
+def summarize_dividend_totals(dividends: List[dict], today: str) -> dict:
+    """Same result as aggregate_dividend_totals, for dividends already in memory"""
+    sums = {"received": 0, "pending": 0}
+    for div in dividends:
+        received = (div.get("payment_date") or "")[:10] <= today
+        sums["received" if received else "pending"] += div["amount"]
+    return sums
+
+
+@api_router.get("/portfolio/summary", dependencies=[Depends(conditional_get(daily=True))])
+async def get_portfolio_summary(request: Request, response: Response, user: User = Depends(get_current_user), portfolio_id: Optional[str] = None):
     # Build query based on portfolio_id
     query = {"user_id": user.user_id}
     if portfolio_id:
         query["portfolio_id"] = portfolio_id
     
-    stocks = await db.stocks.find(query, {"_id": 0}).to_list(1000)
+    # Stock and dividend aggregates run concurrently; dividends only filter on payment_date
+    now = datetime.now(timezone.utc)
+    today = now.strftime("%Y-%m-%d")
     
-    # Bonificações should NOT count as invested (you didn't pay for them)
-    # But bonificações SHOULD count in current value and result (you own them)
-    stocks_without_bonificacao = [s for s in stocks if s.get("operation_type") != "bonificacao"]
+    async def compute():
+        return await asyncio.gather(
+            aggregate_portfolio_totals(query),
+            aggregate_dividend_totals(query, today),
+        )
+    
+    totals, dividend_totals = await cached_portfolio_view(
+        user.user_id, portfolio_id, f"summary:{daily_view_key(now)}", compute, response
+    )
+    summary = await build_portfolio_summary(user.user_id, portfolio_id, totals, dividend_totals)
+    return encoded_response(request, summary, response)
+
+
+async def build_portfolio_summary(user_id: str, portfolio_id: Optional[str], totals: dict, dividend_totals: dict) -> dict:
+    """Summary payload from the lot and dividend totals; records today's snapshot (write-behind)"""
+    stocks_count = totals["count"]
     
     # Invested = only what you paid (excludes bonificações)
-    total_invested = sum(s["quantity"] * s["average_price"] for s in stocks_without_bonificacao)
+    total_invested = totals["invested"]
     # Current = everything you own (includes bonificações)
-    total_current = sum(s["quantity"] * (s.get("current_price") or s["average_price"]) for s in stocks)
+    total_current = totals["current"]
     # Result = current - invested (bonificações appear as gain)
     total_gain = total_current - total_invested
     gain_percent = (total_gain / total_invested * 100) if total_invested > 0 else 0
     
     # Calculate daily result (Resultado do Dia)
     # Reset daily at 00:01 BRT (UTC-3) as per B3 announcement
-    now_utc = datetime.now(timezone.utc)
-    brt_offset = timedelta(hours=-3)
-    now_brt = now_utc + brt_offset
-    today_brt = now_brt.strftime("%Y-%m-%d")
-    
-    # Buscar ou criar snapshot do dia para calcular resultado do dia
-    # O snapshot armazena o "Resultado Total" de REFERÊNCIA (fechamento anterior)
-    snapshot_query = {"user_id": user.user_id, "date": today_brt}
-    if portfolio_id:
-        snapshot_query["portfolio_id"] = portfolio_id
-    
-    today_snapshot = await db.portfolio_snapshots.find_one(snapshot_query, {"_id": 0})
-    
-    # Buscar o último snapshot para usar como referência
-    last_snapshot_query = {"user_id": user.user_id, "date": {"$lt": today_brt}}
-    if portfolio_id:
-        last_snapshot_query["portfolio_id"] = portfolio_id
+    today_brt = brt_day()
     
-    last_snapshot = await db.portfolio_snapshots.find_one(
-        last_snapshot_query,
-        {"_id": 0},
-        sort=[("date", -1)]
-    )
-    
-    # O valor de referência é o resultado total do ÚLTIMO snapshot (fechamento anterior)
-    # Se não houver snapshot anterior, usa o resultado atual como base (variação = 0)
-    reference_total_gain = last_snapshot.get("total_gain", total_gain) if last_snapshot else total_gain
-    reference_total_current = last_snapshot.get("total_current", total_current) if last_snapshot else total_current
-    
-    if not today_snapshot:
-        # Criar snapshot do dia com o RESULTADO DE REFERÊNCIA (fechamento anterior)
-        # Isso permite calcular a variação mesmo que o usuário só abra o app agora
-        new_snapshot = {
-            "snapshot_id": f"snap_{uuid.uuid4().hex[:12]}",
-            "user_id": user.user_id,
-            "date": today_brt,
-            "total_invested": round(total_invested, 2),
-            "total_current": round(total_current, 2),
-            "total_gain": round(total_gain, 2),  # Resultado atual (para usar amanhã como referência)
-            "reference_gain": round(reference_total_gain, 2),  # Referência do dia anterior
-            "reference_current": round(reference_total_current, 2),
-            "total_dividends": 0,
-            "stocks_count": len(stocks),
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        if portfolio_id:
-            new_snapshot["portfolio_id"] = portfolio_id
-            
-        await db.portfolio_snapshots.insert_one(new_snapshot)
-        today_snapshot = new_snapshot
-    else:
-        # Atualizar o snapshot atual com o resultado mais recente
-        # (para que o fechamento do dia seja salvo corretamente)
-        await db.portfolio_snapshots.update_one(
-            {"snapshot_id": today_snapshot["snapshot_id"]},
-            {"$set": {
-                "total_invested": round(total_invested, 2),
-                "total_current": round(total_current, 2),
-                "total_gain": round(total_gain, 2),
-                "stocks_count": len(stocks)
-            }}
-        )
+    # O snapshot do dia guarda o "Resultado Total" de REFERÊNCIA (fechamento anterior).
+    # This request only reads: the reference is cached and the latest totals are written behind.
+    reference = await snapshot_writer.reference(user_id, portfolio_id, today_brt, total_gain, total_current)
+    snapshot_writer.record(user_id, portfolio_id, today_brt, {
+        "total_invested": round(total_invested, 2),
+        "total_current": round(total_current, 2),
+        "total_gain": round(total_gain, 2),  # Resultado atual (para usar amanhã como referência)
+        "stocks_count": stocks_count
+    }, reference)
     
     # Calcular resultado do dia: diferença entre resultado ATUAL e resultado de REFERÊNCIA
     # A referência é o fechamento do dia anterior (armazenado em reference_gain)
-    snapshot_reference_gain = today_snapshot.get("reference_gain", reference_total_gain)
+    snapshot_reference_gain = reference["reference_gain"]
     daily_gain = total_gain - snapshot_reference_gain
     
     # Calcular percentual em relação ao valor de referência
-    snapshot_reference_current = today_snapshot.get("reference_current", reference_total_current)
+    snapshot_reference_current = reference["reference_current"]
     daily_gain_percent = (daily_gain / snapshot_reference_current * 100) if snapshot_reference_current > 0 else 0
     
-    # Calculate breakdown by asset type
-    asset_types = ["acao", "fii", "renda_fixa"]
+    # Breakdown by asset type
     breakdown = {}
     
-    for asset_type in asset_types:
-        type_stocks = [s for s in stocks if s.get("asset_type", "acao") == asset_type]
-        type_stocks_no_bonus = [s for s in type_stocks if s.get("operation_type") != "bonificacao"]
-        
-        type_invested = sum(s["quantity"] * s["average_price"] for s in type_stocks_no_bonus)
-        type_current = sum(s["quantity"] * (s.get("current_price") or s["average_price"]) for s in type_stocks)
+    for asset_type in SUMMARY_ASSET_TYPES:
+        group = totals["by_type"].get(asset_type, {"invested": 0, "current": 0, "count": 0})
+        type_invested = group["invested"]
+        type_current = group["current"]
         type_gain = type_current - type_invested
         type_gain_percent = (type_gain / type_invested * 100) if type_invested > 0 else 0
         
@@ -1905,25 +3595,12 @@ async def get_portfolio_summary(user: User = Depends(get_current_user), portfoli
             "gain": round(type_gain, 2),
             "gain_percent": round(type_gain_percent, 2),
             "invested_percent": round(invested_percent, 2),
-            "count": len(type_stocks)
+            "count": group["count"]
         }
     
-    # Get dividends and filter only those already paid
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    div_query = {"user_id": user.user_id}
-    if portfolio_id:
-        div_query["portfolio_id"] = portfolio_id
-    dividends = await db.dividends.find(div_query, {"_id": 0}).to_list(10000)
-    
-    # Only sum dividends where payment_date <= today
-    total_dividends_received = sum(
-        d["amount"] for d in dividends 
-        if d.get("payment_date", "")[:10] <= today
-    )
-    total_dividends_pending = sum(
-        d["amount"] for d in dividends 
-        if d.get("payment_date", "")[:10] > today
-    )
+    # Only dividends where payment_date <= today count as received
+    total_dividends_received = dividend_totals["received"]
+    total_dividends_pending = dividend_totals["pending"]
     
     return {
         "total_invested": round(total_invested, 2),
@@ -1934,13 +3611,13 @@ async def get_portfolio_summary(user: User = Depends(get_current_user), portfoli
         "daily_gain_percent": round(daily_gain_percent, 2),
         "total_dividends": round(total_dividends_received, 2),
         "total_dividends_pending": round(total_dividends_pending, 2),
-        "stocks_count": len(stocks),
+        "stocks_count": stocks_count,
         "breakdown": breakdown
     }
 
 @api_router.post("/portfolio/refresh-prices")
 async def refresh_portfolio_prices(user: User = Depends(get_current_user)):
-    """Refresh all stock prices - uses Yahoo Finance as primary source with graceful fallback"""
+    """Apply the latest ingested prices to the user's stocks (static fallback for unknown tickers)"""
     stocks = await db.stocks.find({"user_id": user.user_id}, {"_id": 0}).to_list(1000)
     updated = 0
     alerts_created = 0
@@ -1951,113 +3628,95 @@ async def refresh_portfolio_prices(user: User = Depends(get_current_user)):
     unique_tickers = list(set(stock["ticker"] for stock in stocks))
     ticker_prices = {}  # Cache prices by ticker
     
-    # Fetch price for each unique ticker
+    # Read the latest ingested prices (the background ingestor keeps them fresh for every held ticker)
+    quotes = await market_data.get_prices(unique_tickers)
+    
     for ticker in unique_tickers:
-        try:
-            new_price = None
-            source = None
-            
-            # Try Yahoo Finance first (most reliable for B3 stocks)
-            yahoo_data = await fetch_yahoo_finance_quote(ticker)
-            if yahoo_data and yahoo_data.get("price", 0) > 0:
-                new_price = yahoo_data["price"]
-                source = "yahoo_finance"
-            else:
-                # Fallback to TradingView
-                tv_data = fetch_tradingview_quote(ticker)
-                if tv_data and tv_data.get("price", 0) > 0:
-                    new_price = tv_data["price"]
-                    source = "tradingview"
-                else:
-                    # Try Alpha Vantage
-                    await asyncio.sleep(0.2)
-                    av_data = await fetch_alpha_vantage_quote(ticker)
-                    if av_data and av_data.get("price", 0) > 0:
-                        new_price = av_data["price"]
-                        source = "alpha_vantage"
-                    else:
-                        # Final fallback: use cached/static data
-                        if ticker in BRAZILIAN_STOCKS:
-                            new_price = BRAZILIAN_STOCKS[ticker].get("current_price")
-                            source = "cache"
-                            cached_prices += 1
-            
-            if new_price and new_price > 0:
-                ticker_prices[ticker] = {"price": new_price, "source": source}
-                if source != "cache":
-                    logger.info(f"Fetched {ticker}: R${new_price:.2f} (source: {source})")
-            else:
-                errors.append(ticker)
-                logger.debug(f"Could not fetch price for {ticker} - APIs may be unavailable")
-            
-            # Small delay between requests
-            await asyncio.sleep(0.1)
-                
-        except Exception as e:
-            logger.debug(f"Error fetching price for {ticker}: {type(e).__name__}")
+        new_price = None
+        source = None
+        
+        quote = quotes.get(ticker)
+        if quote:
+            new_price = quote["price"]
+            source = quote["source"]
+        elif ticker in BRAZILIAN_STOCKS:
+            # Final fallback: use cached/static data
+            new_price = BRAZILIAN_STOCKS[ticker].get("current_price")
+            source = "cache"
+            cached_prices += 1
+        
+        if new_price and new_price > 0:
+            ticker_prices[ticker] = {"price": new_price, "source": source}
+            if source != "cache":
+                logger.info(f"Fetched {ticker}: R${new_price:.2f} (source: {source})")
+        else:
             errors.append(ticker)
+            logger.debug(f"Could not fetch price for {ticker} - APIs may be unavailable")
+    
+    now_utc = datetime.now(timezone.utc)
+    now_iso = now_utc.isoformat()
+    today = now_utc.strftime("%Y-%m-%d")
+    tomorrow = (now_utc + timedelta(days=1)).strftime("%Y-%m-%d")
+    # Daily variation resets at 00:01 BRT
+    today_brt = (now_utc + timedelta(hours=-3)).strftime("%Y-%m-%d")
+    
+    # Tickers that already raised a ceiling alert today - one query for the whole refresh
+    alerted_today = set(await db.alerts.distinct("ticker", {
+        "user_id": user.user_id,
+        "alert_type": "ceiling_reached",
+        "created_at": {"$gte": today, "$lt": tomorrow}
+    }))
+    
+    stock_operations = []
+    alert_docs = []
     
-    # Update all stock records with fetched prices
+    # Build updates for all stock records with fetched prices
     for stock in stocks:
         ticker = stock["ticker"]
-        if ticker in ticker_prices:
-            new_price = ticker_prices[ticker]["price"]
-            
-            # Check for ceiling price alerts (only once per ticker)
-            if stock.get("ceiling_price") and new_price >= stock["ceiling_price"]:
-                today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-                existing_alert = await db.alerts.find_one({
-                    "user_id": user.user_id,
-                    "ticker": ticker,
-                    "alert_type": "ceiling_reached",
-                    "created_at": {"$regex": f"^{today}"}
-                })
-                
-                if not existing_alert:
-                    alert = Alert(
-                        user_id=user.user_id,
-                        stock_id=stock["stock_id"],
-                        ticker=ticker,
-                        alert_type="ceiling_reached",
-                        message=f"{ticker} atingiu o preço teto! Atual: R${new_price:.2f}, Teto: R${stock['ceiling_price']:.2f}"
-                    )
-                    alert_doc = alert.model_dump()
-                    alert_doc["created_at"] = alert_doc["created_at"].isoformat()
-                    await db.alerts.insert_one(alert_doc)
-                    alerts_created += 1
-            
-            # Save current price as previous_close if it's a new day (based on BRT timezone)
-            # This allows us to track daily variation - resets at 00:01 BRT
-            now_utc = datetime.now(timezone.utc)
-            brt_offset = timedelta(hours=-3)
-            now_brt = now_utc + brt_offset
-            today_brt = now_brt.strftime("%Y-%m-%d")
-            
-            update_data = {
-                "current_price": new_price, 
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }
-            
-            # Check if we need to update previous_close (new day in BRT)
-            previous_close_date = stock.get("previous_close_date", "")
-            
-            # If it's a new day in BRT, save current price as previous close
-            if previous_close_date != today_brt:
-                # Save the current price (before update) as the previous close
-                update_data["previous_close"] = stock.get("current_price") or stock["average_price"]
-                update_data["previous_close_date"] = today_brt
-            
-            # If previous_close was never set, initialize it
-            if not stock.get("previous_close"):
-                update_data["previous_close"] = stock.get("current_price") or stock["average_price"]
-                update_data["previous_close_date"] = today_brt
-            
-            # Update this stock record
-            await db.stocks.update_one(
-                {"stock_id": stock["stock_id"]},
-                {"$set": update_data}
+        if ticker not in ticker_prices:
+            continue
+        new_price = ticker_prices[ticker]["price"]
+        
+        # Check for ceiling price alerts (only once per ticker per day)
+        if stock.get("ceiling_price") and new_price >= stock["ceiling_price"] and ticker not in alerted_today:
+            alert = Alert(
+                user_id=user.user_id,
+                stock_id=stock["stock_id"],
+                ticker=ticker,
+                alert_type="ceiling_reached",
+                message=f"{ticker} atingiu o preço teto! Atual: R${new_price:.2f}, Teto: R${stock['ceiling_price']:.2f}"
             )
-            updated += 1
+            alert_doc = alert.model_dump()
+            alert_doc["created_at"] = alert_doc["created_at"].isoformat()
+            alert_docs.append(alert_doc)
+            alerted_today.add(ticker)
+        
+        update_data = {}
+        if stock.get("current_price") != new_price:
+            update_data["current_price"] = new_price
+        
+        # Save current price as previous_close if it's a new day (based on BRT timezone)
+        # This allows us to track daily variation - resets at 00:01 BRT
+        # If previous_close was never set, initialize it
+        if stock.get("previous_close_date", "") != today_brt or not stock.get("previous_close"):
+            # Save the current price (before update) as the previous close
+            update_data["previous_close"] = stock.get("current_price") or stock["average_price"]
+            update_data["previous_close_date"] = today_brt
+        
+        # Skip the write entirely when nothing changed for this lot
+        if update_data:
+            update_data["updated_at"] = now_iso
+            stock_operations.append(UpdateOne({"stock_id": stock["stock_id"]}, {"$set": update_data}))
+        updated += 1
+    
+    if stock_operations:
+        await db.stocks.bulk_write(stock_operations, ordered=False)
+    if alert_docs:
+        await db.alerts.insert_many(alert_docs)
+        alerts_created = len(alert_docs)
+        await data_versions.bump_alerts(user.user_id)
+    if stock_operations:
+        await data_versions.bump(user.user_id)
     
     # Save portfolio snapshot
     await save_portfolio_snapshot(user.user_id)
@@ -2067,6 +3726,7 @@ async def refresh_portfolio_prices(user: User = Depends(get_current_user)):
         "total": len(stocks),
         "unique_tickers": len(unique_tickers),
         "alerts_created": alerts_created,
+        "written": len(stock_operations),
         "source": "yahoo_finance/tradingview/cache",
         "cached_prices": cached_prices
     }
@@ -2076,6 +3736,199 @@ async def refresh_portfolio_prices(user: User = Depends(get_current_user)):
     
     return result
 
+# ==================== POSITION LEDGER ====================
+
+# Lots without a parseable purchase_date count as owned since always
+LEDGER_UNDATED = "0000-00-00"
+LEDGER_LOT_FIELDS = {
+    "portfolio_id", "ticker", "quantity", "average_price", "purchase_date",
+    "operation_type", "asset_type", "name", "sector",
+}
+LEDGER_LOT_PROJECTION = {
+    "_id": 0, "portfolio_id": 1, "ticker": 1, "quantity": 1, "average_price": 1, "purchase_date": 1,
+    "operation_type": 1, "asset_type": 1, "name": 1, "sector": 1,
+}
+
+
+def _ledger_date(purchase_date) -> str:
+    return purchase_date if _parse_day_ordinal(purchase_date) is not None else LEDGER_UNDATED
+
+
+def build_position_series(lots: List[dict]) -> List[dict]:
+    """
+    Cumulative position of one (portfolio, ticker) at each date a lot starts counting.
+    cost excludes bonificações (what was paid); book_value includes them at their own average price.
+    """
+    deltas = {}
+    for lot in lots:
+        delta = deltas.setdefault(_ledger_date(lot.get("purchase_date")), {
+            "quantity": 0.0, "cost": 0.0, "book_value": 0.0, "bonus_quantity": 0.0, "lots": 0
+        })
+        value = lot["quantity"] * lot["average_price"]
+        delta["quantity"] += lot["quantity"]
+        delta["book_value"] += value
+        if lot.get("operation_type") == "bonificacao":
+            delta["bonus_quantity"] += lot["quantity"]
+        else:
+            delta["cost"] += value
+        delta["lots"] += 1
+    
+    series = []
+    running = {"quantity": 0.0, "cost": 0.0, "book_value": 0.0, "bonus_quantity": 0.0, "lots": 0}
+    for date in sorted(deltas):
+        for field, value in deltas[date].items():
+            running[field] += value
+        series.append({"date": date, **running})
+    return series
+
+
+class PositionLedger:
+    """
+    Materialized per (user, portfolio, ticker) position series in `position_ledger`, one document
+    per date where the position changes. Mutations call touch() with the earliest affected date and
+    only that tail of the series is rewritten. A user's ledger is built lazily on first read
+    (marker in `ledger_state`), so touches before that are no-ops.
+    """
+    
+    def __init__(self):
+        self._locks = {}
+        self.stats = {"builds": 0, "touches": 0, "points_written": 0}
+    
+    def _lock(self, user_id: str) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+    
+    async def _is_built(self, user_id: str) -> bool:
+        return await db.ledger_state.find_one({"_id": user_id}) is not None
+    
+    async def _write_series(self, user_id: str, portfolio_id, ticker: str, series: List[dict], from_date: str, meta: dict):
+        key = {"user_id": user_id, "portfolio_id": portfolio_id, "ticker": ticker}
+        tail = [p for p in series if p["date"] >= from_date]
+        await db.position_ledger.delete_many({
+            **key, "date": {"$gte": from_date, "$nin": [p["date"] for p in tail]}
+        })
+        if tail:
+            await db.position_ledger.bulk_write([
+                ReplaceOne({**key, "date": p["date"]}, {**key, **meta, **p}, upsert=True) for p in tail
+            ], ordered=False)
+        self.stats["points_written"] += len(tail)
+    
+    async def touch(self, user_id: str, portfolio_id, ticker: str, from_date: Optional[str] = None):
+        """Recompute one (portfolio, ticker) series from from_date onwards (everything when None)"""
+        async with self._lock(user_id):
+            if not await self._is_built(user_id):
+                return
+            lots = await db.stocks.find(
+                {"user_id": user_id, "portfolio_id": portfolio_id, "ticker": ticker}, LEDGER_LOT_PROJECTION
+            ).to_list(None)
+            meta = _ledger_meta(lots[0]) if lots else {}
+            start = _ledger_date(from_date) if from_date else LEDGER_UNDATED
+            await self._write_series(user_id, portfolio_id, ticker, build_position_series(lots), start, meta)
+            self.stats["touches"] += 1
+    
+    async def touch_many(self, user_id: str, changes: dict):
+        """changes: {(portfolio_id, ticker): earliest affected purchase_date}"""
+        await asyncio.gather(*[
+            self.touch(user_id, portfolio_id, ticker, from_date)
+            for (portfolio_id, ticker), from_date in changes.items()
+        ])
+    
+    async def build(self, user_id: str):
+        """Full rebuild of a user's ledger from their lots"""
+        lots = await db.stocks.find({"user_id": user_id}, LEDGER_LOT_PROJECTION).to_list(None)
+        grouped = {}
+        for lot in lots:
+            grouped.setdefault((lot.get("portfolio_id"), lot["ticker"]), []).append(lot)
+        
+        docs = []
+        for (portfolio_id, ticker), ticker_lots in grouped.items():
+            key = {"user_id": user_id, "portfolio_id": portfolio_id, "ticker": ticker}
+            meta = _ledger_meta(ticker_lots[0])
+            docs.extend({**key, **meta, **p} for p in build_position_series(ticker_lots))
+        
+        await db.position_ledger.delete_many({"user_id": user_id})
+        if docs:
+            await db.position_ledger.insert_many(docs, ordered=False)
+        await db.ledger_state.update_one(
+            {"_id": user_id},
+            {"$set": {"built_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+        self.stats["builds"] += 1
+        self.stats["points_written"] += len(docs)
+    
+    async def invalidate(self, user_id: str):
+        """Drop a user's ledger; it is rebuilt on the next read"""
+        async with self._lock(user_id):
+            await db.ledger_state.delete_one({"_id": user_id})
+            await db.position_ledger.delete_many({"user_id": user_id})
+    
+    async def drop_portfolio(self, user_id: str, portfolio_id: str):
+        async with self._lock(user_id):
+            await db.position_ledger.delete_many({"user_id": user_id, "portfolio_id": portfolio_id})
+    
+    async def points(self, user_id: str, portfolio_id: Optional[str] = None) -> List[dict]:
+        """All ledger points of a user (or one portfolio), sorted by date"""
+        async with self._lock(user_id):
+            if not await self._is_built(user_id):
+                await self.build(user_id)
+        query = {"user_id": user_id}
+        if portfolio_id:
+            query["portfolio_id"] = portfolio_id
+        return await db.position_ledger.find(query, {"_id": 0}).sort("date", 1).to_list(None)
+    
+    async def latest_positions(self, user_id: str, portfolio_id: Optional[str] = None) -> List[dict]:
+        """Current position of each (portfolio, ticker): the last point of its series"""
+        latest = {}
+        for point in await self.points(user_id, portfolio_id):
+            latest[(point.get("portfolio_id"), point["ticker"])] = point
+        return [p for p in latest.values() if p["lots"] > 0]
+    
+    def snapshot(self) -> dict:
+        return dict(self.stats)
+
+
+def _ledger_meta(lot: dict) -> dict:
+    return {
+        "asset_type": lot.get("asset_type", "acao"),
+        "name": lot.get("name", lot["ticker"]),
+        "sector": lot.get("sector", "Não informado"),
+    }
+
+
+def ledger_changes(lots: List[dict]) -> dict:
+    """Earliest affected date per (portfolio, ticker) for a set of changed lots"""
+    changes = {}
+    for lot in lots:
+        key = (lot.get("portfolio_id"), lot["ticker"])
+        date = _ledger_date(lot.get("purchase_date"))
+        changes[key] = min(changes.get(key, date), date)
+    return changes
+
+
+async def current_prices_by_ticker(query: dict) -> dict:
+    """Current price per ticker as stored on the lots (refresh writes the same price on every lot)"""
+    groups = await db.stocks.aggregate([
+        {"$match": query},
+        {"$group": {"_id": "$ticker", "price": {"$max": "$current_price"}}},
+    ]).to_list(None)
+    return {g["_id"]: g["price"] for g in groups if g["price"]}
+
+
+def prices_from_lots(stocks: List[dict]) -> dict:
+    """current_prices_by_ticker for lots already in memory"""
+    prices = {}
+    for lot in stocks:
+        price = lot.get("current_price")
+        if price is not None and (lot["ticker"] not in prices or price > prices[lot["ticker"]]):
+            prices[lot["ticker"]] = price
+    return {ticker: price for ticker, price in prices.items() if price}
+
+
+position_ledger = PositionLedger()
+
 # ==================== PORTFOLIO HISTORY ====================
 
 async def save_portfolio_snapshot(user_id: str):
@@ -2089,45 +3942,195 @@ async def save_portfolio_snapshot(user_id: str):
     if existing:
         return existing
     
-    stocks = await db.stocks.find({"user_id": user_id}, {"_id": 0}).to_list(1000)
-    dividends = await db.dividends.find({"user_id": user_id}, {"_id": 0}).to_list(10000)
-    
-    # Filter out bonificações from invested value calculation
-    stocks_without_bonificacao = [s for s in stocks if s.get("operation_type") != "bonificacao"]
-    
-    # Invested = only what you paid (excludes bonificações)
-    total_invested = sum(s["quantity"] * s["average_price"] for s in stocks_without_bonificacao)
-    # Current = everything you own (includes bonificações)
-    total_current = sum(s["quantity"] * (s.get("current_price") or s["average_price"]) for s in stocks)
-    total_dividends = sum(d["amount"] for d in dividends)
+    # Same aggregates as the summary: invested excludes bonificações, current includes them
+    totals, dividend_totals = await asyncio.gather(
+        aggregate_portfolio_totals({"user_id": user_id}),
+        aggregate_dividend_totals({"user_id": user_id}, today),
+    )
+    total_dividends = dividend_totals["received"] + dividend_totals["pending"]
     
     snapshot = PortfolioSnapshot(
         user_id=user_id,
         date=today,
-        total_invested=round(total_invested, 2),
-        total_current=round(total_current, 2),
+        total_invested=round(totals["invested"], 2),
+        total_current=round(totals["current"], 2),
         total_dividends=round(total_dividends, 2),
-        stocks_count=len(stocks)
+        stocks_count=totals["count"]
     )
     
     doc = snapshot.model_dump()
     doc["created_at"] = doc["created_at"].isoformat()
     await db.portfolio_snapshots.insert_one(doc)
     
-    return {k: v for k, v in doc.items() if k != "_id"}
+    return {k: v for k, v in doc.items() if k != "_id"}
+
+@api_router.get("/portfolio/history")
+async def get_portfolio_history(user: User = Depends(get_current_user), days: int = 30):
+    """Get portfolio evolution history"""
+    snapshots = await db.portfolio_snapshots.find(
+        {"user_id": user.user_id},
+        {"_id": 0}
+    ).sort("date", -1).limit(days).to_list(days)
+    
+    return list(reversed(snapshots))
+
+EVOLUTION_PERIOD_DAYS = {"1w": 7, "1m": 30, "12m": 365, "5y": 1825, "max": 3650}
+EVOLUTION_STEP_DAYS = {"1w": 1, "1m": 1, "12m": 7, "5y": 30, "max": 30}
+
+
+def _parse_day_ordinal(value) -> Optional[int]:
+    """Ordinal of a YYYY-MM-DD string, or None when strptime would reject it"""
+    try:
+        # fromisoformat is much faster; anything not shaped like YYYY-MM-DD goes through strptime
+        if len(value) == 10 and value[4] == "-" and value[7] == "-":
+            try:
+                return datetime.fromisoformat(value).toordinal()
+            except ValueError:
+                pass
+        return datetime.strptime(value, "%Y-%m-%d").toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def _evolution_from_events(event_dates, invested_deltas, current_deltas, dividends: List[dict], period: str, today,
+                           current_at=None) -> List[dict]:
+    """
+    Evolution series from position change events (day ordinal, invested delta, current delta).
+    Events and paid dividends are sorted once and turned into cumulative sums, so every
+    data point is a searchsorted lookup instead of a scan over all lots and dividends.
+    Ordinal 0 marks positions owned on every date (no parseable purchase_date).
+    current_at(points) may supply the market value per point instead of the current deltas.
+    """
+    today_ord = today.toordinal()
+    days_back = EVOLUTION_PERIOD_DAYS.get(period, 30)
+    step_days = EVOLUTION_STEP_DAYS.get(period, 1)
+    start_ord = today_ord - days_back
+    
+    parsed_dates = [d for d in event_dates if d]
+    if parsed_dates and min(parsed_dates) > start_ord:
+        start_ord = min(parsed_dates)
+    
+    event_dates = np.asarray(event_dates, dtype=np.int64)
+    order = np.argsort(event_dates, kind="stable")
+    event_dates = event_dates[order]
+    invested_cum = np.concatenate(([0.0], np.cumsum(np.asarray(invested_deltas, dtype=np.float64)[order])))
+    current_cum = np.concatenate(([0.0], np.cumsum(np.asarray(current_deltas, dtype=np.float64)[order])))
+    
+    # Only dividends already paid, keyed by payment date
+    paid = []
+    for div in dividends:
+        payment_ord = _parse_day_ordinal((div.get("payment_date") or "")[:10])
+        if payment_ord is not None and payment_ord <= today_ord:
+            paid.append((payment_ord, div["amount"]))
+    paid.sort(key=lambda x: x[0])
+    div_dates = np.asarray([d for d, _ in paid], dtype=np.int64)
+    div_cum = np.concatenate(([0.0], np.cumsum(np.asarray([a for _, a in paid], dtype=np.float64))))
+    
+    points = np.arange(start_ord, today_ord + 1, step_days, dtype=np.int64)
+    next_points = np.minimum(points + step_days, today_ord + 1)
+    
+    owned = np.searchsorted(event_dates, points, side="right")
+    invested = invested_cum[owned]
+    current = current_at(points) if current_at is not None else current_cum[owned]
+    
+    # Cumulative dividends UP TO each date (inclusive) and those paid in [date, next_date)
+    cumulative = div_cum[np.searchsorted(div_dates, points, side="right")]
+    period_lo = np.searchsorted(div_dates, points, side="left")
+    period_hi = np.searchsorted(div_dates, next_points, side="left")
+    period_divs = np.where(period_hi > period_lo, div_cum[period_hi] - div_cum[period_lo], 0.0)
+    
+    evolution = []
+    for point, total_invested, total_current, cumulative_dividends, period_dividends in zip(
+        points.tolist(), invested.tolist(), current.tolist(), cumulative.tolist(), period_divs.tolist()
+    ):
+        # Rounded check so float residue from removed positions does not produce points
+        if round(total_invested, 2) <= 0:
+            continue
+        appreciation_gain = total_current - total_invested
+        total_return = appreciation_gain + cumulative_dividends
+        evolution.append({
+            "date": datetime.fromordinal(point).strftime("%Y-%m-%d"),
+            "invested": round(total_invested, 2),
+            "current": round(total_current, 2),
+            "dividends": round(cumulative_dividends, 2),
+            "dividends_period": round(period_dividends, 2),
+            "total": round(total_current + cumulative_dividends, 2),
+            "gain": round(appreciation_gain, 2),
+            "gain_percent": round((appreciation_gain / total_invested) * 100, 2),
+            "total_return": round(total_return, 2),
+            "total_return_percent": round((total_return / total_invested) * 100, 2)
+        })
+    
+    return evolution
 
-@api_router.get("/portfolio/history")
-async def get_portfolio_history(user: User = Depends(get_current_user), days: int = 30):
-    """Get portfolio evolution history"""
-    snapshots = await db.portfolio_snapshots.find(
-        {"user_id": user.user_id},
-        {"_id": 0}
-    ).sort("date", -1).limit(days).to_list(days)
-    
-    return list(reversed(snapshots))
 
-@api_router.get("/portfolio/evolution")
-async def get_portfolio_evolution(user: User = Depends(get_current_user), period: str = "1m", portfolio_id: Optional[str] = None):
+def compute_portfolio_evolution(stocks: List[dict], dividends: List[dict], period: str, today) -> List[dict]:
+    """Evolution series computed straight from raw lots"""
+    lot_dates = []
+    lot_invested = []
+    lot_current = []
+    for stock in stocks:
+        # Lots without a parseable purchase_date count as owned on every date
+        purchase_ord = _parse_day_ordinal(stock.get("purchase_date")) if stock.get("purchase_date") else None
+        lot_dates.append(purchase_ord if purchase_ord is not None else 0)
+        lot_current.append(stock["quantity"] * (stock.get("current_price") or stock["average_price"]))
+        # Bonificações count in current value but not as invested
+        lot_invested.append(0.0 if stock.get("operation_type") == "bonificacao" else stock["quantity"] * stock["average_price"])
+    return _evolution_from_events(lot_dates, lot_invested, lot_current, dividends, period, today)
+
+
+def compute_ledger_evolution(points: List[dict], prices: dict, dividends: List[dict], period: str, today,
+                             history: Optional[dict] = None) -> List[dict]:
+    """
+    Evolution series from position ledger points (sorted by date).
+    With history ({ticker: (day ordinals, closes)}) each past date is valued at that day's close;
+    dates before a ticker's history and the current day use the current price, or book value
+    when there is none.
+    """
+    event_dates = []
+    invested_deltas = []
+    current_deltas = []
+    previous = {}
+    series = {}
+    for point in points:
+        key = (point.get("portfolio_id"), point["ticker"])
+        price = prices.get(point["ticker"])
+        current = point["quantity"] * price if price else point["book_value"]
+        prev_cost, prev_current = previous.get(key, (0.0, 0.0))
+        date_ord = _parse_day_ordinal(point["date"]) or 0
+        event_dates.append(date_ord)
+        invested_deltas.append(point["cost"] - prev_cost)
+        current_deltas.append(current - prev_current)
+        previous[key] = (point["cost"], current)
+        series.setdefault(key, []).append((date_ord, point["quantity"], current))
+    
+    if not history:
+        return _evolution_from_events(event_dates, invested_deltas, current_deltas, dividends, period, today)
+    
+    today_ord = today.toordinal()
+    
+    def current_at(day_points):
+        total = np.zeros(len(day_points), dtype=np.float64)
+        for (_, ticker), steps in series.items():
+            step_dates = np.asarray([d for d, _, _ in steps], dtype=np.int64)
+            step = np.searchsorted(step_dates, day_points, side="right") - 1
+            held = step >= 0
+            step = step.clip(min=0)
+            quantity = np.where(held, np.asarray([q for _, q, _ in steps], dtype=np.float64)[step], 0.0)
+            value = np.where(held, np.asarray([c for _, _, c in steps], dtype=np.float64)[step], 0.0)
+            if ticker in history:
+                closes_dates, closes = history[ticker]
+                bar = np.searchsorted(closes_dates, day_points, side="right") - 1
+                marked = (bar >= 0) & (day_points < today_ord)
+                value = np.where(marked, quantity * closes[bar.clip(min=0)], value)
+            total += value
+        return total
+    
+    return _evolution_from_events(event_dates, invested_deltas, current_deltas, dividends, period, today, current_at)
+
+
+@api_router.get("/portfolio/evolution", dependencies=[Depends(conditional_get(daily=True))])
+async def get_portfolio_evolution(request: Request, response: Response, user: User = Depends(get_current_user), period: str = "1m", portfolio_id: Optional[str] = None):
     """
     Get portfolio evolution based on purchase dates.
     Period options: 1w (week), 1m (month), 12m (year), 5y (5 years), max (all time)
@@ -2137,128 +4140,37 @@ async def get_portfolio_evolution(user: User = Depends(get_current_user), period
     - Mês 2: R$ 0,10 → Total: R$ 0,20 (0,10 + 0,10)
     - Mês 3: R$ 0,10 → Total: R$ 0,30 (0,20 + 0,10)
     """
-    query = {"user_id": user.user_id}
+    today = datetime.now(timezone.utc).date()
+    # Keyed by day too: stored closes and "paid so far" dividends move with the date
+    evolution = await cached_portfolio_view(
+        user.user_id, portfolio_id, f"evolution:{period}:{today.isoformat()}",
+        lambda: compute_evolution_view(user.user_id, portfolio_id, period, today), response
+    )
+    return encoded_response(request, evolution, response)
+
+
+async def compute_evolution_view(user_id: str, portfolio_id: Optional[str], period: str, today) -> List[dict]:
+    query = {"user_id": user_id}
     if portfolio_id:
         query["portfolio_id"] = portfolio_id
     
-    stocks = await db.stocks.find(query, {"_id": 0}).to_list(1000)
-    dividends = await db.dividends.find(query, {"_id": 0}).to_list(10000)
+    points, prices, dividends = await asyncio.gather(
+        position_ledger.points(user_id, portfolio_id),
+        current_prices_by_ticker(query),
+        db.dividends.find(query, {"_id": 0, "payment_date": 1, "amount": 1}).to_list(None),
+    )
     
-    if not stocks:
+    return await evolution_from_ledger(points, prices, dividends, period, today)
+
+
+async def evolution_from_ledger(points: List[dict], prices: dict, dividends: List[dict], period: str, today) -> List[dict]:
+    if not points:
         return []
     
-    today = datetime.now(timezone.utc).date()
-    
-    # Determine date range based on period
-    period_days = {"1w": 7, "1m": 30, "12m": 365, "5y": 1825, "max": 3650}
-    days_back = period_days.get(period, 30)
-    start_date = today - timedelta(days=days_back)
-    
-    # Find earliest purchase date
-    earliest_purchase = None
-    for stock in stocks:
-        if stock.get("purchase_date"):
-            try:
-                purchase_dt = datetime.strptime(stock["purchase_date"], "%Y-%m-%d").date()
-                if earliest_purchase is None or purchase_dt < earliest_purchase:
-                    earliest_purchase = purchase_dt
-            except:
-                pass
-    
-    if earliest_purchase and earliest_purchase > start_date:
-        start_date = earliest_purchase
-    
-    # Organize ALL dividends by payment date
-    all_dividends_sorted = []
-    for div in dividends:
-        payment_date = div.get("payment_date", "")[:10]
-        if payment_date:
-            try:
-                payment_dt = datetime.strptime(payment_date, "%Y-%m-%d").date()
-                if payment_dt <= today:  # Only already paid
-                    all_dividends_sorted.append({
-                        "date": payment_dt,
-                        "amount": div["amount"],
-                        "ticker": div.get("ticker", "")
-                    })
-            except:
-                pass
-    
-    # Sort by date
-    all_dividends_sorted.sort(key=lambda x: x["date"])
-    
-    # Determine step size
-    step_days = {"1w": 1, "1m": 1, "12m": 7, "5y": 30, "max": 30}.get(period, 1)
-    
-    # Generate data points
-    evolution = []
-    current_date = start_date
-    
-    while current_date <= today:
-        date_str = current_date.strftime("%Y-%m-%d")
-        next_date = current_date + timedelta(days=step_days)
-        if next_date > today:
-            next_date = today + timedelta(days=1)
-        
-        # Calculate invested and current value for stocks owned on this date
-        total_invested = 0
-        total_current = 0
-        
-        for stock in stocks:
-            is_bonificacao = stock.get("operation_type") == "bonificacao"
-            purchase_date = stock.get("purchase_date")
-            
-            # Check if stock was owned on current_date
-            owned = False
-            if purchase_date:
-                try:
-                    purchase_dt = datetime.strptime(purchase_date, "%Y-%m-%d").date()
-                    owned = purchase_dt <= current_date
-                except:
-                    owned = True
-            else:
-                owned = True
-            
-            if owned:
-                current_value = stock["quantity"] * (stock.get("current_price") or stock["average_price"])
-                total_current += current_value
-                if not is_bonificacao:
-                    invested = stock["quantity"] * stock["average_price"]
-                    total_invested += invested
-        
-        # Calculate cumulative dividends UP TO current_date (inclusive)
-        # This is the KEY: sum ALL dividends with payment_date <= current_date
-        cumulative_dividends = sum(
-            d["amount"] for d in all_dividends_sorted 
-            if d["date"] <= current_date
-        )
-        
-        # Calculate dividends received in THIS PERIOD (current_date to next_date - 1 day)
-        period_dividends = sum(
-            d["amount"] for d in all_dividends_sorted 
-            if current_date <= d["date"] < next_date
-        )
-        
-        if total_invested > 0:
-            appreciation_gain = total_current - total_invested
-            total_return = appreciation_gain + cumulative_dividends
-            
-            evolution.append({
-                "date": date_str,
-                "invested": round(total_invested, 2),
-                "current": round(total_current, 2),
-                "dividends": round(cumulative_dividends, 2),
-                "dividends_period": round(period_dividends, 2),
-                "total": round(total_current + cumulative_dividends, 2),
-                "gain": round(appreciation_gain, 2),
-                "gain_percent": round((appreciation_gain / total_invested) * 100, 2) if total_invested > 0 else 0,
-                "total_return": round(total_return, 2),
-                "total_return_percent": round((total_return / total_invested) * 100, 2) if total_invested > 0 else 0
-            })
-        
-        current_date = next_date
+    # Past dates are marked to market with stored closes (no upstream calls here)
+    history = await price_history.load(list({p["ticker"] for p in points}))
     
-    return evolution
+    return compute_ledger_evolution(points, prices, dividends, period, today, history)
 
 @api_router.post("/portfolio/snapshot")
 async def create_portfolio_snapshot(user: User = Depends(get_current_user)):
@@ -2842,14 +4754,19 @@ async def import_file(file: UploadFile = File(...), portfolio_id: Optional[str]
     
     imported = 0
     updated = 0
+    changed_lots = []
     
     # Log parsed data for debugging
     logger.info(f"Processing {len(stocks)} stock entries from file")
     for s in stocks[:5]:  # Log first 5 entries
         logger.info(f"  Parsed: {s['ticker']} qty={s['quantity']} price={s['average_price']} date={s.get('purchase_date')}")
     
-    # Cache for detected asset types/sectors to avoid repeated API calls for same ticker
-    detected_info_cache = {}
+    # Detect asset type/sector once per ticker, all tickers concurrently on the blocking executor
+    unique_tickers = list(dict.fromkeys(s["ticker"] for s in stocks))
+    detected_results = await asyncio.gather(*[run_blocking(detect_asset_type_from_investidor10, t) for t in unique_tickers])
+    detected_info_cache = dict(zip(unique_tickers, detected_results))
+    for ticker, detected_info in detected_info_cache.items():
+        logger.info(f"Detected {ticker}: type={detected_info.get('asset_type')}, sector={detected_info.get('sector')}")
     
     for stock_data in stocks:
         ticker = stock_data["ticker"]
@@ -2857,13 +4774,7 @@ async def import_file(file: UploadFile = File(...), portfolio_id: Optional[str]
         
         logger.info(f"Importing {ticker} with date={purchase_date}")
         
-        # Detect asset type and sector (use cache if available)
-        if ticker not in detected_info_cache:
-            detected_info = detect_asset_type_from_investidor10(ticker)
-            detected_info_cache[ticker] = detected_info
-            logger.info(f"Detected {ticker}: type={detected_info.get('asset_type')}, sector={detected_info.get('sector')}")
-        else:
-            detected_info = detected_info_cache[ticker]
+        detected_info = detected_info_cache[ticker]
         
         asset_type = detected_info.get("asset_type", "acao")
         detected_sector = detected_info.get("sector")
@@ -2879,6 +4790,7 @@ async def import_file(file: UploadFile = File(...), portfolio_id: Optional[str]
             query["purchase_date"] = {"$in": [None, ""]}
         
         existing = await db.stocks.find_one(query, {"_id": 0})
+        changed_lots.append({"portfolio_id": portfolio_id, "ticker": ticker, "purchase_date": purchase_date})
         
         # Get additional info from cache
         stock_info = BRAZILIAN_STOCKS.get(ticker, {})
@@ -2919,6 +4831,9 @@ async def import_file(file: UploadFile = File(...), portfolio_id: Optional[str]
             await db.stocks.insert_one(doc)
             imported += 1
     
+    await position_ledger.touch_many(user.user_id, ledger_changes(changed_lots))
+    await data_versions.bump(user.user_id, [portfolio_id])
+    
     return {
         "imported": imported,
         "updated": updated,
@@ -2955,15 +4870,15 @@ async def export_csv(user: User = Depends(get_current_user)):
 
 # ==================== ALERTS ====================
 
-@api_router.get("/alerts")
-async def get_alerts(user: User = Depends(get_current_user), unread_only: bool = False):
+@api_router.get("/alerts", dependencies=[Depends(conditional_get("alerts"))])
+async def get_alerts(request: Request, response: Response, user: User = Depends(get_current_user), unread_only: bool = False):
     """Get user alerts"""
     query = {"user_id": user.user_id}
     if unread_only:
         query["is_read"] = False
     
     alerts = await db.alerts.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return alerts
+    return encoded_response(request, alerts, response)
 
 @api_router.put("/alerts/{alert_id}/read")
 async def mark_alert_read(alert_id: str, user: User = Depends(get_current_user)):
@@ -2974,6 +4889,7 @@ async def mark_alert_read(alert_id: str, user: User = Depends(get_current_user))
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Alert not found")
+    await data_versions.bump_alerts(user.user_id)
     return {"message": "Alert marked as read"}
 
 @api_router.put("/alerts/read-all")
@@ -2983,6 +4899,8 @@ async def mark_all_alerts_read(user: User = Depends(get_current_user)):
         {"user_id": user.user_id, "is_read": False},
         {"$set": {"is_read": True}}
     )
+    if result.modified_count:
+        await data_versions.bump_alerts(user.user_id)
     return {"message": f"{result.modified_count} alerts marked as read"}
 
 @api_router.delete("/alerts/{alert_id}")
@@ -2991,25 +4909,377 @@ async def delete_alert(alert_id: str, user: User = Depends(get_current_user)):
     result = await db.alerts.delete_one({"alert_id": alert_id, "user_id": user.user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Alert not found")
+    await data_versions.bump_alerts(user.user_id)
     return {"message": "Alert deleted"}
 
-@api_router.get("/alerts/count")
+@api_router.get("/alerts/count", dependencies=[Depends(conditional_get("alerts"))])
 async def get_unread_alerts_count(user: User = Depends(get_current_user)):
     """Get count of unread alerts"""
     count = await db.alerts.count_documents({"user_id": user.user_id, "is_read": False})
     return {"count": count}
 
+# ==================== DIVIDEND ENTITLEMENT ====================
+
+class LotEntitlement:
+    """
+    Eligible shares of one ticker at any data com. Purchase lots are parsed and sorted by date
+    once, with cumulative quantities and the earliest-listed lot per prefix, so each dividend is
+    a bisect instead of a scan over every lot. Same rules as before: only "compra" lots dated on
+    or before the data com count, and a sale on the data com forfeits the event.
+    """
+    
+    def __init__(self, lots: List[dict]):
+        self.sale_dates = {
+            lot["purchase_date"][:10] for lot in lots
+            if lot.get("operation_type") == "venda" and lot.get("purchase_date")
+        }
+        purchases = []
+        for position, lot in enumerate(lots):
+            if lot.get("operation_type", "compra") != "compra" or not lot.get("purchase_date"):
+                continue
+            try:
+                purchase_dt = datetime.strptime(lot["purchase_date"][:10], "%Y-%m-%d").date()
+            except ValueError:
+                continue
+            purchases.append((purchase_dt, position, lot))
+        purchases.sort(key=lambda item: item[:2])
+        
+        self.dates = [purchase_dt for purchase_dt, _, _ in purchases]
+        self.cumulative = []
+        self.first_lots = []  # lot listed first among the purchases up to each prefix
+        total, first = 0, None
+        for _, position, lot in purchases:
+            total += lot.get("quantity", 0)
+            if first is None or position < first[0]:
+                first = (position, lot)
+            self.cumulative.append(total)
+            self.first_lots.append(first[1])
+    
+    def has_sale_on(self, data_com: str) -> bool:
+        return data_com in self.sale_dates
+    
+    def eligible(self, data_com) -> tuple:
+        """(shares, first eligible lot) for purchases on or before data_com (a date)"""
+        i = bisect.bisect_right(self.dates, data_com)
+        if not i:
+            return 0, None
+        return self.cumulative[i - 1], self.first_lots[i - 1]
+
+# ==================== DIVIDEND EVENTS CATALOG ====================
+
+class DividendCatalog:
+    """
+    Scraped Investidor10 dividend rows shared by every user, one `dividend_events` document per
+    ticker. A leased job refreshes every held ticker once per (Brasília) day; a sync that finds a
+    ticker missing or stale scrapes it on demand. Per-user syncs join these rows against their
+    lots, so scraping scales with distinct tickers instead of users.
+    
+    Refreshes are incremental: each document keeps a fingerprint of page 1 and the newest
+    `data_com` ingested (the watermark). An unchanged page 1 ends the refresh there; otherwise
+    paging stops at the first page reaching the watermark and the older known rows are kept.
+    `full=True` ignores both and re-reads every page.
+    """
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task = None
+        self._inflight = {}  # ticker -> task, so concurrent requests share one scrape
+        self.stats = {"runs": 0, "scraped": 0, "refreshed": 0, "unchanged": 0, "pages": 0,
+                      "incomplete": 0, "empty": 0, "errors": 0, "last_run": None}
+    
+    def start(self):
+        if DIVIDEND_CATALOG_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            try:
+                if await acquire_scheduler_lease("dividend_catalog_refresh", self.interval * 2):
+                    await self.refresh_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Dividend catalog refresh error: {e}")
+            await asyncio.sleep(self.interval)
+    
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(BRASIL_TZ).date().isoformat()
+    
+    def _is_stale(self, doc: Optional[dict], is_fii: bool) -> bool:
+        if not doc or doc.get("is_fii") != is_fii:
+            return True
+        if doc.get("fetched_day") == self._today():
+            return False
+        # Failed scrapes are retried at most once per retry interval
+        return time.time() - doc.get("checked_ts", 0) > DIVIDEND_CATALOG_RETRY_INTERVAL
+    
+    async def refresh_all(self):
+        """Refresh every held ação/FII ticker not yet scraped today"""
+        held = {"operation_type": {"$ne": "bonificacao"}}
+        acoes, fiis = await asyncio.gather(
+            db.stocks.distinct("ticker", {**held, "asset_type": {"$in": ["acao", None]}}),
+            db.stocks.distinct("ticker", {**held, "asset_type": "fii"}),
+        )
+        kinds = {**{t: False for t in acoes}, **{t: True for t in fiis}}
+        await self.events_many(kinds)
+        self.stats["runs"] += 1
+        self.stats["last_run"] = datetime.now(timezone.utc).isoformat()
+        logger.info(f"Dividend catalog refresh: {len(kinds)} tickers checked")
+    
+    async def events_many(self, kinds: dict, full: bool = False) -> dict:
+        """{ticker: rows} for {ticker: is_fii}, refreshing the missing/stale tickers first (all of them if full)"""
+        if not kinds:
+            return {}
+        docs = await db.dividend_events.find({"_id": {"$in": list(kinds)}}).to_list(None)
+        by_ticker = {doc["_id"]: doc for doc in docs}
+        stale = [t for t, is_fii in kinds.items() if full or self._is_stale(by_ticker.get(t), is_fii)]
+        if stale:
+            sem = asyncio.Semaphore(DIVIDEND_CATALOG_CONCURRENCY)
+            
+            async def refresh(ticker):
+                async with sem:
+                    return ticker, await self.refresh(ticker, kinds[ticker], by_ticker.get(ticker), full)
+            
+            by_ticker.update(await asyncio.gather(*[refresh(t) for t in stale]))
+        return {t: (by_ticker.get(t) or {}).get("events", []) for t in kinds}
+    
+    async def events(self, ticker: str, is_fii: bool, full: bool = False) -> List[dict]:
+        return (await self.events_many({ticker: is_fii}, full))[ticker]
+    
+    async def refresh(self, ticker: str, is_fii: bool, previous: Optional[dict] = None, full: bool = False) -> dict:
+        key = (ticker, full)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(ticker, is_fii, previous, full))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+    
+    async def _refresh(self, ticker: str, is_fii: bool, stored: Optional[dict], full: bool = False) -> dict:
+        self.stats["refreshed"] += 1
+        previous = stored
+        if not previous or previous.get("is_fii") != is_fii or not previous.get("events"):
+            previous = None  # nothing usable to resume from
+        result = await self.scrape(ticker, is_fii, None if full else previous)
+        doc = {"_id": ticker, "is_fii": is_fii, "checked_ts": time.time()}
+        if result is None or not result[0]:
+            # A page failed (the rows would be truncated) or nothing came back at all (most likely a
+            # scraping problem): keep what is stored without marking the day as fetched, so
+            # DIVIDEND_CATALOG_RETRY_INTERVAL schedules the retry
+            doc = {**doc, "events": [], **(stored or {}), "checked_ts": doc["checked_ts"]}
+            self.stats["incomplete" if result is None else "empty"] += 1
+            await db.dividend_events.replace_one({"_id": ticker}, doc, upsert=True)
+            return doc
+        scraped, fingerprint, reached_known = result
+        fresh = {"fetched_day": self._today(), "fetched_at": datetime.now(timezone.utc).isoformat()}
+        if previous and not full and fingerprint == previous.get("fingerprint"):
+            # Page 1 is exactly what was ingested last time: nothing new upstream
+            doc.update(previous, **fresh, checked_ts=doc["checked_ts"])
+            self.stats["unchanged"] += 1
+        else:
+            events = merge_dividend_events(scraped, previous["events"]) if reached_known else scraped
+            doc.update(events=events, fingerprint=fingerprint, watermark=newest_data_com(events), **fresh)
+        await db.dividend_events.replace_one({"_id": ticker}, doc, upsert=True)
+        return doc
+    
+    async def scrape(self, ticker: str, is_fii: bool, previous: Optional[dict] = None):
+        """
+        Investidor10 pages for a ticker, newest first: (rows, page 1 fingerprint, reached_known),
+        or None if a page failed to load. Stops once rows are older than two years or, given the
+        previous document, when page 1 is unchanged or a page reaches its watermark.
+        """
+        client = http_clients.get("investidor10")
+        fetch = fetch_investidor10_fii_dividends_async if is_fii else fetch_investidor10_dividends_async
+        today = datetime.now(timezone.utc).date()
+        watermark = previous.get("watermark") if previous else None
+        events, fingerprint = [], None
+        page = 1
+        while page <= 10:
+            data = await fetch(client, ticker, page)
+            self.stats["pages"] += 1
+            if data is None:
+                return None
+            if not data:
+                break
+            events.extend(data)
+            if page == 1:
+                fingerprint = dividend_events_fingerprint(data)
+                if previous and fingerprint == previous.get("fingerprint"):
+                    break
+            # Chegou nos proventos já conhecidos: o restante vem do documento anterior
+            if watermark and data[-1]["data_com"] < watermark:
+                self.stats["scraped"] += 1
+                return events, fingerprint, True
+            # Para de buscar se os dividendos forem muito antigos (2 anos)
+            last_div_dt = datetime.strptime(data[-1]["data_com"], "%Y-%m-%d").date()
+            if last_div_dt < (today - timedelta(days=730)):
+                break
+            page += 1
+        self.stats["scraped"] += 1
+        return events, fingerprint, False
+    
+    def snapshot(self) -> dict:
+        return {**self.stats, "enabled": DIVIDEND_CATALOG_ENABLED, "interval": self.interval, "inflight": len(self._inflight)}
+
+
+def dividend_events_fingerprint(rows: List[dict]) -> str:
+    return hashlib.blake2b(orjson.dumps(rows, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
+
+
+def newest_data_com(rows: List[dict]) -> Optional[str]:
+    return max((row["data_com"] for row in rows), default=None)
+
+
+def merge_dividend_events(scraped: List[dict], known: List[dict]) -> List[dict]:
+    """
+    Newest scraped pages followed by the known rows older than them. Known rows on the oldest
+    scraped date are kept unless that page already brought them (the date may span pages).
+    """
+    cutoff = scraped[-1]["data_com"]
+    return scraped + [
+        row for row in known
+        if row["data_com"] < cutoff or (row["data_com"] == cutoff and row not in scraped)
+    ]
+
+
+dividend_catalog = DividendCatalog(DIVIDEND_CATALOG_CHECK_INTERVAL)
+
+# ==================== DIVIDEND RESYNC QUEUE ====================
+
+class DividendResyncQueue:
+    """
+    Background dividend resyncs, coalesced per (user, portfolio, ticker). Every enqueue pushes the
+    job's due time DIVIDEND_RESYNC_DEBOUNCE seconds ahead, so a burst of lot edits runs one resync
+    after it settles. A key re-queued while its job runs waits for that run to finish. Pending
+    jobs are run on shutdown.
+    """
+    
+    def __init__(self, debounce: float, concurrency: int):
+        self.debounce = debounce
+        self.concurrency = concurrency
+        self._pending = {}  # (user_id, portfolio_id, ticker) -> due (loop time)
+        self._running = {}  # key -> task
+        self._wake = None
+        self._task = None
+        self.stats = {"enqueued": 0, "coalesced": 0, "runs": 0, "errors": 0}
+    
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.drain()
+    
+    def enqueue(self, user_id: str, portfolio_id: Optional[str], ticker: str):
+        key = (user_id, portfolio_id, ticker)
+        if key in self._pending:
+            self.stats["coalesced"] += 1
+        self._pending[key] = asyncio.get_running_loop().time() + self.debounce
+        self.stats["enqueued"] += 1
+        if self._wake:
+            self._wake.set()
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wake.clear()
+            now = loop.time()
+            waiting = [(due, key) for key, due in self._pending.items() if key not in self._running]
+            for due, key in waiting:
+                if due <= now and len(self._running) < self.concurrency:
+                    del self._pending[key]
+                    self._start_job(key)
+            # Sleep until the next due job, or until an enqueue/finished job changes the schedule
+            timeout = None
+            if len(self._running) < self.concurrency:
+                timeout = min((due - now for due, key in waiting if key in self._pending), default=None)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(timeout, 0) if timeout is not None else None)
+            except asyncio.TimeoutError:
+                pass
+    
+    def _start_job(self, key):
+        task = asyncio.create_task(self._execute(key))
+        self._running[key] = task
+        
+        def done(_):
+            self._running.pop(key, None)
+            if self._wake:
+                self._wake.set()
+        
+        task.add_done_callback(done)
+    
+    async def _execute(self, key):
+        user_id, portfolio_id, ticker = key
+        try:
+            await resync_dividends_for_ticker(user_id, ticker, portfolio_id)
+            self.stats["runs"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Dividend resync error for {ticker}: {e}")
+    
+    async def drain(self):
+        """Run every pending job now (after the running ones finish)"""
+        if self._running:
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+        pending, self._pending = self._pending, {}
+        for key in pending:
+            await self._execute(key)
+    
+    def snapshot(self) -> dict:
+        return {**self.stats, "pending": len(self._pending), "running": len(self._running), "debounce": self.debounce}
+
+
+dividend_resync_queue = DividendResyncQueue(DIVIDEND_RESYNC_DEBOUNCE, DIVIDEND_RESYNC_CONCURRENCY)
+
 # ==================== DIVIDENDS ROUTES ====================
 
 @api_router.get("/dividends")
-async def get_dividends(user: User = Depends(get_current_user), portfolio_id: Optional[str] = None):
+async def get_dividends(
+    request: Request,
+    user: User = Depends(get_current_user),
+    etag_headers: dict = Depends(conditional_get()),
+    portfolio_id: Optional[str] = None,
+    ticker: Optional[str] = None,
+    dividend_type: Optional[str] = Query(None, alias="type"),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+):
     query = {"user_id": user.user_id}
     if portfolio_id:
         query["portfolio_id"] = portfolio_id
-    
-    # Busca e ordena pela data de pagamento mais recente
-    dividends = await db.dividends.find(query, {"_id": 0}).sort("payment_date", -1).to_list(10000)
-    return dividends
+    if ticker:
+        query["ticker"] = ticker.upper().strip()
+    if dividend_type:
+        query["type"] = dividend_type
+    payment_range = listing_date_range(date_from, date_to)
+    if payment_range:
+        query["payment_date"] = payment_range
+
+    # Ordena pela data de pagamento mais recente
+    return await streamed_listing(request, db.dividends, query, DIVIDEND_LISTING_SORT, DIVIDEND_LISTING_FIELDS, fields, limit, cursor, etag_headers)
 
 @api_router.post("/dividends")
 async def add_dividend(dividend_data: DividendCreate, user: User = Depends(get_current_user)):
@@ -3032,16 +5302,23 @@ async def add_dividend(dividend_data: DividendCreate, user: User = Depends(get_c
     )
     doc = dividend.model_dump()
     doc["created_at"] = doc["created_at"].isoformat()
-    await db.dividends.insert_one(doc)
+    try:
+        await db.dividends.insert_one(doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Provento já cadastrado para esta data")
+    await data_versions.bump(user.user_id, [portfolio_id])
     return {k: v for k, v in doc.items() if k != "_id"}
 
-@api_router.get("/dividends/summary")
-async def get_dividends_summary(user: User = Depends(get_current_user), portfolio_id: Optional[str] = None):
+@api_router.get("/dividends/summary", dependencies=[Depends(conditional_get())])
+async def get_dividends_summary(request: Request, response: Response, user: User = Depends(get_current_user), portfolio_id: Optional[str] = None):
     query = {"user_id": user.user_id}
     if portfolio_id:
         query["portfolio_id"] = portfolio_id
     dividends = await db.dividends.find(query, {"_id": 0}).to_list(10000)
-    
+    return encoded_response(request, summarize_dividends_by_period(dividends), response)
+
+
+def summarize_dividends_by_period(dividends: List[dict]) -> dict:
     by_month = {}
     by_ticker = {}
     
@@ -3063,10 +5340,56 @@ async def delete_all_dividends(user: User = Depends(get_current_user), portfolio
     if portfolio_id:
         query["portfolio_id"] = portfolio_id
     result = await db.dividends.delete_many(query)
+    await data_versions.bump(user.user_id, [portfolio_id])
     return {"message": f"{result.deleted_count} dividendos excluídos", "deleted": result.deleted_count}
 
+def dividend_dedup_key(ticker: str, ex_date, payment_date, div_type) -> tuple:
+    return (ticker, ex_date, payment_date, div_type)
+
+
+async def load_dividend_dedup_index(user_id: str, tickers: List[str]) -> dict:
+    """The user's dividends for these tickers keyed by (ticker, ex_date, payment_date, type)"""
+    docs = await db.dividends.find(
+        {"user_id": user_id, "ticker": {"$in": tickers}},
+        {"_id": 1, "ticker": 1, "ex_date": 1, "payment_date": 1, "type": 1, "amount": 1, "quantity": 1}
+    ).to_list(None)
+    index = {}
+    for doc in docs:
+        # First match wins, like the find_one this replaces
+        index.setdefault(dividend_dedup_key(doc["ticker"], doc.get("ex_date"), doc.get("payment_date"), doc.get("type")), doc)
+    return index
+
+
+async def load_bonificacao_dates(user_id: str, tickers: List[str]) -> set:
+    """(ticker, purchase_date) of the user's existing bonificação lots"""
+    docs = await db.stocks.find(
+        {"user_id": user_id, "ticker": {"$in": tickers}, "operation_type": "bonificacao"},
+        {"_id": 0, "ticker": 1, "purchase_date": 1}
+    ).to_list(None)
+    return {(doc["ticker"], doc.get("purchase_date")) for doc in docs}
+
+
+async def bulk_write_ignoring_duplicates(collection, operations: list) -> set:
+    """Unordered bulk_write; returns the indexes of operations rejected as duplicate keys"""
+    if not operations:
+        return set()
+    try:
+        await collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != 11000 for err in errors):
+            raise
+        return {err["index"] for err in errors}
+    return set()
+
+
 @api_router.post("/dividends/sync")
-async def sync_dividends(user: User = Depends(get_current_user), portfolio_id: Optional[str] = None):
+async def sync_dividends(
+    user: User = Depends(get_current_user),
+    portfolio_id: Optional[str] = None,
+    mode: str = Query("incremental", pattern="^(incremental|full)$"),
+):
+    """mode=full re-reads every Investidor10 page instead of stopping at already known events"""
     query = {"user_id": user.user_id}
     if portfolio_id:
         query["portfolio_id"] = portfolio_id
@@ -3082,179 +5405,162 @@ async def sync_dividends(user: User = Depends(get_current_user), portfolio_id: O
     today = datetime.now(timezone.utc).date()
     synced, updated, bonificacoes_aplicadas = 0, 0, 0
     synced_fiis = 0
-    sem = asyncio.Semaphore(5) 
-
-    async with httpx.AsyncClient(follow_redirects=True) as client:
-        async def process_ticker(ticker, is_fii=False):
-            nonlocal synced, updated, bonificacoes_aplicadas, synced_fiis
-            async with sem:
-                user_stocks = [s for s in stocks if s["ticker"] == ticker]
-                page = 1
-                while page <= 10:
-                    # Usa função apropriada baseada no tipo de ativo
-                    if is_fii:
-                        data = await fetch_investidor10_fii_dividends_async(client, ticker, page)
-                    else:
-                        data = await fetch_investidor10_dividends_async(client, ticker, page)
-                    if not data: break
-                    
-                    for div in data:
-                        dt_com_obj = datetime.strptime(div["data_com"], "%Y-%m-%d").date()
-                        
-                        # REGRA: Só sincroniza se já passou da Data Com
-                        if today < dt_com_obj: continue
-                        
-                        # REGRA IMPORTANTE: Se houver QUALQUER venda na data com,
-                        # o ticker perde direito a TODOS os proventos e bonificações desta data
-                        has_sale_on_date = any(
-                            s.get("operation_type") == "venda" and 
-                            s.get("purchase_date") and
-                            s.get("purchase_date")[:10] == div["data_com"]
-                            for s in user_stocks
-                        )
-                        if has_sale_on_date:
-                            logger.info(f"Ignorando {ticker} na data {div['data_com']} - há venda registrada (perde direito)")
-                            continue
-                        
-                        # Calcula ações elegíveis (compradas ANTES ou NA data com, excluindo bonificações)
-                        eligible_stocks = []
-                        total_eligible_shares = 0
-                        for s in user_stocks:
-                            p_date_str = s.get("purchase_date")
-                            op_type = s.get("operation_type", "compra")
-                            # Apenas compras (não vendas nem bonificações anteriores)
-                            if not p_date_str or op_type != "compra": continue
-                            p_dt = datetime.strptime(p_date_str[:10], "%Y-%m-%d").date()
-                            if p_dt <= dt_com_obj:  # Antes ou NA data com
-                                eligible_stocks.append(s)
-                                total_eligible_shares += s.get("quantity", 0)
-                        
-                        if total_eligible_shares <= 0: continue
-                        
-                        # Tratamento especial para BONIFICAÇÃO
-                        if div.get("is_bonificacao"):
-                            # Valor da bonificação é a % (ex: 10 = 10%)
-                            bonus_percent = div["valor"]
-                            if bonus_percent > 1:
-                                bonus_percent = bonus_percent / 100  # Converte 10 -> 0.10
-                            
-                            # Calcula quantidade total bonificada
-                            bonus_shares = total_eligible_shares * bonus_percent
-                            
-                            # Verifica se já criou esta bonificação
-                            existing_bonif = await db.stocks.find_one({
-                                "user_id": user.user_id,
-                                "ticker": ticker,
-                                "operation_type": "bonificacao",
-                                "purchase_date": div["data_com"]
-                            })
-                            
-                            if not existing_bonif and bonus_shares > 0:
-                                # Cria um NOVO lançamento de bonificação na carteira
-                                bonif_stock = Stock(
-                                    user_id=user.user_id,
-                                    portfolio_id=eligible_stocks[0].get("portfolio_id"),
-                                    ticker=ticker,
-                                    name=f"{eligible_stocks[0].get('name', ticker)} (Bonificação)",
-                                    quantity=round(bonus_shares, 6),
-                                    average_price=0,  # Bonificação não tem custo
-                                    purchase_date=div["data_com"],
-                                    operation_type="bonificacao",
-                                    include_in_results=True,
-                                    sector=eligible_stocks[0].get("sector"),
-                                    current_price=eligible_stocks[0].get("current_price")
-                                )
-                                doc = bonif_stock.model_dump()
-                                doc["created_at"] = doc["created_at"].isoformat()
-                                doc["updated_at"] = doc["updated_at"].isoformat()
-                                await db.stocks.insert_one(doc)
-                                
-                                bonificacoes_aplicadas += 1
-                                logger.info(f"Bonificação criada: {ticker} +{bonus_shares:.2f} ações (data com: {div['data_com']})")
-                            
-                            continue  # Bonificação processada, NÃO salva como dividendo
-                        
-                        # Processamento normal de dividendos (NÃO inclui bonificações)
-                        unit_value = div["valor"]  # Valor por ação
-                        total_amount = round(unit_value * total_eligible_shares, 2)
-                        
-                        # Verifica duplicidade considerando o Tipo e Data Com
-                        existing = await db.dividends.find_one({
-                            "user_id": user.user_id,
-                            "ticker": ticker,
-                            "ex_date": div["data_com"],
-                            "payment_date": div["data_pagamento"],
-                            "type": div["tipo"]
-                        })
-                        
-                        # Se não encontrou exato, verifica se existe com "A_DEFINIR" para atualizar
-                        existing_undefined = None
-                        if not existing and div["data_pagamento"] != "A_DEFINIR":
-                            existing_undefined = await db.dividends.find_one({
-                                "user_id": user.user_id,
-                                "ticker": ticker,
-                                "ex_date": div["data_com"],
-                                "payment_date": "A_DEFINIR",
-                                "type": div["tipo"]
-                            })
-                        
-                        if existing:
-                            # Atualiza se o valor ou quantidade mudou
-                            if abs(existing.get("amount", 0) - total_amount) > 0.01 or existing.get("quantity") != total_eligible_shares:
-                                await db.dividends.update_one(
-                                    {"_id": existing["_id"]}, 
-                                    {"$set": {
-                                        "amount": total_amount,
-                                        "unit_value": unit_value,
-                                        "quantity": total_eligible_shares
-                                    }}
-                                )
-                                updated += 1
-                        elif existing_undefined:
-                            # Atualiza provento que estava "A Definir" com a data real
-                            await db.dividends.update_one(
-                                {"_id": existing_undefined["_id"]}, 
-                                {"$set": {
-                                    "payment_date": div["data_pagamento"],
-                                    "amount": total_amount,
-                                    "unit_value": unit_value,
-                                    "quantity": total_eligible_shares
-                                }}
-                            )
-                            updated += 1
-                            logger.info(f"Provento {ticker} atualizado: A_DEFINIR -> {div['data_pagamento']}")
-                        else:
-                            await db.dividends.insert_one({
-                                "dividend_id": f"div_{uuid.uuid4().hex[:12]}",
-                                "user_id": user.user_id,
-                                "ticker": ticker,
-                                "portfolio_id": eligible_stocks[0].get("portfolio_id"),
-                                "amount": total_amount,
-                                "unit_value": unit_value,
-                                "quantity": total_eligible_shares,
-                                "payment_date": div["data_pagamento"],
-                                "ex_date": div["data_com"],
-                                "type": div["tipo"],
-                                "created_at": datetime.now(timezone.utc).isoformat()
-                            })
-                            if is_fii:
-                                synced_fiis += 1
-                            else:
-                                synced += 1
-                    
-                    # Para de buscar se os dividendos forem muito antigos (2 anos)
-                    last_div_dt = datetime.strptime(data[-1]["data_com"], "%Y-%m-%d").date()
-                    if last_div_dt < (today - timedelta(days=730)): break
-                    page += 1
-
-        # Processa ações e FIIs em paralelo
-        tasks = []
-        for t in acoes_tickers:
-            tasks.append(process_ticker(t, is_fii=False))
-        for t in fii_tickers:
-            tasks.append(process_ticker(t, is_fii=True))
-        
-        await asyncio.gather(*tasks)
+    
+    # Scraped rows come from the shared catalog (scraped at most once a day per ticker, across
+    # users); existing dividends and bonificação lots are preloaded once. Every decision below is
+    # made in memory and the writes go out as one unordered bulk_write per collection at the end
+    all_tickers = acoes_tickers + fii_tickers
+    events, dividend_index, bonificacao_dates = await asyncio.gather(
+        dividend_catalog.events_many({**{t: False for t in acoes_tickers}, **{t: True for t in fii_tickers}},
+                                     full=mode == "full"),
+        load_dividend_dedup_index(user.user_id, all_tickers),
+        load_bonificacao_dates(user.user_id, all_tickers),
+    )
+    new_dividends = []  # (doc, is_fii)
+    dividend_updates = {}  # _id -> fields to $set (merged, so each document gets one op)
+    new_bonificacoes = []
+    
+    def set_dividend_fields(record: dict, fields: dict):
+        record.update(fields)
+        if "_id" in record:
+            dividend_updates.setdefault(record["_id"], {}).update(fields)
+    
+    def process_ticker(ticker, is_fii=False):
+        nonlocal updated
+        entitlement = LotEntitlement([s for s in stocks if s["ticker"] == ticker])
+        for div in events[ticker]:
+            dt_com_obj = datetime.strptime(div["data_com"], "%Y-%m-%d").date()
+            
+            # REGRA: Só sincroniza se já passou da Data Com
+            if today < dt_com_obj: continue
+            
+            # REGRA IMPORTANTE: Se houver QUALQUER venda na data com,
+            # o ticker perde direito a TODOS os proventos e bonificações desta data
+            if entitlement.has_sale_on(div["data_com"]):
+                logger.info(f"Ignorando {ticker} na data {div['data_com']} - há venda registrada (perde direito)")
+                continue
+            
+            # Ações elegíveis: compras ANTES ou NA data com (excluindo vendas e bonificações anteriores)
+            total_eligible_shares, first_lot = entitlement.eligible(dt_com_obj)
+            if total_eligible_shares <= 0: continue
+            
+            # Tratamento especial para BONIFICAÇÃO
+            if div.get("is_bonificacao"):
+                # Valor da bonificação é a % (ex: 10 = 10%)
+                bonus_percent = div["valor"]
+                if bonus_percent > 1:
+                    bonus_percent = bonus_percent / 100  # Converte 10 -> 0.10
+                
+                # Calcula quantidade total bonificada
+                bonus_shares = total_eligible_shares * bonus_percent
+                
+                # Verifica se já criou esta bonificação
+                existing_bonif = (ticker, div["data_com"]) in bonificacao_dates
+                
+                if not existing_bonif and bonus_shares > 0:
+                    # Cria um NOVO lançamento de bonificação na carteira
+                    bonif_stock = Stock(
+                        user_id=user.user_id,
+                        portfolio_id=first_lot.get("portfolio_id"),
+                        ticker=ticker,
+                        name=f"{first_lot.get('name', ticker)} (Bonificação)",
+                        quantity=round(bonus_shares, 6),
+                        average_price=0,  # Bonificação não tem custo
+                        purchase_date=div["data_com"],
+                        operation_type="bonificacao",
+                        include_in_results=True,
+                        sector=first_lot.get("sector"),
+                        current_price=first_lot.get("current_price")
+                    )
+                    doc = bonif_stock.model_dump()
+                    doc["created_at"] = doc["created_at"].isoformat()
+                    doc["updated_at"] = doc["updated_at"].isoformat()
+                    doc["source"] = "dividend_sync"
+                    new_bonificacoes.append(doc)
+                    bonificacao_dates.add((ticker, div["data_com"]))
+                    logger.info(f"Bonificação criada: {ticker} +{bonus_shares:.2f} ações (data com: {div['data_com']})")
+                
+                continue  # Bonificação processada, NÃO salva como dividendo
+            
+            # Processamento normal de dividendos (NÃO inclui bonificações)
+            unit_value = div["valor"]  # Valor por ação
+            total_amount = round(unit_value * total_eligible_shares, 2)
+            
+            # Verifica duplicidade considerando o Tipo e Data Com
+            key = dividend_dedup_key(ticker, div["data_com"], div["data_pagamento"], div["tipo"])
+            existing = dividend_index.get(key)
+            
+            # Se não encontrou exato, verifica se existe com "A_DEFINIR" para atualizar
+            undefined_key = None
+            existing_undefined = None
+            if not existing and div["data_pagamento"] != "A_DEFINIR":
+                undefined_key = dividend_dedup_key(ticker, div["data_com"], "A_DEFINIR", div["tipo"])
+                existing_undefined = dividend_index.get(undefined_key)
+            
+            if existing:
+                # Atualiza se o valor ou quantidade mudou
+                if abs(existing.get("amount", 0) - total_amount) > 0.01 or existing.get("quantity") != total_eligible_shares:
+                    set_dividend_fields(existing, {
+                        "amount": total_amount,
+                        "unit_value": unit_value,
+                        "quantity": total_eligible_shares
+                    })
+                    updated += 1
+            elif existing_undefined:
+                # Atualiza provento que estava "A Definir" com a data real
+                set_dividend_fields(existing_undefined, {
+                    "payment_date": div["data_pagamento"],
+                    "amount": total_amount,
+                    "unit_value": unit_value,
+                    "quantity": total_eligible_shares
+                })
+                del dividend_index[undefined_key]
+                dividend_index[key] = existing_undefined
+                updated += 1
+                logger.info(f"Provento {ticker} atualizado: A_DEFINIR -> {div['data_pagamento']}")
+            else:
+                doc = {
+                    "dividend_id": f"div_{uuid.uuid4().hex[:12]}",
+                    "user_id": user.user_id,
+                    "ticker": ticker,
+                    "portfolio_id": first_lot.get("portfolio_id"),
+                    "amount": total_amount,
+                    "unit_value": unit_value,
+                    "quantity": total_eligible_shares,
+                    "payment_date": div["data_pagamento"],
+                    "ex_date": div["data_com"],
+                    "type": div["tipo"],
+                    "created_at": datetime.now(timezone.utc).isoformat()
+                }
+                # Later pages may repeat it: they see (and update) the pending doc
+                dividend_index[key] = doc
+                new_dividends.append((doc, is_fii))
+
+    for t in acoes_tickers:
+        process_ticker(t, is_fii=False)
+    for t in fii_tickers:
+        process_ticker(t, is_fii=True)
+    
+    # Inserts already made by a concurrent sync fail on the unique dedup indexes and are skipped
+    operations = [InsertOne(doc) for doc, _ in new_dividends]
+    operations += [UpdateOne({"_id": _id}, {"$set": fields}) for _id, fields in dividend_updates.items()]
+    duplicates = await bulk_write_ignoring_duplicates(db.dividends, operations)
+    for i, (_, is_fii) in enumerate(new_dividends):
+        if i in duplicates:
+            continue
+        if is_fii:
+            synced_fiis += 1
+        else:
+            synced += 1
+    
+    if new_bonificacoes:
+        duplicates = await bulk_write_ignoring_duplicates(db.stocks, [InsertOne(doc) for doc in new_bonificacoes])
+        inserted = [doc for i, doc in enumerate(new_bonificacoes) if i not in duplicates]
+        bonificacoes_aplicadas += len(inserted)
+        await position_ledger.touch_many(user.user_id, ledger_changes(inserted))
+    
+    if synced or synced_fiis or updated or bonificacoes_aplicadas:
+        await data_versions.bump(user.user_id, [portfolio_id])
 
     return {
         "novos_acoes": synced, 
@@ -3265,6 +5571,268 @@ async def sync_dividends(user: User = Depends(get_current_user), portfolio_id: O
         "message": f"Sincronizado: {synced} proventos de ações, {synced_fiis} proventos de FIIs"
     }
 
+# ==================== PUSH CHANNEL ====================
+
+class PushHub:
+    """
+    In-process fan-out to connected clients. Topics are "price:<ticker>" (fed by the market data
+    ingestor, so upstream volume stays one fetch per ticker however many clients listen),
+    "alerts:<user_id>" and "data:<user_id>" (fed by DataVersions bumps). Other workers' bumps
+    are picked up by the per-connection version check on every heartbeat.
+    """
+    
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._topics = {}  # topic -> {queue}
+        self._queues = {}  # queue -> {topic}
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0}
+    
+    def subscribe(self, topics) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._queues[queue] = set()
+        self.add(queue, topics)
+        return queue
+    
+    def add(self, queue: asyncio.Queue, topics):
+        for topic in topics:
+            self._topics.setdefault(topic, set()).add(queue)
+            self._queues[queue].add(topic)
+    
+    def remove(self, queue: asyncio.Queue, topics):
+        for topic in topics:
+            listeners = self._topics.get(topic)
+            if listeners:
+                listeners.discard(queue)
+                if not listeners:
+                    del self._topics[topic]
+            self._queues[queue].discard(topic)
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.remove(queue, list(self._queues.get(queue, ())))
+        self._queues.pop(queue, None)
+    
+    def publish(self, topic: str, payload=None):
+        listeners = self._topics.get(topic)
+        if not listeners:
+            return
+        self.stats["published"] += 1
+        for queue in listeners:
+            if queue.full():
+                # Slow client: drop its oldest event rather than block the publisher
+                queue.get_nowait()
+                self.stats["dropped"] += 1
+            queue.put_nowait((topic, payload))
+            self.stats["delivered"] += 1
+    
+    def snapshot(self) -> dict:
+        return {**self.stats, "connections": len(self._queues), "topics": len(self._topics)}
+
+
+push_hub = PushHub(PUSH_QUEUE_SIZE)
+
+
+def sse_event(event: str, data, event_id: Optional[str] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {dumps_json(data).decode()}\n\n"
+
+
+def price_event_payload(ticker: str, quote: dict) -> dict:
+    return {
+        "ticker": ticker,
+        "price": quote.get("price"),
+        "change": quote.get("change"),
+        "change_percent": quote.get("change_percent"),
+        "updated_at": quote.get("updated_at"),
+    }
+
+
+async def push_tickers(user_id: str, portfolio_id: Optional[str]) -> set:
+    query = {"user_id": user_id, "asset_type": {"$ne": "renda_fixa"}}
+    if portfolio_id:
+        query["portfolio_id"] = portfolio_id
+    return set(await db.stocks.distinct("ticker", query))
+
+
+async def push_event_stream(user_id: str, portfolio_id: Optional[str], last_event_id: Optional[str] = None):
+    """
+    SSE events for one connection:
+      prices  {"quotes": [...]}              latest quotes for the user's tickers (all of them on connect)
+      alerts  {"count": n, "new": [...]}     unread count and alerts created since the last event;
+                                             id is the alerts version, so a reconnect with an
+                                             up-to-date Last-Event-ID skips the initial one
+      data    {"version": v}                 portfolio data changed (stocks, dividends, stored prices)
+    plus a comment heartbeat every PUSH_HEARTBEAT_INTERVAL seconds.
+    """
+    tickers = await push_tickers(user_id, portfolio_id)
+    queue = push_hub.subscribe([f"alerts:{user_id}", f"data:{user_id}", *(f"price:{t}" for t in tickers)])
+    try:
+        yield f"retry: {PUSH_RETRY_MS}\n\n"
+        
+        quotes = await market_data.get_prices(sorted(tickers)) if tickers else {}
+        yield sse_event("prices", {"quotes": [price_event_payload(t, q) for t, q in quotes.items()]})
+        
+        data_version = await data_versions.get(user_id, portfolio_id)
+        alerts_version = await data_versions.get_alerts(user_id)
+        last_alert_at = datetime.now(timezone.utc).isoformat()
+        
+        async def alerts_event():
+            nonlocal last_alert_at
+            unread = {"user_id": user_id, "is_read": False}
+            count, new_alerts = await asyncio.gather(
+                db.alerts.count_documents(unread),
+                db.alerts.find({**unread, "created_at": {"$gt": last_alert_at}}, {"_id": 0}).sort("created_at", -1).to_list(50),
+            )
+            if new_alerts:
+                last_alert_at = new_alerts[0]["created_at"]
+            return sse_event("alerts", {"count": count, "new": new_alerts}, alerts_version)
+        
+        if last_event_id != alerts_version:
+            yield await alerts_event()
+        
+        while True:
+            try:
+                events = [await asyncio.wait_for(queue.get(), timeout=PUSH_HEARTBEAT_INTERVAL)]
+                heartbeat = False
+            except asyncio.TimeoutError:
+                events = []
+                heartbeat = True
+            while not queue.empty():
+                events.append(queue.get_nowait())
+            
+            changed_quotes = {}
+            alerts_changed = data_changed = heartbeat
+            for topic, payload in events:
+                if topic.startswith("price:"):
+                    changed_quotes[topic[6:]] = payload  # coalesced: last quote per ticker wins
+                elif topic.startswith("alerts:"):
+                    alerts_changed = True
+                elif topic.startswith("data:"):
+                    data_changed = True
+            
+            if data_changed:
+                version = await data_versions.get(user_id, portfolio_id)
+                if version != data_version:
+                    data_version = version
+                    # Positions may have been added or removed: follow the new ticker set
+                    current = await push_tickers(user_id, portfolio_id)
+                    push_hub.add(queue, [f"price:{t}" for t in current - tickers])
+                    push_hub.remove(queue, [f"price:{t}" for t in tickers - current])
+                    tickers = current
+                    yield sse_event("data", {"version": data_version})
+            if alerts_changed:
+                version = await data_versions.get_alerts(user_id)
+                if version != alerts_version:
+                    alerts_version = version
+                    yield await alerts_event()
+            moved = [price_event_payload(t, q) for t, q in changed_quotes.items() if t in tickers]
+            if moved:
+                yield sse_event("prices", {"quotes": moved})
+            if heartbeat:
+                yield ": ping\n\n"
+    finally:
+        push_hub.unsubscribe(queue)
+
+
+@api_router.get("/stream")
+async def stream_updates(request: Request, user: User = Depends(get_current_user), portfolio_id: Optional[str] = None):
+    """Server-sent events with live prices for the user's tickers, alerts and data changes"""
+    last_event_id = request.headers.get("last-event-id") or request.query_params.get("last_event_id")
+    return StreamingResponse(
+        push_event_stream(user.user_id, portfolio_id, last_event_id),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: proxies (nginx) must not buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ==================== DASHBOARD ====================
+
+DASHBOARD_SECTIONS = ("summary", "stocks", "dividends", "dividends_summary", "history", "alerts",
+                      "alerts_count", "evolution", "ideal_distribution")
+# What the Dashboard page loads on open (ideal distribution is fetched on demand)
+DASHBOARD_DEFAULT_SECTIONS = ("summary", "stocks", "dividends", "dividends_summary", "history", "alerts", "evolution")
+DASHBOARD_NEEDS_STOCKS = {"summary", "stocks", "evolution", "ideal_distribution"}
+DASHBOARD_NEEDS_DIVIDENDS = {"summary", "dividends", "dividends_summary", "evolution"}
+
+
+@api_router.get("/portfolio/dashboard", dependencies=[Depends(conditional_get("data", "alerts", daily=True))])
+async def get_portfolio_dashboard(
+    request: Request,
+    response: Response,
+    user: User = Depends(get_current_user),
+    portfolio_id: Optional[str] = None,
+    sections: Optional[str] = None,
+    period: str = "1m",
+    history_days: int = 30,
+):
+    """
+    Everything the Dashboard shows in one round trip. Stocks and dividends are read once and
+    every section is computed from that dataset; the independent reads run concurrently.
+    Same payloads as /portfolio/summary, /portfolio/stocks, /dividends, /dividends/summary,
+    /portfolio/history, /alerts?unread_only=true, /alerts/count, /portfolio/evolution
+    and /portfolio/ideal-distribution, keyed by section name.
+    """
+    requested = list(dict.fromkeys(s.strip() for s in sections.split(",") if s.strip())) if sections else list(DASHBOARD_DEFAULT_SECTIONS)
+    unknown = [s for s in requested if s not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Seções inválidas: {', '.join(unknown)}")
+    wanted = set(requested)
+    
+    user_id = user.user_id
+    query = {"user_id": user_id}
+    if portfolio_id:
+        query["portfolio_id"] = portfolio_id
+    now = datetime.now(timezone.utc)
+    today = now.date()
+    today_str = today.strftime("%Y-%m-%d")
+    
+    async def skipped():
+        return None
+    
+    def load(section_set, coro_factory):
+        return coro_factory() if wanted & section_set else skipped()
+    
+    stocks, dividends, points, alerts, alerts_count, history = await asyncio.gather(
+        load(DASHBOARD_NEEDS_STOCKS, lambda: db.stocks.find(query, {"_id": 0}).sort("_id", 1).to_list(None)),
+        load(DASHBOARD_NEEDS_DIVIDENDS, lambda: db.dividends.find(query, {"_id": 0}).sort(DIVIDEND_LISTING_SORT).to_list(None)),
+        load({"evolution"}, lambda: position_ledger.points(user_id, portfolio_id)),
+        load({"alerts"}, lambda: db.alerts.find({"user_id": user_id, "is_read": False}, {"_id": 0}).sort("created_at", -1).to_list(100)),
+        load({"alerts_count"}, lambda: db.alerts.count_documents({"user_id": user_id, "is_read": False})),
+        load({"history"}, lambda: db.portfolio_snapshots.find({"user_id": user_id}, {"_id": 0}).sort("date", -1).limit(history_days).to_list(history_days)),
+    )
+    
+    # Computed sections share the versioned cache entries of the standalone endpoints
+    async def summary():
+        async def compute():
+            return [summarize_lot_totals(stocks), summarize_dividend_totals(dividends, today_str)]
+        totals, dividend_totals = await cached_portfolio_view(user_id, portfolio_id, f"summary:{daily_view_key(now)}", compute)
+        return await build_portfolio_summary(user_id, portfolio_id, totals, dividend_totals)
+    
+    async def evolution():
+        return await cached_portfolio_view(
+            user_id, portfolio_id, f"evolution:{period}:{today.isoformat()}",
+            lambda: evolution_from_ledger(points, prices_from_lots(stocks), dividends, period, today)
+        )
+    
+    async def ideal_distribution():
+        async def compute():
+            return ideal_distribution_from_lots(stocks)
+        return await cached_portfolio_view(user_id, portfolio_id, "ideal_distribution", compute)
+    
+    computed_sections = {"summary": summary, "evolution": evolution, "ideal_distribution": ideal_distribution}
+    pending = [section for section in requested if section in computed_sections]
+    computed = dict(zip(pending, await asyncio.gather(*(computed_sections[section]() for section in pending))))
+    
+    plain_sections = {
+        "stocks": lambda: stocks,
+        "dividends": lambda: dividends,
+        "dividends_summary": lambda: summarize_dividends_by_period(dividends),
+        "history": lambda: list(reversed(history)),
+        "alerts": lambda: alerts,
+        "alerts_count": lambda: {"count": alerts_count},
+    }
+    payload = {section: computed[section] if section in computed else plain_sections[section]() for section in requested}
+    return encoded_response(request, payload, response)
+
 # ==================== VALUATION ROUTES ====================
 
 @api_router.post("/valuation/calculate")
@@ -3433,8 +6001,15 @@ Seja direto e use no máximo 200 palavras."""
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.post("/analysis/portfolio")
-async def analyze_portfolio(user: User = Depends(get_current_user)):
-    """Analyze the entire portfolio using AI"""
+async def analyze_portfolio(response: Response, user: User = Depends(get_current_user)):
+    """Analyze the entire portfolio using AI (reused until the portfolio data changes)"""
+    return await cached_portfolio_view(
+        user.user_id, None, f"ai_analysis:{datetime.now(timezone.utc).date().isoformat()}",
+        lambda: compute_portfolio_analysis(user.user_id), response
+    )
+
+
+async def compute_portfolio_analysis(user_id: str) -> dict:
     try:
         from emergentintegrations.llm.chat import LlmChat, UserMessage
         
@@ -3442,41 +6017,43 @@ async def analyze_portfolio(user: User = Depends(get_current_user)):
         if not api_key:
             raise HTTPException(status_code=500, detail="LLM key not configured")
         
-        # Get user's stocks
-        stocks = await db.stocks.find({"user_id": user.user_id}, {"_id": 0}).to_list(1000)
-        dividends = await db.dividends.find({"user_id": user.user_id}, {"_id": 0}).to_list(10000)
+        # Current positions from the ledger (one entry per portfolio and ticker)
+        positions, prices, dividends = await asyncio.gather(
+            position_ledger.latest_positions(user_id),
+            current_prices_by_ticker({"user_id": user_id}),
+            db.dividends.find({"user_id": user_id}, {"_id": 0, "ticker": 1, "amount": 1, "payment_date": 1}).to_list(None),
+        )
         
-        if not stocks:
+        if not positions:
             raise HTTPException(status_code=400, detail="Nenhuma ação na carteira para analisar")
         
-        # Aggregate stocks by ticker
+        # Aggregate positions by ticker
         portfolio_summary = {}
         total_invested = 0
         total_current = 0
         
-        for stock in stocks:
-            ticker = stock["ticker"]
-            # Skip bonificações for invested value calculation
-            is_bonificacao = stock.get("operation_type") == "bonificacao"
+        for position in positions:
+            ticker = position["ticker"]
+            price = prices.get(ticker)
             
-            current = stock["quantity"] * (stock.get("current_price") or stock["average_price"])
-            # Only count invested if NOT bonificação
-            invested = 0 if is_bonificacao else stock["quantity"] * stock["average_price"]
+            current = position["quantity"] * price if price else position["book_value"]
+            # cost already excludes bonificações
+            invested = position["cost"]
             
             if ticker not in portfolio_summary:
                 portfolio_summary[ticker] = {
                     "ticker": ticker,
-                    "name": stock.get("name", ticker),
-                    "sector": stock.get("sector", "Não informado"),
-                    "asset_type": stock.get("asset_type", "acao"),
+                    "name": position.get("name", ticker),
+                    "sector": position.get("sector", "Não informado"),
+                    "asset_type": position.get("asset_type", "acao"),
                     "quantity": 0,
                     "invested": 0,
                     "current": 0,
-                    "current_price": stock.get("current_price"),
+                    "current_price": price or 0,
                     "average_price": 0,
                 }
             
-            portfolio_summary[ticker]["quantity"] += stock["quantity"]
+            portfolio_summary[ticker]["quantity"] += position["quantity"]
             portfolio_summary[ticker]["invested"] += invested
             portfolio_summary[ticker]["current"] += current
             total_invested += invested
@@ -3576,14 +6153,14 @@ Seja objetivo e direto, use linguagem acessível."""
 
         chat = LlmChat(
             api_key=api_key,
-            session_id=f"portfolio_analysis_{user.user_id}",
+            session_id=f"portfolio_analysis_{user_id}",
             system_message="Você é um consultor financeiro especializado em análise de carteiras de investimentos brasileiras (Ações e FIIs). Forneça análises estratégicas, objetivas e acionáveis, considerando tanto crescimento de capital quanto geração de renda passiva através de proventos."
         ).with_model("openai", "gpt-4o-mini")
         
-        response = await chat.send_message(UserMessage(text=prompt))
+        analysis = await chat.send_message(UserMessage(text=prompt))
         
         return {
-            "analysis": response,
+            "analysis": analysis,
             "summary": {
                 "total_invested": round(total_invested, 2),
                 "total_current": round(total_current, 2),
@@ -3607,6 +6184,164 @@ Seja objetivo e direto, use linguagem acessível."""
         logger.error(f"Portfolio analysis error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ==================== METRICS ====================
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Runtime counters for monitoring"""
+    return {
+        "quote_cache": quote_cache.snapshot(),
+        "quote_providers": quote_providers.snapshot(),
+        "blocking_executor": blocking_executor.snapshot(),
+        "http_pools": http_clients.snapshot(),
+        "session_cache": session_cache.snapshot(),
+        "market_data": market_data.snapshot(),
+        "position_ledger": position_ledger.snapshot(),
+        "price_history": price_history.snapshot(),
+        "snapshot_writer": snapshot_writer.snapshot(),
+        "portfolio_cache": portfolio_cache.snapshot(),
+        "data_versions": data_versions.snapshot(),
+        "push_hub": push_hub.snapshot(),
+        "dividend_catalog": dividend_catalog.snapshot(),
+        "dividend_resync_queue": dividend_resync_queue.snapshot(),
+    }
+
+# ==================== DATABASE INDEXES ====================
+
+# Declared indexes per collection. Names are explicit so ensure_indexes is idempotent
+# and the admin report can diff what exists against what the queries need.
+INDEX_SPECS = {
+    "stocks": [
+        {"name": "user_portfolio_ticker_date",
+         "keys": [("user_id", ASCENDING), ("portfolio_id", ASCENDING), ("ticker", ASCENDING), ("purchase_date", ASCENDING)]},
+        {"name": "user_ticker_date",
+         "keys": [("user_id", ASCENDING), ("ticker", ASCENDING), ("purchase_date", ASCENDING)]},
+        {"name": "stock_id", "keys": [("stock_id", ASCENDING)]},
+        {"name": "ticker", "keys": [("ticker", ASCENDING)]},
+        # Keyset pagination of GET /portfolio/stocks
+        {"name": "user_listing", "keys": [("user_id", ASCENDING), ("_id", ASCENDING)]},
+        # One synced bonificação lot per (user, ticker, data com); keeps concurrent dividend syncs
+        # idempotent without constraining bonificações entered by hand or imported
+        {"name": "bonificacao_dedup",
+         "keys": [("user_id", ASCENDING), ("ticker", ASCENDING), ("purchase_date", ASCENDING)],
+         "unique": True,
+         "partialFilterExpression": {"operation_type": "bonificacao", "source": "dividend_sync"}},
+        {"name": "user_portfolio_listing",
+         "keys": [("user_id", ASCENDING), ("portfolio_id", ASCENDING), ("_id", ASCENDING)]},
+    ],
+    "dividends": [
+        {"name": "user_portfolio_ticker_payment",
+         "keys": [("user_id", ASCENDING), ("portfolio_id", ASCENDING), ("ticker", ASCENDING), ("payment_date", ASCENDING)]},
+        {"name": "user_ticker_ex_payment_type",
+         "keys": [("user_id", ASCENDING), ("ticker", ASCENDING), ("ex_date", ASCENDING), ("payment_date", ASCENDING), ("type", ASCENDING)]},
+        # Dedup key used by the dividend sync; manual entries without ex_date are not constrained
+        {"name": "dividend_dedup",
+         "keys": [("user_id", ASCENDING), ("portfolio_id", ASCENDING), ("ticker", ASCENDING),
+                  ("ex_date", ASCENDING), ("payment_date", ASCENDING), ("type", ASCENDING)],
+         "unique": True,
+         "partialFilterExpression": {"ex_date": {"$type": "string"}}},
+        {"name": "dividend_id", "keys": [("dividend_id", ASCENDING)]},
+        # Keyset pagination of GET /dividends (newest payment first)
+        {"name": "user_payment_listing",
+         "keys": [("user_id", ASCENDING), ("payment_date", DESCENDING), ("_id", DESCENDING)]},
+        {"name": "user_portfolio_payment_listing",
+         "keys": [("user_id", ASCENDING), ("portfolio_id", ASCENDING), ("payment_date", DESCENDING), ("_id", DESCENDING)]},
+    ],
+    "portfolio_snapshots": [
+        {"name": "user_portfolio_date",
+         "keys": [("user_id", ASCENDING), ("portfolio_id", ASCENDING), ("date", DESCENDING)]},
+        {"name": "user_date", "keys": [("user_id", ASCENDING), ("date", DESCENDING)]},
+    ],
+    "alerts": [
+        {"name": "user_read_created",
+         "keys": [("user_id", ASCENDING), ("is_read", ASCENDING), ("created_at", DESCENDING)]},
+        {"name": "user_type_created",
+         "keys": [("user_id", ASCENDING), ("alert_type", ASCENDING), ("created_at", DESCENDING)]},
+        {"name": "alert_id", "keys": [("alert_id", ASCENDING)]},
+    ],
+    "user_sessions": [
+        {"name": "session_token", "keys": [("session_token", ASCENDING)], "unique": True},
+        {"name": "user_id", "keys": [("user_id", ASCENDING)]},
+        {"name": "expires_at_ttl", "keys": [("expires_at", ASCENDING)], "expireAfterSeconds": 0},
+    ],
+    "users": [
+        {"name": "user_id", "keys": [("user_id", ASCENDING)], "unique": True},
+        {"name": "email", "keys": [("email", ASCENDING)]},
+    ],
+    "portfolios": [
+        {"name": "user_portfolio", "keys": [("user_id", ASCENDING), ("portfolio_id", ASCENDING)]},
+        {"name": "user_default", "keys": [("user_id", ASCENDING), ("is_default", ASCENDING)]},
+    ],
+    "sales": [
+        {"name": "user_portfolio_ticker_date",
+         "keys": [("user_id", ASCENDING), ("portfolio_id", ASCENDING), ("ticker", ASCENDING), ("sale_date", ASCENDING)]},
+        {"name": "user_ticker_date",
+         "keys": [("user_id", ASCENDING), ("ticker", ASCENDING), ("sale_date", ASCENDING)]},
+    ],
+    "quotes": [
+        {"name": "ticker", "keys": [("ticker", ASCENDING)], "unique": True},
+    ],
+    "position_ledger": [
+        {"name": "user_portfolio_ticker_date",
+         "keys": [("user_id", ASCENDING), ("portfolio_id", ASCENDING), ("ticker", ASCENDING), ("date", ASCENDING)],
+         "unique": True},
+        {"name": "user_date", "keys": [("user_id", ASCENDING), ("date", ASCENDING)]},
+    ],
+    # data_versions is keyed by _id (user_id)
+    "price_history": [
+        {"name": "ticker_year", "keys": [("ticker", ASCENDING), ("year", ASCENDING)], "unique": True},
+    ],
+}
+
+# Result of the last ensure_indexes run: {collection: {index_name: "ok" | error message}}
+index_status: dict = {}
+
+
+async def ensure_indexes() -> dict:
+    """Create every declared index. Safe to run on each startup; failures are logged, not raised."""
+    for collection_name, specs in INDEX_SPECS.items():
+        collection = db[collection_name]
+        status = index_status.setdefault(collection_name, {})
+        for spec in specs:
+            options = {k: v for k, v in spec.items() if k != "keys"}
+            try:
+                await collection.create_index(spec["keys"], **options)
+                status[spec["name"]] = "ok"
+            except OperationFailure as e:
+                # Typically existing duplicates (unique) or an index with the same keys and other options
+                status[spec["name"]] = str(e)
+                logger.warning(f"Could not create index {collection_name}.{spec['name']}: {e}")
+    return index_status
+
+
+def require_admin(request: Request):
+    """Allow the request only with a matching X-Admin-Token header"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found")
+    if request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@api_router.get("/admin/indexes", dependencies=[Depends(require_admin)])
+async def get_index_report():
+    """Declared vs existing indexes with usage counters since the last mongod restart"""
+    report = {}
+    for collection_name, specs in INDEX_SPECS.items():
+        stats = await db[collection_name].aggregate([{"$indexStats": {}}]).to_list(None)
+        existing = {
+            s["name"]: {"key": dict(s["key"]), "ops": s["accesses"]["ops"], "since": s["accesses"]["since"]}
+            for s in stats
+        }
+        declared = {spec["name"] for spec in specs}
+        report[collection_name] = {
+            "indexes": existing,
+            "missing": sorted(declared - existing.keys()),
+            "unused": sorted(name for name, info in existing.items() if info["ops"] == 0 and name != "_id_"),
+            "undeclared": sorted(name for name in existing if name not in declared and name != "_id_"),
+            "errors": {name: msg for name, msg in index_status.get(collection_name, {}).items() if msg != "ok"},
+        }
+    return report
+
 @api_router.get("/")
 async def root():
     return {"message": "Stock Portfolio API"}
@@ -3635,10 +6370,24 @@ async def lifespan(app: FastAPI):
     try:
         await client.admin.command('ping')
         logger.info("Successfully connected to MongoDB")
+        await ensure_indexes()
     except Exception as e:
         logger.warning(f"MongoDB connection warning on startup: {e}")
+    http_clients.start()
+    market_data.start()
+    price_history.start()
+    snapshot_writer.start()
+    dividend_catalog.start()
+    dividend_resync_queue.start()
     yield
     # Shutdown
+    await dividend_resync_queue.stop()
+    await dividend_catalog.stop()
+    await snapshot_writer.stop()
+    await price_history.stop()
+    await market_data.stop()
+    await http_clients.aclose()
+    blocking_executor.shutdown()
     client.close()
 
 # === CRIA O APP UMA ÚNICA VEZ ===
@@ -3654,7 +6403,8 @@ async def root():
     return {"message": "API de Carteira de Ações - Rodando!"}
 
 # === INCLUI O ROUTER COM /api ===
-app.include_router(api_router)
+# orjson renders every API response; hot endpoints also skip jsonable_encoder via encoded_response
+app.include_router(api_router, default_response_class=FastJSONResponse)
 
 # === MIDDLEWARE ===
 app.add_middleware(
@@ -3663,4 +6413,5 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Cache", "ETag"],
 )
\ No newline at end of file
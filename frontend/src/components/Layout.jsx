@@ -22,6 +22,7 @@ import { Input } from "./ui/input";
 import { Label } from "./ui/label";
 import { toast } from "sonner";
 import { usePortfolioSafe } from "../context/PortfolioContext";
+import { usePushChannel } from "../hooks/use-push-channel";
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
@@ -62,6 +63,17 @@ export const Layout = ({ children }) => {
       }
     };
     
+    fetchUser();
+  }, []);
+
+  // Alert count is pushed by the server; poll only while the push channel is down
+  const pushConnected = usePushChannel((type, data) => {
+    if (type === "alerts") setAlertCount(data.count);
+  });
+
+  useEffect(() => {
+    if (pushConnected) return;
+    
     const fetchAlertCount = async () => {
       try {
         const response = await fetch(`${API}/alerts/count`, { credentials: 'include' });
@@ -74,13 +86,12 @@ export const Layout = ({ children }) => {
       }
     };
     
-    fetchUser();
     fetchAlertCount();
     
     // Poll for alerts every 30 seconds
     const interval = setInterval(fetchAlertCount, 30000);
     return () => clearInterval(interval);
-  }, []);
+  }, [pushConnected]);
 
   const handleLogout = async () => {
     try {
@@ -0,0 +1,71 @@
+import * as React from "react"
+
+const API = `${process.env.REACT_APP_BACKEND_URL}/api`
+
+// One EventSource per tab, shared by every component that listens
+const listeners = new Set()
+const statusListeners = new Set()
+let source = null
+let connected = false
+
+function setConnected(value) {
+  if (connected === value) return
+  connected = value
+  statusListeners.forEach((listener) => listener(value))
+}
+
+function openSource() {
+  if (source || typeof window === "undefined" || !window.EventSource) return
+
+  source = new EventSource(`${API}/stream`, { withCredentials: true })
+  source.onopen = () => setConnected(true)
+  source.onerror = () => {
+    // CONNECTING: the browser reconnects by itself (sending Last-Event-ID).
+    // CLOSED: the server refused the stream; listeners fall back to polling.
+    if (source && source.readyState === EventSource.CLOSED) {
+      source = null
+    }
+    setConnected(false)
+  }
+
+  for (const type of ["prices", "alerts", "data"]) {
+    source.addEventListener(type, (event) => {
+      const data = JSON.parse(event.data)
+      listeners.forEach((listener) => listener(type, data))
+    })
+  }
+}
+
+function closeSource() {
+  if (source) {
+    source.close()
+    source = null
+  }
+  setConnected(false)
+}
+
+/**
+ * Subscribe to the server push channel (live prices, alerts, data changes).
+ * Returns whether the channel is connected, so callers can poll while it is not.
+ */
+export function usePushChannel(onEvent) {
+  const [isConnected, setIsConnected] = React.useState(connected)
+  const handlerRef = React.useRef(onEvent)
+  handlerRef.current = onEvent
+
+  React.useEffect(() => {
+    const listener = (type, data) => handlerRef.current?.(type, data)
+    listeners.add(listener)
+    statusListeners.add(setIsConnected)
+    openSource()
+    setIsConnected(connected)
+
+    return () => {
+      listeners.delete(listener)
+      statusListeners.delete(setIsConnected)
+      if (listeners.size === 0) closeSource()
+    }
+  }, [])
+
+  return isConnected
+}
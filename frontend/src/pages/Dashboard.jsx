@@ -1,4 +1,4 @@
-import { useState, useEffect, useMemo } from "react";
+import { useState, useEffect, useMemo, useRef } from "react";
 import { Layout } from "../components/Layout";
 import { Card, CardContent, CardHeader, CardTitle } from "../components/ui/card";
 import { Button } from "../components/ui/button";
@@ -19,6 +19,7 @@ import { PieChart as RechartsPie, Pie, Cell, ResponsiveContainer, AreaChart, Are
 import { toast } from "sonner";
 import { usePortfolioSafe } from "../context/PortfolioContext";
 import { AdBannerHorizontal } from "../components/AdBanner";
+import { usePushChannel } from "../hooks/use-push-channel";
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
@@ -205,12 +206,30 @@ export default function Dashboard() {
   const currentPortfolio = portfolioContext?.currentPortfolio;
   const portfolioLoading = portfolioContext?.loading;
 
-  // Auto-refresh prices every 60 seconds
+  // Live prices/alerts from the server push channel. Prices are applied to the table right away;
+  // they are persisted (refresh-prices) at most every 5 minutes, and only if something moved.
+  const pricesMovedRef = useRef(false);
+  const pushConnected = usePushChannel((type, data) => {
+    if (type === "prices") {
+      const quotes = Object.fromEntries(data.quotes.filter(q => q.price).map(q => [q.ticker, q.price]));
+      if (Object.keys(quotes).length === 0) return;
+      setStocks(prev => prev.map(s => (quotes[s.ticker] ? { ...s, current_price: quotes[s.ticker] } : s)));
+      pricesMovedRef.current = true;
+    } else if (type === "alerts") {
+      if (data.new.length) setAlerts(prev => [...data.new, ...prev]);
+    } else if (type === "data") {
+      fetchData();
+    }
+  });
+
+  // Auto-refresh prices: every 60 seconds while polling, or every 5 minutes (when prices moved) while pushed
   useEffect(() => {
     if (!autoRefresh || portfolioLoading) return;
     
-    const autoRefreshPrices = async () => {
+    const autoRefreshPrices = async (onlyIfMoved) => {
       if (refreshing) return; // Skip if already refreshing
+      if (onlyIfMoved && !pricesMovedRef.current) return;
+      pricesMovedRef.current = false;
       
       try {
         const response = await fetch(`${API}/portfolio/refresh-prices`, {
@@ -219,7 +238,8 @@ export default function Dashboard() {
         });
         if (response.ok) {
           setLastRefresh(new Date());
-          fetchData();
+          // With the push channel the resulting "data" event triggers the reload
+          if (!pushConnected) fetchData();
         }
       } catch (error) {
         console.error('Auto-refresh error:', error);
@@ -227,16 +247,17 @@ export default function Dashboard() {
     };
     
     // Initial refresh after 5 seconds (to let the page load first)
-    const initialTimeout = setTimeout(autoRefreshPrices, 5000);
+    const initialTimeout = setTimeout(() => autoRefreshPrices(false), 5000);
     
-    // Then refresh every 60 seconds
-    const interval = setInterval(autoRefreshPrices, 60000);
+    const interval = pushConnected
+      ? setInterval(() => autoRefreshPrices(true), 300000)
+      : setInterval(() => autoRefreshPrices(false), 60000);
     
     return () => {
       clearTimeout(initialTimeout);
       clearInterval(interval);
     };
-  }, [autoRefresh, portfolioLoading, refreshing]);
+  }, [autoRefresh, portfolioLoading, refreshing, pushConnected]);
 
   useEffect(() => {
     if (!portfolioLoading) {
@@ -265,48 +286,44 @@ export default function Dashboard() {
 
   const fetchData = async () => {
     try {
-      const portfolioParam = currentPortfolio?.portfolio_id ? `?portfolio_id=${currentPortfolio.portfolio_id}` : "";
       const portfolioParamAnd = currentPortfolio?.portfolio_id ? `&portfolio_id=${currentPortfolio.portfolio_id}` : "";
-      const [summaryRes, stocksRes, dividendsRes, historyRes, alertsRes, allDividendsRes, evolutionRes] = await Promise.all([
-        fetch(`${API}/portfolio/summary${portfolioParam}`, { credentials: 'include' }),
-        fetch(`${API}/portfolio/stocks${portfolioParam}`, { credentials: 'include' }),
-        fetch(`${API}/dividends/summary${portfolioParam}`, { credentials: 'include' }),
-        fetch(`${API}/portfolio/history?days=30${portfolioParamAnd}`, { credentials: 'include' }),
-        fetch(`${API}/alerts?unread_only=true`, { credentials: 'include' }),
-        fetch(`${API}/dividends${portfolioParam}`, { credentials: 'include' }),
-        fetch(`${API}/portfolio/evolution?period=${evolutionPeriod}${portfolioParamAnd}`, { credentials: 'include' }),
-      ]);
+      // One round trip: the backend reads stocks/dividends once and computes every section
+      const sections = "summary,stocks,dividends_summary,history,alerts,dividends,evolution";
+      const dashboardRes = await fetch(
+        `${API}/portfolio/dashboard?sections=${sections}&period=${evolutionPeriod}${portfolioParamAnd}`,
+        { credentials: 'include' }
+      );
+      if (!dashboardRes.ok) return;
+      const dashboard = await dashboardRes.json();
 
-      if (summaryRes.ok) setSummary(await summaryRes.json());
-      if (stocksRes.ok) setStocks(await stocksRes.json());
-      if (dividendsRes.ok) setDividendSummary(await dividendsRes.json());
-      if (historyRes.ok) setPortfolioHistory(await historyRes.json());
-      if (alertsRes.ok) setAlerts(await alertsRes.json());
-      if (evolutionRes.ok) setPortfolioEvolution(await evolutionRes.json());
+      setSummary(dashboard.summary);
+      setStocks(dashboard.stocks);
+      setDividendSummary(dashboard.dividends_summary);
+      setPortfolioHistory(dashboard.history);
+      setAlerts(dashboard.alerts);
+      setPortfolioEvolution(dashboard.evolution);
       
       // Calculate dividends per stock (received and pending)
-      if (allDividendsRes.ok) {
-        const dividends = await allDividendsRes.json();
-        const today = new Date().toISOString().split('T')[0];
-        const divByTicker = {};
-        // Helper para verificar data indefinida
-        const isUndefinedDate = (dateStr) => !dateStr || dateStr === "A_DEFINIR" || dateStr.includes("A_DEFINIR");
+      const dividends = dashboard.dividends;
+      const today = new Date().toISOString().split('T')[0];
+      const divByTicker = {};
+      // Helper para verificar data indefinida
+      const isUndefinedDate = (dateStr) => !dateStr || dateStr === "A_DEFINIR" || dateStr.includes("A_DEFINIR");
+      
+      dividends.forEach(d => {
+        // Ignora dividendos com data indefinida para cálculos
+        if (isUndefinedDate(d.payment_date)) return;
         
-        dividends.forEach(d => {
-          // Ignora dividendos com data indefinida para cálculos
-          if (isUndefinedDate(d.payment_date)) return;
-          
-          if (!divByTicker[d.ticker]) {
-            divByTicker[d.ticker] = { received: 0, pending: 0 };
-          }
-          if (d.payment_date <= today) {
-            divByTicker[d.ticker].received += d.amount;
-          } else {
-            divByTicker[d.ticker].pending += d.amount;
-          }
-        });
-        setStockDividends(divByTicker);
-      }
+        if (!divByTicker[d.ticker]) {
+          divByTicker[d.ticker] = { received: 0, pending: 0 };
+        }
+        if (d.payment_date <= today) {
+          divByTicker[d.ticker].received += d.amount;
+        } else {
+          divByTicker[d.ticker].pending += d.amount;
+        }
+      });
+      setStockDividends(divByTicker);
     } catch (error) {
       console.error('Error fetching data:', error);
     } finally {
@@ -0,0 +1,44 @@
+"""
+Benchmark: vectorized evolution engine vs the legacy per-date loop.
+
+    python tests/bench_evolution.py [lots] [dividends]
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from server import compute_portfolio_evolution  # noqa: E402
+from tests.evolution_reference import legacy_portfolio_evolution  # noqa: E402
+from tests.test_evolution import TODAY, random_portfolio  # noqa: E402
+
+
+def best_of(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    lots = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    dividends = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+    stocks, divs = random_portfolio(42, lots=lots, dividends=dividends)
+    print(f"{lots} lots, {dividends} dividends")
+    print(f"{'period':>6} {'points':>7} {'legacy ms':>10} {'vector ms':>10} {'speedup':>8}")
+    for period in ["1m", "12m", "5y", "max"]:
+        legacy_t, legacy = best_of(lambda: legacy_portfolio_evolution(stocks, divs, period, TODAY))
+        vector_t, vector = best_of(lambda: compute_portfolio_evolution(stocks, divs, period, TODAY))
+        assert legacy == vector, f"output mismatch for period {period}"
+        print(f"{period:>6} {len(vector):>7} {legacy_t * 1000:>10.1f} {vector_t * 1000:>10.1f} {legacy_t / vector_t:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark: FastAPI's default jsonable_encoder + JSONResponse path vs FastJSONResponse (orjson)
+and MessagePack, on listing and evolution payloads shaped like the real responses.
+
+    python tests/bench_serialization.py [lots] [dividends]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import server  # noqa: E402
+from server import FastJSONResponse, MsgPackResponse, compute_portfolio_evolution  # noqa: E402
+from tests.test_evolution import TODAY, random_portfolio  # noqa: E402
+
+
+def best_of(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def as_documents(rows):
+    """Add the datetime fields documents carry when they come back from Motor"""
+    created = datetime(2024, 1, 1)
+    return [{**row, "created_at": created + timedelta(minutes=i), "updated_at": created} for i, row in enumerate(rows)]
+
+
+def main():
+    lots = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    dividends = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    stocks, divs = random_portfolio(7, lots=lots, dividends=dividends)
+    payloads = {
+        "stocks": as_documents(stocks),
+        "dividends": as_documents(divs),
+        "evolution max": compute_portfolio_evolution(stocks, divs, "max", TODAY),
+    }
+
+    print(f"{'payload':>14} {'items':>6} {'default ms':>11} {'orjson ms':>10} {'speedup':>8} {'msgpack ms':>11} {'KB json':>8} {'KB mp':>7}")
+    for name, payload in payloads.items():
+        default_t, default = best_of(lambda: JSONResponse(jsonable_encoder(payload)).body)
+        fast_t, fast = best_of(lambda: FastJSONResponse(payload).body)
+        if server.msgpack is not None:
+            mp_t, mp = best_of(lambda: MsgPackResponse(payload).body)
+            mp_cols = f"{mp_t * 1000:>11.1f} {len(mp) / 1024:>7.0f}"
+        else:
+            mp_cols = f"{'n/a':>11} {'n/a':>7}"
+        print(f"{name:>14} {len(payload):>6} {default_t * 1000:>11.1f} {fast_t * 1000:>10.1f} "
+              f"{default_t / fast_t:>7.1f}x {mp_cols} {len(fast) / 1024:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+import os
+import sys
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, OperationFailure
+
+# server.py reads these at import time; Motor connects lazily so no database is needed
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+# ==================== IN-MEMORY MONGO ====================
+# Just enough of Motor's collection API (and MongoDB's query, update and aggregation
+# semantics) for the queries server.py runs. Unsupported operators raise instead of
+# silently matching.
+
+MISSING = object()
+
+
+def _get(doc, path):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return MISSING
+        value = value[part]
+    return value
+
+
+def _set(doc, path, value):
+    *parents, leaf = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[leaf] = value
+
+
+def _rank(value):
+    """MongoDB's cross-type sort order (missing and null first)"""
+    if value is MISSING or value is None:
+        return 0
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 1
+    if isinstance(value, str):
+        return 2
+    if isinstance(value, dict):
+        return 3
+    if isinstance(value, list):
+        return 4
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    raise NotImplementedError(type(value))
+
+
+def sort_key(value):
+    rank = _rank(value)
+    return (rank, None if rank == 0 else value)
+
+
+def _equals(value, expected):
+    if expected is None:
+        return value is None or value is MISSING
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value is not MISSING and value == expected
+
+
+def _compare(value, op, bound):
+    # Comparisons only match values of the same type bracket (a null never is $lt a string)
+    if value is MISSING or _rank(value) != _rank(bound) or _rank(bound) == 0:
+        return False
+    return {"$gt": value > bound, "$gte": value >= bound, "$lt": value < bound, "$lte": value <= bound}[op]
+
+
+def matches(doc, query):
+    for key, cond in (query or {}).items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in cond):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, sub) for sub in cond):
+                return False
+        elif key.startswith("$"):
+            raise NotImplementedError(key)
+        elif isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+            value = _get(doc, key)
+            for op, arg in cond.items():
+                if op == "$eq":
+                    ok = _equals(value, arg)
+                elif op == "$ne":
+                    ok = not _equals(value, arg)
+                elif op == "$in":
+                    ok = any(_equals(value, a) for a in arg)
+                elif op == "$nin":
+                    ok = not any(_equals(value, a) for a in arg)
+                elif op == "$exists":
+                    ok = (value is not MISSING) == bool(arg)
+                elif op in ("$gt", "$gte", "$lt", "$lte"):
+                    ok = _compare(value, op, arg)
+                else:
+                    raise NotImplementedError(op)
+                if not ok:
+                    return False
+        elif not _equals(_get(doc, key), cond):
+            return False
+    return True
+
+
+def project(doc, projection):
+    doc = dict(doc)
+    if not projection:
+        return doc
+    included = [k for k, v in projection.items() if v and k != "_id"]
+    if included:
+        out = {k: doc[k] for k in included if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+    return {k: v for k, v in doc.items() if projection.get(k, 1)}
+
+
+def apply_update(doc, update, inserting=False):
+    if not any(k.startswith("$") for k in update):
+        keep_id = doc.get("_id")
+        doc.clear()
+        doc.update(update)
+        if keep_id is not None:
+            doc.setdefault("_id", keep_id)
+        return
+    for op, fields in update.items():
+        for path, value in fields.items():
+            if op == "$set" or (op == "$setOnInsert" and inserting):
+                _set(doc, path, value)
+            elif op == "$setOnInsert":
+                continue
+            elif op == "$inc":
+                current = _get(doc, path)
+                _set(doc, path, (0 if current is MISSING else current) + value)
+            elif op == "$unset":
+                parent = _get(doc, path.rsplit(".", 1)[0]) if "." in path else doc
+                if isinstance(parent, dict):
+                    parent.pop(path.rsplit(".", 1)[-1], None)
+            elif op == "$push":
+                current = _get(doc, path)
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                _set(doc, path, ([] if current is MISSING else current) + list(items))
+            else:
+                raise NotImplementedError(op)
+
+
+def _truthy(value):
+    return value not in (MISSING, None, False, 0)
+
+
+def evaluate(expr, doc):
+    if isinstance(expr, str) and expr.startswith("$"):
+        return _get(doc, expr[1:])
+    if isinstance(expr, list):
+        return [evaluate(e, doc) for e in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if len(expr) != 1 or not next(iter(expr)).startswith("$"):
+        return {k: evaluate(v, doc) for k, v in expr.items()}
+    op, args = next(iter(expr.items()))
+    if op == "$literal":
+        return args
+    if op == "$cond":
+        if isinstance(args, dict):
+            args = [args["if"], args["then"], args["else"]]
+        return evaluate(args[1] if _truthy(evaluate(args[0], doc)) else args[2], doc)
+    values = evaluate(args, doc) if isinstance(args, list) else [evaluate(args, doc)]
+    if op == "$type":
+        value = values[0]
+        if value is MISSING:
+            return "missing"
+        return {0: "null", 1: "double", 2: "string", 3: "object", 4: "array", 7: "objectId", 8: "bool", 9: "date"}[_rank(value)]
+    if op == "$ifNull":
+        return next((v for v in values[:-1] if v not in (MISSING, None)), values[-1])
+    if op == "$multiply":
+        if any(v in (MISSING, None) for v in values):
+            return None
+        result = 1
+        for v in values:
+            result *= v
+        return result
+    if op == "$add":
+        return None if any(v in (MISSING, None) for v in values) else sum(values)
+    if op == "$substrCP":
+        return values[0][values[1]:values[1] + values[2]]
+    if op in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte"):
+        a, b = sort_key(values[0]), sort_key(values[1])
+        return {"$eq": a == b, "$ne": a != b, "$gt": a > b, "$gte": a >= b, "$lt": a < b, "$lte": a <= b}[op]
+    raise NotImplementedError(op)
+
+
+def run_pipeline(docs, pipeline):
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == "$match":
+            docs = [d for d in docs if matches(d, spec)]
+        elif name == "$project":
+            projected = []
+            for doc in docs:
+                out = {} if spec.get("_id", 1) == 0 or "_id" not in doc else {"_id": doc["_id"]}
+                for key, expr in spec.items():
+                    if key == "_id":
+                        continue
+                    value = _get(doc, key) if expr in (1, True) else evaluate(expr, doc)
+                    if value is not MISSING:
+                        out[key] = value
+                projected.append(out)
+            docs = projected
+        elif name == "$group":
+            groups = {}
+            for doc in docs:
+                key = evaluate(spec["_id"], doc)
+                key = None if key is MISSING else key
+                group = groups.setdefault(repr(key), {"_id": key, **{f: 0 for f in spec if f != "_id"}})
+                for field, acc in spec.items():
+                    if field == "_id":
+                        continue
+                    (acc_op, acc_expr), = acc.items()
+                    if acc_op != "$sum":
+                        raise NotImplementedError(acc_op)
+                    value = evaluate(acc_expr, doc)
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        group[field] += value
+            docs = list(groups.values())
+        elif name == "$facet":
+            docs = [{field: run_pipeline(docs, sub) for field, sub in spec.items()}]
+        elif name == "$sort":
+            for field, direction in reversed(list(spec.items())):
+                docs = sorted(docs, key=lambda d: sort_key(_get(d, field)), reverse=direction < 0)
+        elif name == "$limit":
+            docs = docs[:spec]
+        else:
+            raise NotImplementedError(name)
+    return docs
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+        self.sort_keys = None
+        self.limit_value = None
+
+    def sort(self, keys, direction=None):
+        self.sort_keys = [(keys, direction)] if isinstance(keys, str) else list(keys)
+        for field, order in reversed(self.sort_keys):
+            self.docs = sorted(self.docs, key=lambda d: sort_key(_get(d, field)), reverse=order == -1)
+        return self
+
+    def limit(self, n):
+        self.limit_value = n or None
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def _results(self, length=None):
+        docs = self.docs[:self.limit_value] if self.limit_value else self.docs
+        return docs[:length] if length else docs
+
+    async def to_list(self, length):
+        return self._results(length)
+
+    def __aiter__(self):
+        async def gen():
+            for doc in self._results():
+                yield doc
+        return gen()
+
+
+class FakeCollection:
+    """
+    In-memory collection. Every call is counted in `calls`; bulk_write keeps its operations in
+    `bulk_calls`. Set `bulk_duplicates` (operation indexes rejected as E11000) or `bulk_error`
+    (raised instead of writing) to simulate failures.
+    """
+
+    def __init__(self, name, docs=(), database=None):
+        self.name = name
+        self.database = database
+        self.docs = []
+        self.calls = Counter()
+        self.bulk_calls = []
+        self.bulk_duplicates = set()
+        self.bulk_error = None
+        self.queries = []
+        for doc in docs:
+            self._insert(doc)
+
+    def _insert(self, doc):
+        doc.setdefault("_id", ObjectId())
+        self.docs.append(dict(doc))
+
+    def _first(self, query, sort=None):
+        found = [d for d in self.docs if matches(d, query)]
+        if sort:
+            found = FakeCursor(found).sort(sort).docs
+        return found[0] if found else None
+
+    # Reads
+    def find(self, query=None, projection=None, sort=None, limit=0):
+        self.calls["find"] += 1
+        self.queries.append((query, projection))
+        cursor = FakeCursor([project(d, projection) for d in self.docs if matches(d, query)])
+        if sort:
+            cursor.sort(sort)
+        return cursor.limit(limit)
+
+    async def find_one(self, query=None, projection=None, sort=None):
+        self.calls["find_one"] += 1
+        doc = self._first(query, sort)
+        return project(doc, projection) if doc else None
+
+    async def count_documents(self, query):
+        self.calls["count_documents"] += 1
+        return sum(1 for d in self.docs if matches(d, query))
+
+    async def distinct(self, field, query=None):
+        self.calls["distinct"] += 1
+        values = []
+        for doc in self.docs:
+            value = _get(doc, field)
+            if matches(doc, query) and value is not MISSING and value not in values:
+                values.append(value)
+        return values
+
+    def aggregate(self, pipeline):
+        self.calls["aggregate"] += 1
+        return FakeCursor(run_pipeline([dict(d) for d in self.docs], pipeline))
+
+    # Writes (the bulk protocol is the one pymongo's operations use to describe themselves)
+    def add_insert(self, document):
+        self._insert(document)
+
+    def add_update(self, selector, update, multi, upsert, **options):
+        targets = [d for d in self.docs if matches(d, selector)]
+        for doc in targets if multi else targets[:1]:
+            apply_update(doc, update)
+        if not targets and upsert:
+            doc = {k: v for k, v in selector.items() if not k.startswith("$") and not isinstance(v, dict)}
+            apply_update(doc, update, inserting=True)
+            self._insert(doc)
+
+    def add_replace(self, selector, replacement, upsert, **options):
+        self.add_update(selector, replacement, False, upsert)
+
+    def add_delete(self, selector, limit, **options):
+        targets = [d for d in self.docs if matches(d, selector)]
+        for doc in targets[:1] if limit else targets:
+            self.docs.remove(doc)
+
+    async def bulk_write(self, operations, ordered=True):
+        self.calls["bulk_write"] += 1
+        self.bulk_calls.append(list(operations))
+        if self.bulk_error:
+            raise self.bulk_error
+        for i, operation in enumerate(operations):
+            if i not in self.bulk_duplicates:
+                operation._add_to_bulk(self)
+        if self.bulk_duplicates:
+            raise BulkWriteError({"writeErrors": [{"index": i, "code": 11000} for i in sorted(self.bulk_duplicates)]})
+
+    async def insert_one(self, document):
+        self.calls["insert_one"] += 1
+        self._insert(document)
+
+    async def insert_many(self, documents, ordered=True):
+        self.calls["insert_many"] += 1
+        for doc in documents:
+            self._insert(doc)
+
+    async def update_one(self, query, update, upsert=False):
+        self.calls["update_one"] += 1
+        self.add_update(query, update, False, upsert)
+
+    async def update_many(self, query, update, upsert=False):
+        self.calls["update_many"] += 1
+        self.add_update(query, update, True, upsert)
+
+    async def replace_one(self, query, replacement, upsert=False):
+        self.calls["replace_one"] += 1
+        self.add_replace(query, replacement, upsert)
+
+    async def delete_many(self, query):
+        self.calls["delete_many"] += 1
+        before = len(self.docs)
+        self.add_delete(query, 0)
+        return type("DeleteResult", (), {"deleted_count": before - len(self.docs)})()
+
+    async def create_index(self, keys, **options):
+        if options.get("name") in self.database.fail_indexes:
+            raise OperationFailure("E11000 duplicate key error", code=11000)
+        self.database.created_indexes.append((self.name, options.get("name"), options))
+        return options.get("name")
+
+
+class FakeDB:
+    """Collections are created on first access; pass initial documents per collection name"""
+
+    def __init__(self, fail_indexes=(), **collections):
+        self.fail_indexes = set(fail_indexes)
+        self.created_indexes = []
+        for name, docs in collections.items():
+            setattr(self, name, FakeCollection(name, docs, self))
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        collection = FakeCollection(name, (), self)
+        setattr(self, name, collection)
+        return collection
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """fake_db(stocks=[...], ...) installs an in-memory database (and fresh data versions) on server"""
+    import server
+
+    def install(**collections):
+        fake = FakeDB(**collections)
+        monkeypatch.setattr(server, "db", fake)
+        monkeypatch.setattr(server, "data_versions", server.DataVersions())
+        return fake
+
+    return install
@@ -0,0 +1,118 @@
+"""
+Per-date loop that /portfolio/evolution used before the vectorized engine.
+Kept as the reference implementation for equivalence tests and tests/bench_evolution.py.
+"""
+from datetime import datetime, timedelta
+
+
+def legacy_portfolio_evolution(stocks, dividends, period, today):
+    # Determine date range based on period
+    period_days = {"1w": 7, "1m": 30, "12m": 365, "5y": 1825, "max": 3650}
+    days_back = period_days.get(period, 30)
+    start_date = today - timedelta(days=days_back)
+    
+    # Find earliest purchase date
+    earliest_purchase = None
+    for stock in stocks:
+        if stock.get("purchase_date"):
+            try:
+                purchase_dt = datetime.strptime(stock["purchase_date"], "%Y-%m-%d").date()
+                if earliest_purchase is None or purchase_dt < earliest_purchase:
+                    earliest_purchase = purchase_dt
+            except:
+                pass
+    
+    if earliest_purchase and earliest_purchase > start_date:
+        start_date = earliest_purchase
+    
+    # Organize ALL dividends by payment date
+    all_dividends_sorted = []
+    for div in dividends:
+        payment_date = div.get("payment_date", "")[:10]
+        if payment_date:
+            try:
+                payment_dt = datetime.strptime(payment_date, "%Y-%m-%d").date()
+                if payment_dt <= today:  # Only already paid
+                    all_dividends_sorted.append({
+                        "date": payment_dt,
+                        "amount": div["amount"],
+                        "ticker": div.get("ticker", "")
+                    })
+            except:
+                pass
+    
+    # Sort by date
+    all_dividends_sorted.sort(key=lambda x: x["date"])
+    
+    # Determine step size
+    step_days = {"1w": 1, "1m": 1, "12m": 7, "5y": 30, "max": 30}.get(period, 1)
+    
+    # Generate data points
+    evolution = []
+    current_date = start_date
+    
+    while current_date <= today:
+        date_str = current_date.strftime("%Y-%m-%d")
+        next_date = current_date + timedelta(days=step_days)
+        if next_date > today:
+            next_date = today + timedelta(days=1)
+        
+        # Calculate invested and current value for stocks owned on this date
+        total_invested = 0
+        total_current = 0
+        
+        for stock in stocks:
+            is_bonificacao = stock.get("operation_type") == "bonificacao"
+            purchase_date = stock.get("purchase_date")
+            
+            # Check if stock was owned on current_date
+            owned = False
+            if purchase_date:
+                try:
+                    purchase_dt = datetime.strptime(purchase_date, "%Y-%m-%d").date()
+                    owned = purchase_dt <= current_date
+                except:
+                    owned = True
+            else:
+                owned = True
+            
+            if owned:
+                current_value = stock["quantity"] * (stock.get("current_price") or stock["average_price"])
+                total_current += current_value
+                if not is_bonificacao:
+                    invested = stock["quantity"] * stock["average_price"]
+                    total_invested += invested
+        
+        # Calculate cumulative dividends UP TO current_date (inclusive)
+        # This is the KEY: sum ALL dividends with payment_date <= current_date
+        cumulative_dividends = sum(
+            d["amount"] for d in all_dividends_sorted 
+            if d["date"] <= current_date
+        )
+        
+        # Calculate dividends received in THIS PERIOD (current_date to next_date - 1 day)
+        period_dividends = sum(
+            d["amount"] for d in all_dividends_sorted 
+            if current_date <= d["date"] < next_date
+        )
+        
+        if total_invested > 0:
+            appreciation_gain = total_current - total_invested
+            total_return = appreciation_gain + cumulative_dividends
+            
+            evolution.append({
+                "date": date_str,
+                "invested": round(total_invested, 2),
+                "current": round(total_current, 2),
+                "dividends": round(cumulative_dividends, 2),
+                "dividends_period": round(period_dividends, 2),
+                "total": round(total_current + cumulative_dividends, 2),
+                "gain": round(appreciation_gain, 2),
+                "gain_percent": round((appreciation_gain / total_invested) * 100, 2) if total_invested > 0 else 0,
+                "total_return": round(total_return, 2),
+                "total_return_percent": round((total_return / total_invested) * 100, 2) if total_invested > 0 else 0
+            })
+        
+        current_date = next_date
+    
+    return evolution
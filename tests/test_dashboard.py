@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import Response
+
+import server
+from server import ComputedStateCache, SnapshotWriter
+
+
+STOCKS = [
+    {"stock_id": "s1", "user_id": "u", "ticker": "ITSA4", "quantity": 10, "average_price": 10.0, "current_price": 12.0,
+     "sector": "Bancos"},
+    {"stock_id": "s2", "user_id": "u", "ticker": "MXRF11", "quantity": 5, "average_price": 10.0, "asset_type": "fii",
+     "operation_type": "bonificacao"},
+]
+DIVIDENDS = [
+    {"user_id": "u", "ticker": "ITSA4", "amount": 3.0, "payment_date": "2020-01-10"},
+    {"user_id": "u", "ticker": "ITSA4", "amount": 2.0, "payment_date": "2999-01-10"},
+]
+
+
+def test_in_memory_totals_follow_the_aggregation_rules():
+    stocks = STOCKS
+    totals = server.summarize_lot_totals(stocks)
+
+    assert totals["invested"] == 100.0  # bonificação is not invested
+    assert totals["current"] == 170.0
+    assert totals["by_type"]["acao"]["count"] == 1 and totals["by_type"]["fii"]["current"] == 50.0
+    assert server.summarize_dividend_totals(DIVIDENDS, "2026-10-17") == {"received": 3.0, "pending": 2.0}
+    assert server.prices_from_lots(stocks) == {"ITSA4": 12.0}
+
+
+def test_sections_come_from_one_read_per_collection(fake_db, monkeypatch):
+    fake = fake_db(stocks=[dict(s) for s in STOCKS], dividends=[dict(d) for d in DIVIDENDS],
+                   alerts=[{"alert_id": "a1", "user_id": "u", "is_read": False}])
+    monkeypatch.setattr(server, "portfolio_cache", ComputedStateCache(max_bytes=1 << 20))
+    user = server.User(user_id="u", email="u@x", name="U")
+    request = Request({"type": "http", "headers": []})
+
+    response = asyncio.run(server.get_portfolio_dashboard(
+        request, Response(), user, sections="stocks,dividends_summary,ideal_distribution,alerts_count",
+    ))
+    payload = json.loads(response.body)
+
+    assert list(payload) == ["stocks", "dividends_summary", "ideal_distribution", "alerts_count"]
+    assert len(payload["stocks"]) == 2
+    assert payload["dividends_summary"]["total"] == 5.0
+    assert payload["alerts_count"] == {"count": 1}
+    assert payload["ideal_distribution"]["distribution"]
+    assert fake.stocks.calls["find"] == 1 and fake.dividends.calls["find"] == 1
+    assert fake.alerts.calls["find"] == 0 and fake.portfolio_snapshots.calls["find"] == 0
+
+
+def test_summary_section_shares_the_summary_endpoint_cache(fake_db, monkeypatch):
+    fake_db(stocks=[dict(s) for s in STOCKS], dividends=[dict(d) for d in DIVIDENDS])
+    monkeypatch.setattr(server, "portfolio_cache", ComputedStateCache(max_bytes=1 << 20))
+    monkeypatch.setattr(server, "snapshot_writer", SnapshotWriter(interval=30))
+    user = server.User(user_id="u", email="u@x", name="U")
+    request = Request({"type": "http", "headers": []})
+
+    async def run():
+        dashboard = await server.get_portfolio_dashboard(request, Response(), user, sections="summary")
+        response = Response()
+        summary = await server.get_portfolio_summary(request, response, user)
+        return json.loads(dashboard.body)["summary"], json.loads(summary.body), response
+
+    from_dashboard, from_endpoint, response = asyncio.run(run())
+    assert response.headers["X-Cache"] == "HIT"  # same BRT+UTC day key
+    assert from_endpoint["total_current"] == from_dashboard["total_current"] == 170.0
+
+
+def test_unknown_section_is_rejected():
+    user = server.User(user_id="u", email="u@x", name="U")
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(server.get_portfolio_dashboard(Request({"type": "http", "headers": []}), Response(), user, sections="summary,nope"))
+    assert exc.value.status_code == 400
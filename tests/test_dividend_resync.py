@@ -0,0 +1,94 @@
+import asyncio
+
+from bson import ObjectId
+
+import server
+from server import DividendResyncQueue
+
+
+EVENTS = [
+    {"data_com": "2025-03-01", "data_pagamento": "2025-04-01", "tipo": "dividendo", "valor": 0.5},
+    {"data_com": "2025-06-01", "data_pagamento": "2025-07-01", "tipo": "jcp", "valor": 0.2},
+    {"data_com": "2025-09-01", "data_pagamento": "2025-10-01", "tipo": "dividendo", "valor": 0.1},
+]
+
+
+LOT = {"stock_id": "s1", "user_id": "u", "ticker": "ITSA4", "portfolio_id": "p1", "quantity": 100,
+       "purchase_date": "2025-01-02", "operation_type": "compra", "asset_type": "acao"}
+
+
+def stored_dividend(ex_date, payment_date, div_type, amount, **fields):
+    return {"_id": ObjectId(), "user_id": "u", "ticker": "ITSA4", "portfolio_id": "p1", "ex_date": ex_date,
+            "payment_date": payment_date, "type": div_type, "amount": amount, **fields}
+
+
+def run_resync(monkeypatch, catalog_events):
+    async def events(ticker, is_fii, full=False):
+        return catalog_events
+
+    monkeypatch.setattr(server.dividend_catalog, "events", events)
+    return asyncio.run(server.resync_dividends_for_ticker("u", "ITSA4", "p1"))
+
+
+def test_resync_writes_only_the_difference(fake_db, monkeypatch):
+    unchanged = stored_dividend("2025-03-01", "2025-04-01", "dividendo", 50.0, unit_value=0.5, quantity=100)
+    changed = stored_dividend("2025-06-01", "2025-07-01", "jcp", 16.0, unit_value=0.2, quantity=80)
+    stale = stored_dividend("2025-04-15", "2025-05-01", "dividendo", 5.0)
+    fake = fake_db(stocks=[dict(LOT)], dividends=[dict(unchanged), dict(changed), dict(stale)])
+
+    result = run_resync(monkeypatch, EVENTS + EVENTS[-1:])  # repeated row from the source
+
+    assert fake.dividends.calls["bulk_write"] == 1 and len(fake.dividends.bulk_calls[0]) == 3
+    stored = {doc["ex_date"]: doc for doc in fake.dividends.docs}
+    assert sorted(stored) == ["2025-03-01", "2025-06-01", "2025-09-01"]
+    assert stored["2025-03-01"] == unchanged
+    assert stored["2025-06-01"]["_id"] == changed["_id"]
+    assert (stored["2025-06-01"]["amount"], stored["2025-06-01"]["quantity"]) == (20.0, 100)
+    assert stored["2025-09-01"]["amount"] == 10.0 and stored["2025-09-01"]["portfolio_id"] == "p1"
+    assert (result["synced"], result["updated"], result["deleted"]) == (1, 1, 1)
+
+
+def test_resync_keeps_rows_the_catalog_does_not_cover(fake_db, monkeypatch):
+    history = [
+        stored_dividend("2025-03-01", "2025-04-01", "dividendo", 50.0, unit_value=0.5, quantity=100),
+        stored_dividend("2025-06-01", "2025-07-01", "jcp", 20.0, unit_value=0.2, quantity=100),
+        {"_id": ObjectId(), "user_id": "u", "ticker": "ITSA4", "portfolio_id": "p1",
+         "amount": 7.0, "payment_date": "2025-08-01"},  # manual entry
+    ]
+
+    # Empty catalog (scrape not available yet): nothing is written
+    fake = fake_db(stocks=[dict(LOT)], dividends=[dict(d) for d in history])
+    assert run_resync(monkeypatch, [])["deleted"] == 0
+    assert fake.dividends.calls["bulk_write"] == 0
+
+    # Truncated catalog (newest event only): older history and manual entries stay
+    fake = fake_db(stocks=[dict(LOT)], dividends=[dict(d) for d in history])
+    result = run_resync(monkeypatch, EVENTS[-1:])
+    assert result["deleted"] == 0 and result["synced"] == 1
+    assert all(doc in fake.dividends.docs for doc in history) and len(fake.dividends.docs) == 4
+
+
+def test_queue_coalesces_bursts_per_ticker(monkeypatch):
+    runs = []
+
+    async def resync(user_id, ticker, portfolio_id=None):
+        runs.append((user_id, portfolio_id, ticker))
+
+    monkeypatch.setattr(server, "resync_dividends_for_ticker", resync)
+    queue = DividendResyncQueue(debounce=0.05, concurrency=2)
+
+    async def scenario():
+        queue.start()
+        for _ in range(5):
+            queue.enqueue("u", "p1", "ITSA4")
+            await asyncio.sleep(0.01)
+        queue.enqueue("u", "p1", "PETR4")
+        await asyncio.sleep(0.01)
+        assert runs == []  # still inside the debounce window
+        await asyncio.sleep(0.15)
+        queue.enqueue("u", "p1", "VALE3")
+        await queue.stop()  # pending jobs run on shutdown
+
+    asyncio.run(scenario())
+    assert runs == [("u", "p1", "ITSA4"), ("u", "p1", "PETR4"), ("u", "p1", "VALE3")]
+    assert queue.stats["coalesced"] == 4 and queue.snapshot()["pending"] == 0
@@ -0,0 +1,180 @@
+import asyncio
+
+from bson import ObjectId
+
+import server
+
+
+LOTS = [
+    {"stock_id": "s1", "user_id": "u", "ticker": "ITSA4", "name": "Itaúsa", "portfolio_id": "p1", "quantity": 100,
+     "average_price": 10.0, "purchase_date": "2025-01-02", "operation_type": "compra", "asset_type": "acao"},
+]
+
+
+SCRAPED = [
+    {"data_com": "2025-03-01", "data_pagamento": "2025-04-01", "tipo": "dividendo", "valor": 0.5},
+    {"data_com": "2025-06-01", "data_pagamento": "2025-07-01", "tipo": "jcp", "valor": 0.2},
+    {"data_com": "2025-09-01", "data_pagamento": "2025-10-01", "tipo": "dividendo", "valor": 0.1},
+    {"data_com": "2025-09-01", "data_pagamento": "2025-10-01", "tipo": "dividendo", "valor": 0.1},  # repeated row
+    {"data_com": "2025-08-01", "data_pagamento": "", "tipo": "", "valor": 10, "is_bonificacao": True},
+]
+
+
+def run_sync(monkeypatch, fake):
+    monkeypatch.setattr(server.http_clients, "get", lambda name: None)
+
+    async def fetch(client, ticker, page):
+        return SCRAPED if page == 1 else []
+
+    touched = []
+
+    async def touch_many(user_id, changes):
+        touched.append(changes)
+
+    monkeypatch.setattr(server, "fetch_investidor10_dividends_async", fetch)
+    monkeypatch.setattr(server.position_ledger, "touch_many", touch_many)
+    user = server.User(user_id="u", email="u@x", name="U")
+    return asyncio.run(server.sync_dividends(user, None)), touched
+
+
+def test_catalog_scrapes_each_ticker_once_per_day(fake_db, monkeypatch):
+    fake = fake_db(stocks=[dict(LOTS[0])])
+    monkeypatch.setattr(server.http_clients, "get", lambda name: None)
+    pages = []
+    rows = {1: SCRAPED[:2]}
+
+    async def fetch(client, ticker, page):
+        pages.append((ticker, page))
+        return rows.get(page, [])
+
+    monkeypatch.setattr(server, "fetch_investidor10_dividends_async", fetch)
+    catalog = server.DividendCatalog(interval=3600)
+
+    async def scenario():
+        first = await asyncio.gather(catalog.events("ITSA4", False), catalog.events("ITSA4", False))
+        again = await catalog.events("ITSA4", False)
+        # A failed (empty) scrape on a later day keeps the rows already known
+        fake.dividend_events.docs[0].update(fetched_day="2000-01-01", checked_ts=0)
+        rows.clear()
+        stale = await catalog.events("ITSA4", False)
+        return first, again, stale
+
+    first, again, stale = asyncio.run(scenario())
+    assert first == [SCRAPED[:2], SCRAPED[:2]] and again == stale == SCRAPED[:2]
+    assert pages == [("ITSA4", 1), ("ITSA4", 2), ("ITSA4", 1)]
+    assert catalog.stats["empty"] == 1
+
+
+def test_catalog_retries_a_first_scrape_that_came_back_empty(fake_db, monkeypatch):
+    fake = fake_db(stocks=[dict(LOTS[0])])
+    monkeypatch.setattr(server.http_clients, "get", lambda name: None)
+
+    async def fetch(client, ticker, page):
+        return []
+
+    monkeypatch.setattr(server, "fetch_investidor10_dividends_async", fetch)
+    catalog = server.DividendCatalog(interval=3600)
+
+    assert asyncio.run(catalog.events("ITSA4", False)) == []
+    [doc] = fake.dividend_events.docs
+    assert "fetched_day" not in doc
+    assert not catalog._is_stale(doc, False)  # retried after DIVIDEND_CATALOG_RETRY_INTERVAL...
+    assert catalog._is_stale(dict(doc, checked_ts=0), False)  # ...not at tomorrow's scrape
+
+
+def test_sync_plans_in_memory_and_writes_once(fake_db, monkeypatch):
+    existing_id, undefined_id = ObjectId(), ObjectId()
+    fake = fake_db(stocks=[dict(LOTS[0])], dividends=[
+        {"_id": existing_id, "user_id": "u", "ticker": "ITSA4", "portfolio_id": "p1", "ex_date": "2025-03-01",
+         "payment_date": "2025-04-01", "type": "dividendo", "amount": 40.0, "quantity": 80},
+        {"_id": undefined_id, "user_id": "u", "ticker": "ITSA4", "portfolio_id": "p1", "ex_date": "2025-06-01",
+         "payment_date": "A_DEFINIR", "type": "jcp", "amount": 20.0, "quantity": 100},
+    ])
+
+    result, touched = run_sync(monkeypatch, fake)
+
+    assert fake.dividends.calls["find"] == 1 and fake.stocks.calls["find"] == 2  # lots + bonificação preload
+    assert fake.dividends.calls["bulk_write"] == 1 and fake.stocks.calls["bulk_write"] == 1
+    stored = {doc["ex_date"]: doc for doc in fake.dividends.docs}
+    assert len(fake.dividends.docs) == 3
+    assert stored["2025-03-01"]["_id"] == existing_id
+    assert (stored["2025-03-01"]["amount"], stored["2025-03-01"]["quantity"]) == (50.0, 100)
+    assert stored["2025-06-01"]["_id"] == undefined_id and stored["2025-06-01"]["payment_date"] == "2025-07-01"
+    assert stored["2025-09-01"]["amount"] == 10.0 and stored["2025-09-01"]["portfolio_id"] == "p1"
+
+    [bonus] = [lot for lot in fake.stocks.docs if lot["operation_type"] == "bonificacao"]
+    assert (bonus["quantity"], bonus["purchase_date"], bonus["source"]) == (10, "2025-08-01", "dividend_sync")
+    assert touched == [{("p1", "ITSA4"): "2025-08-01"}]
+    assert (result["total_novos"], result["atualizados"], result["bonificacoes"]) == (1, 2, 1)
+
+
+def test_concurrent_duplicates_are_not_counted(fake_db, monkeypatch):
+    fake = fake_db(stocks=[dict(LOTS[0])])
+    fake.dividends.bulk_duplicates = {0}  # inserted meanwhile by another sync
+    result, _ = run_sync(monkeypatch, fake)
+
+    [operations] = fake.dividends.bulk_calls
+    assert len(operations) == 3 and len(fake.dividends.docs) == 2
+    assert result["total_novos"] == 2
+
+
+def test_catalog_refresh_stops_at_known_events(fake_db, monkeypatch):
+    fake = fake_db(stocks=[dict(LOTS[0])])
+    monkeypatch.setattr(server.http_clients, "get", lambda name: None)
+    newest = {"data_com": "2026-01-05", "data_pagamento": "2026-02-01", "tipo": "dividendo", "valor": 0.3}
+    upstream = {1: [SCRAPED[2], SCRAPED[1]], 2: [SCRAPED[0]]}
+    pages = []
+
+    async def fetch(client, ticker, page):
+        pages.append(page)
+        return upstream.get(page, [])
+
+    monkeypatch.setattr(server, "fetch_investidor10_dividends_async", fetch)
+    catalog = server.DividendCatalog(interval=3600)
+
+    def refresh(full=False):
+        previous = fake.dividend_events.docs[0] if fake.dividend_events.docs else None
+        pages.clear()
+        return asyncio.run(catalog.refresh("ITSA4", False, previous, full))
+
+    assert refresh()["watermark"] == "2025-09-01" and pages == [1, 2, 3]
+
+    assert refresh()["events"] == [SCRAPED[2], SCRAPED[1], SCRAPED[0]]
+    assert pages == [1] and catalog.stats["unchanged"] == 1  # page 1 fingerprint unchanged
+
+    # A new event shifts the pages: paging stops on the first page reaching the watermark
+    upstream = {1: [newest, SCRAPED[2]], 2: [SCRAPED[1], SCRAPED[0]]}
+    doc = refresh()
+    assert pages == [1, 2] and doc["watermark"] == "2026-01-05"
+    assert doc["events"] == [newest, SCRAPED[2], SCRAPED[1], SCRAPED[0]]
+
+    refresh(full=True)
+    assert pages == [1, 2, 3]
+
+
+def test_catalog_does_not_save_a_truncated_scrape(fake_db, monkeypatch):
+    fake = fake_db(stocks=[dict(LOTS[0])])
+    monkeypatch.setattr(server.http_clients, "get", lambda name: None)
+    upstream = {1: [SCRAPED[2]], 2: None, 3: [SCRAPED[0]]}  # page 2 fails
+
+    async def fetch(client, ticker, page):
+        return upstream.get(page, [])
+
+    monkeypatch.setattr(server, "fetch_investidor10_dividends_async", fetch)
+    catalog = server.DividendCatalog(interval=3600)
+
+    doc = asyncio.run(catalog.refresh("ITSA4", False))
+    assert doc["events"] == [] and "fingerprint" not in doc and "fetched_day" not in doc
+    assert catalog.stats["incomplete"] == 1
+
+    # The retry once the page loads again is a full scrape, not an early stop on page 1
+    upstream[2] = [SCRAPED[1]]
+    doc = asyncio.run(catalog.refresh("ITSA4", False, fake.dividend_events.docs[0]))
+    assert doc["events"] == [SCRAPED[2], SCRAPED[1], SCRAPED[0]] and doc["fetched_day"]
+
+    # A later failure keeps the stored rows and only advances checked_ts
+    upstream[2] = None
+    stored = dict(fake.dividend_events.docs[0], fingerprint="changed", checked_ts=0)
+    doc = asyncio.run(catalog.refresh("ITSA4", False, stored))
+    assert doc["events"] == [SCRAPED[2], SCRAPED[1], SCRAPED[0]] and doc["fingerprint"] == "changed"
+    assert doc["checked_ts"] > 0
@@ -0,0 +1,46 @@
+import random
+from datetime import date, timedelta
+
+from server import LotEntitlement
+
+
+def scan(lots, data_com):
+    """The per-dividend scan the sync paths used before"""
+    eligible = [
+        lot for lot in lots
+        if lot.get("operation_type", "compra") == "compra" and lot.get("purchase_date")
+        and date.fromisoformat(lot["purchase_date"][:10]) <= data_com
+    ]
+    return sum(lot.get("quantity", 0) for lot in eligible), (eligible[0] if eligible else None)
+
+
+def test_matches_the_lot_scan_for_random_portfolios():
+    rng = random.Random(7)
+    start = date(2023, 1, 1)
+    for _ in range(50):
+        lots = [
+            {"stock_id": f"s{i}", "quantity": rng.randint(1, 500),
+             "operation_type": rng.choice(["compra", "compra", "venda", "bonificacao"]),
+             "purchase_date": (start + timedelta(days=rng.randint(0, 700))).isoformat() + "T00:00:00"}
+            for i in range(rng.randint(0, 20))
+        ]
+        entitlement = LotEntitlement(lots)
+        for offset in range(-5, 720, 7):
+            data_com = start + timedelta(days=offset)
+            assert entitlement.eligible(data_com) == scan(lots, data_com)
+
+
+def test_same_day_sales_and_unusable_lots():
+    lots = [
+        {"stock_id": "late", "quantity": 10, "purchase_date": "2025-03-01"},
+        {"stock_id": "early", "quantity": 5, "purchase_date": "2025-01-01", "operation_type": "compra"},
+        {"stock_id": "nodate", "quantity": 99},
+        {"stock_id": "bad", "quantity": 99, "purchase_date": "01/02/2025"},
+        {"stock_id": "sale", "quantity": 3, "purchase_date": "2025-03-01T10:00:00", "operation_type": "venda"},
+    ]
+    entitlement = LotEntitlement(lots)
+
+    assert entitlement.has_sale_on("2025-03-01") and not entitlement.has_sale_on("2025-01-01")
+    assert entitlement.eligible(date(2024, 12, 31)) == (0, None)
+    shares, first = entitlement.eligible(date(2025, 3, 1))
+    assert shares == 15 and first["stock_id"] == "late"  # first listed, as the scan picked
@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime, timezone
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+import server
+from server import DataVersions
+
+
+def make_client(fake_db, monkeypatch):
+    fake = fake_db()
+    monkeypatch.setattr(server, "data_versions", DataVersions(ttl=60))
+    calls = []
+
+    app = FastAPI()
+
+    @app.get("/count", dependencies=[Depends(server.conditional_get("alerts"))])
+    async def count():
+        calls.append(1)
+        return {"count": len(calls)}
+
+    app.dependency_overrides[server.get_current_user] = lambda: server.User(user_id="u", email="u@x", name="U")
+    return TestClient(app), fake, calls
+
+
+def test_unchanged_version_answers_304_without_running_endpoint(fake_db, monkeypatch):
+    client, fake, calls = make_client(fake_db, monkeypatch)
+
+    first = client.get("/count")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.headers["cache-control"] == "private, no-cache"
+
+    second = client.get("/count", headers={"If-None-Match": etag})
+    assert second.status_code == 304 and second.headers["etag"] == etag
+    assert len(calls) == 1
+    assert fake.data_versions.calls["find_one"] == 1  # version doc served from the worker cache
+
+
+def test_bump_changes_etag(fake_db, monkeypatch):
+    client, fake, calls = make_client(fake_db, monkeypatch)
+    etag = client.get("/count").headers["etag"]
+
+    asyncio.run(server.data_versions.bump_alerts("u"))
+    again = client.get("/count", headers={"If-None-Match": etag})
+
+    assert again.status_code == 200 and again.headers["etag"] != etag
+    # Other query strings are other resources
+    assert client.get("/count?unread_only=true").headers["etag"] != again.headers["etag"]
+
+
+def test_etag_matching_is_weak_and_handles_lists():
+    etag = server.make_etag("u", "/api/x?", "3")
+    assert server.etag_matches(etag.removeprefix("W/"), etag)
+    assert server.etag_matches(f'"other", {etag}', etag)
+    assert server.etag_matches("*", etag)
+    assert not server.etag_matches(None, etag)
+
+
+def test_daily_key_rolls_over_at_brt_and_utc_midnight():
+    def key(day, hour):
+        return server.daily_view_key(datetime(2026, 3, day, hour, tzinfo=timezone.utc))
+
+    assert key(9, 22) != key(10, 1)  # UTC midnight: dividends received/pending move
+    assert key(10, 1) != key(10, 4)  # 03:00 UTC is midnight BRT: new daily reference
+    assert key(10, 4) == key(10, 23)
+    assert server.brt_day(datetime(2026, 3, 10, 1, tzinfo=timezone.utc)) == "2026-03-09"
@@ -0,0 +1,57 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from server import compute_portfolio_evolution
+from tests.evolution_reference import legacy_portfolio_evolution
+
+TODAY = date(2026, 3, 15)
+
+
+def random_portfolio(seed, lots=60, dividends=200):
+    rng = random.Random(seed)
+    tickers = ["PETR4", "VALE3", "ITSA4", "HGLG11", "KNRI11"]
+    stocks = []
+    for i in range(lots):
+        purchase = TODAY - timedelta(days=rng.randint(-5, 2500))
+        stock = {
+            "ticker": rng.choice(tickers),
+            "quantity": rng.randint(1, 500),
+            "average_price": round(rng.uniform(5, 120), 2),
+            "current_price": rng.choice([None, 0, round(rng.uniform(5, 120), 2)]),
+            "purchase_date": purchase.strftime("%Y-%m-%d"),
+        }
+        if i % 13 == 0:
+            stock["operation_type"] = "bonificacao"
+        if i % 17 == 0:
+            stock["purchase_date"] = rng.choice([None, "", "15/03/2024"])
+        stocks.append(stock)
+    divs = []
+    for i in range(dividends):
+        payment = TODAY - timedelta(days=rng.randint(-60, 2500))
+        payment_date = payment.strftime("%Y-%m-%d")
+        if i % 11 == 0:
+            payment_date = rng.choice(["A_DEFINIR", "", payment_date + "T00:00:00"])
+        divs.append({"amount": round(rng.uniform(0.01, 300), 2), "payment_date": payment_date})
+    return stocks, divs
+
+
+@pytest.mark.parametrize("period", ["1w", "1m", "12m", "5y", "max", "unknown"])
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_legacy_loop(period, seed):
+    stocks, dividends = random_portfolio(seed)
+    assert compute_portfolio_evolution(stocks, dividends, period, TODAY) == \
+        legacy_portfolio_evolution(stocks, dividends, period, TODAY)
+
+
+def test_starts_at_earliest_purchase():
+    stocks = [{"quantity": 10, "average_price": 10.0, "purchase_date": (TODAY - timedelta(days=3)).strftime("%Y-%m-%d")}]
+    points = compute_portfolio_evolution(stocks, [], "1m", TODAY)
+    assert [p["date"] for p in points][0] == (TODAY - timedelta(days=3)).strftime("%Y-%m-%d")
+    assert len(points) == 4
+
+
+def test_only_bonificacao_yields_no_points():
+    stocks = [{"quantity": 10, "average_price": 10.0, "operation_type": "bonificacao", "purchase_date": "2026-01-01"}]
+    assert compute_portfolio_evolution(stocks, [], "1m", TODAY) == []
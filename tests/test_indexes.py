@@ -0,0 +1,30 @@
+import asyncio
+
+import server
+
+
+def test_creates_every_declared_index(fake_db, monkeypatch):
+    fake = fake_db()
+    monkeypatch.setattr(server, "index_status", {})
+
+    status = asyncio.run(server.ensure_indexes())
+
+    declared = sum(len(specs) for specs in server.INDEX_SPECS.values())
+    assert len(fake.created_indexes) == declared
+    assert all(v == "ok" for names in status.values() for v in names.values())
+    ttl = [opts for coll, name, opts in fake.created_indexes if coll == "user_sessions" and name == "expires_at_ttl"]
+    assert ttl[0]["expireAfterSeconds"] == 0
+
+
+def test_failed_index_is_reported_not_raised(fake_db, monkeypatch):
+    fake = fake_db(fail_indexes={"dividend_dedup"})
+    monkeypatch.setattr(server, "index_status", {})
+
+    status = asyncio.run(server.ensure_indexes())
+
+    assert "duplicate key" in status["dividends"]["dividend_dedup"]
+    assert status["dividends"]["dividend_id"] == "ok"
+    # The failure doesn't stop the remaining indexes from being created
+    created = [name for _, name, _ in fake.created_indexes]
+    assert "dividend_dedup" not in created
+    assert len(created) == sum(len(specs) for specs in server.INDEX_SPECS.values()) - 1
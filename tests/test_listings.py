@@ -0,0 +1,86 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import server
+
+
+def _request(accept="application/json"):
+    return Request({"type": "http", "headers": [(b"accept", accept.encode())]})
+
+
+async def _body(response):
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+def test_streams_everything_without_limit(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "LISTING_BATCH_SIZE", 2)
+    docs = [{"_id": ObjectId(), "user_id": "u", "stock_id": f"s{i}", "created_at": datetime(2026, 1, i + 1)} for i in range(5)]
+    coll = fake_db(stocks=docs).stocks
+
+    response = asyncio.run(server.streamed_listing(_request(), coll, {"user_id": "u"}, server.STOCK_LISTING_SORT, server.STOCK_LISTING_FIELDS))
+    body = json.loads(asyncio.run(_body(response)))
+
+    assert [d["stock_id"] for d in body] == ["s0", "s1", "s2", "s3", "s4"]
+    assert body[0] == {"user_id": "u", "stock_id": "s0", "created_at": "2026-01-01T00:00:00"}
+    assert "x-next-cursor" not in response.headers
+
+
+def test_page_sets_next_cursor_and_projects_fields(fake_db):
+    docs = [{"_id": ObjectId(), "user_id": "u", "payment_date": f"2026-0{9 - i}-01", "ticker": "PETR4", "amount": i} for i in range(4)]
+    coll = fake_db(dividends=docs).dividends
+
+    response = asyncio.run(server.streamed_listing(
+        _request(), coll, {"user_id": "u"}, server.DIVIDEND_LISTING_SORT, server.DIVIDEND_LISTING_FIELDS,
+        fields="ticker,amount", limit=2,
+    ))
+    body = json.loads(asyncio.run(_body(response)))
+
+    assert body == [{"ticker": "PETR4", "amount": 0}, {"ticker": "PETR4", "amount": 1}]
+    assert coll.queries[0][1] == {"ticker": 1, "amount": 1, "payment_date": 1, "_id": 1}
+
+    cursor_filter = server.listing_cursor_filter(response.headers["x-next-cursor"], server.DIVIDEND_LISTING_SORT)
+    assert cursor_filter == {"$or": [
+        {"$or": [{"payment_date": {"$lt": "2026-08-01"}}, {"payment_date": None}]},
+        {"payment_date": "2026-08-01", "_id": {"$lt": docs[1]["_id"]}},
+    ]}
+
+
+def test_paging_reaches_rows_without_payment_date(fake_db):
+    docs = [{"_id": ObjectId(), "user_id": "u", "payment_date": date, "amount": i}
+            for i, date in enumerate(["2026-09-01", None, "2026-08-01", "2026-07-01"])]
+    docs.append({"_id": ObjectId(), "user_id": "u", "amount": 4})  # no payment_date at all
+    coll = fake_db(dividends=docs).dividends
+
+    seen, cursor = [], None
+    while True:
+        response = asyncio.run(server.streamed_listing(
+            _request(), coll, {"user_id": "u"}, server.DIVIDEND_LISTING_SORT, server.DIVIDEND_LISTING_FIELDS,
+            fields="amount", limit=2, cursor=cursor,
+        ))
+        seen += [d["amount"] for d in json.loads(asyncio.run(_body(response)))]
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+
+    assert sorted(seen) == [0, 1, 2, 3, 4] and len(seen) == 5
+    assert seen[:3] == [0, 2, 3]  # dated rows first, then the undated ones
+
+
+def test_single_key_cursor_and_bad_input():
+    oid = ObjectId()
+    cursor = server.encode_listing_cursor({"_id": oid}, server.STOCK_LISTING_SORT)
+    assert server.listing_cursor_filter(cursor, server.STOCK_LISTING_SORT) == {"_id": {"$gt": oid}}
+
+    with pytest.raises(HTTPException) as exc:
+        server.listing_cursor_filter("not-a-cursor", server.STOCK_LISTING_SORT)
+    assert exc.value.status_code == 400
+
+    with pytest.raises(HTTPException) as exc:
+        server.parse_listing_fields("ticker,password", server.STOCK_LISTING_FIELDS, server.STOCK_LISTING_SORT)
+    assert "password" in exc.value.detail
@@ -0,0 +1,49 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import server
+from server import MarketDataIngestor, is_b3_trading_hours
+
+
+def test_trading_hours_in_brasilia_time():
+    # 2026-10-16 is a Friday; 13:00 UTC = 10:00 BRT
+    assert is_b3_trading_hours(datetime(2026, 10, 16, 13, 0, tzinfo=timezone.utc))
+    # 12:00 UTC = 09:00 BRT, before the open
+    assert not is_b3_trading_hours(datetime(2026, 10, 16, 12, 0, tzinfo=timezone.utc))
+    # Saturday
+    assert not is_b3_trading_hours(datetime(2026, 10, 17, 15, 0, tzinfo=timezone.utc))
+
+
+def test_get_ignores_outdated_quotes_during_session(monkeypatch):
+    ingestor = MarketDataIngestor(interval=60)
+    ingestor.prices["PETR4"] = {"ticker": "PETR4", "price": 38.5, "updated_ts": time.time() - 600}
+
+    monkeypatch.setattr(server, "is_b3_trading_hours", lambda now=None: True)
+    assert ingestor.get("PETR4") is None
+
+    monkeypatch.setattr(server, "is_b3_trading_hours", lambda now=None: False)
+    assert ingestor.get("PETR4")["price"] == 38.5
+
+
+def test_get_prices_refetches_outdated_quotes(fake_db, monkeypatch):
+    fake_db()
+    monkeypatch.setattr(server, "is_b3_trading_hours", lambda now=None: True)
+    fetched = []
+
+    async def fetch_quotes_batch(tickers):
+        fetched.append(list(tickers))
+        return {t: {"price": 40.0} for t in tickers if t == "PETR4"}
+
+    monkeypatch.setattr(server, "fetch_quotes_batch", fetch_quotes_batch)
+    ingestor = MarketDataIngestor(interval=60)
+    ingestor.prices["PETR4"] = {"ticker": "PETR4", "price": 38.5, "updated_ts": time.time() - 600}
+    ingestor.prices["VALE3"] = {"ticker": "VALE3", "price": 60.0, "updated_ts": time.time() - 600}
+    ingestor.prices["ITUB4"] = {"ticker": "ITUB4", "price": 30.0, "updated_ts": time.time()}
+
+    prices = asyncio.run(ingestor.get_prices(["PETR4", "VALE3", "ITUB4"]))
+
+    assert fetched == [["PETR4", "VALE3"]]
+    assert prices["PETR4"]["price"] == 40.0
+    assert prices["VALE3"]["price"] == 60.0  # fetch failed: last known quote
+    assert prices["ITUB4"]["price"] == 30.0
@@ -0,0 +1,59 @@
+import asyncio
+
+from starlette.responses import Response
+
+import server
+from server import ComputedStateCache, DataVersions
+
+
+def test_portfolio_bump_only_moves_that_portfolio(fake_db):
+    fake_db()
+    versions = DataVersions()
+
+    async def scenario():
+        before = (await versions.get("u", "p1"), await versions.get("u", "p2"), await versions.get("u"))
+        await versions.bump("u", ["p1"])
+        after_p1 = (await versions.get("u", "p1"), await versions.get("u", "p2"), await versions.get("u"))
+        await versions.bump("u")
+        after_wide = (await versions.get("u", "p1"), await versions.get("u", "p2"), await versions.get("u"))
+        return before, after_p1, after_wide
+
+    before, after_p1, after_wide = asyncio.run(scenario())
+    assert after_p1[0] != before[0] and after_p1[1] == before[1] and after_p1[2] != before[2]
+    assert all(a != b for a, b in zip(after_wide, after_p1))
+
+
+def test_lru_evicts_by_size():
+    cache = ComputedStateCache(max_bytes=60)
+    cache.put("a", {"v": "x" * 20})
+    cache.put("b", {"v": "y" * 20})
+    assert cache.get("a") is not None  # "a" is now most recent
+    cache.put("c", {"v": "z" * 20})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.bytes <= 60 and cache.stats["evictions"] == 1
+
+    cache.put("huge", {"v": "w" * 100})
+    assert cache.get("huge") is None and cache.stats["oversized"] == 1
+
+
+def test_view_reports_hit_and_recomputes_after_bump(fake_db, monkeypatch):
+    fake_db()
+    monkeypatch.setattr(server, "portfolio_cache", ComputedStateCache(max_bytes=1024))
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"total": len(calls)}
+
+    async def scenario():
+        headers = []
+        for bump in (False, False, True):
+            if bump:
+                await server.data_versions.bump("u", ["p1"])
+            response = Response()
+            value = await server.cached_portfolio_view("u", "p1", "summary", compute, response)
+            headers.append((response.headers["X-Cache"], value["total"]))
+        return headers
+
+    assert asyncio.run(scenario()) == [("MISS", 1), ("HIT", 1), ("MISS", 2)]
@@ -0,0 +1,65 @@
+import random
+import pytest
+
+from server import (
+    LEDGER_UNDATED,
+    build_position_series,
+    compute_ledger_evolution,
+    compute_portfolio_evolution,
+    ledger_changes,
+)
+from tests.test_evolution import TODAY, random_portfolio
+
+
+def ledger_points(stocks):
+    grouped = {}
+    for lot in stocks:
+        grouped.setdefault((lot.get("portfolio_id"), lot["ticker"]), []).append(lot)
+    points = []
+    for (portfolio_id, ticker), lots in grouped.items():
+        points.extend({"portfolio_id": portfolio_id, "ticker": ticker, **p} for p in build_position_series(lots))
+    return sorted(points, key=lambda p: p["date"])
+
+
+def test_series_is_cumulative_and_separates_bonus():
+    lots = [
+        {"quantity": 100, "average_price": 10.0, "purchase_date": "2024-01-10"},
+        {"quantity": 10, "average_price": 0, "purchase_date": "2024-06-01", "operation_type": "bonificacao"},
+        {"quantity": 50, "average_price": 12.0, "purchase_date": "2024-01-10"},
+        {"quantity": 5, "average_price": 8.0, "purchase_date": None},
+    ]
+    series = build_position_series(lots)
+    assert [p["date"] for p in series] == [LEDGER_UNDATED, "2024-01-10", "2024-06-01"]
+    assert series[1]["quantity"] == 155 and series[1]["cost"] == 1640.0 and series[1]["lots"] == 3
+    assert series[2]["bonus_quantity"] == 10 and series[2]["cost"] == 1640.0 and series[2]["quantity"] == 165
+
+
+def test_changes_keep_earliest_date_per_series():
+    changes = ledger_changes([
+        {"portfolio_id": "p", "ticker": "PETR4", "purchase_date": "2024-05-01"},
+        {"portfolio_id": "p", "ticker": "PETR4", "purchase_date": "2023-02-01"},
+        {"portfolio_id": "q", "ticker": "PETR4", "purchase_date": "bad"},
+    ])
+    assert changes == {("p", "PETR4"): "2023-02-01", ("q", "PETR4"): LEDGER_UNDATED}
+
+
+@pytest.mark.parametrize("period", ["1m", "12m", "max"])
+@pytest.mark.parametrize("seed", range(3))
+def test_ledger_evolution_matches_lots(period, seed):
+    stocks, dividends = random_portfolio(seed)
+    # Refresh writes one price per ticker on every lot
+    rng = random.Random(seed)
+    prices = {t: round(rng.uniform(5, 120), 2) for t in {s["ticker"] for s in stocks}}
+    for i, lot in enumerate(stocks):
+        lot["current_price"] = prices[lot["ticker"]]
+        lot["portfolio_id"] = "p1" if i % 2 else "p2"
+
+    expected = compute_portfolio_evolution(stocks, dividends, period, TODAY)
+    actual = compute_ledger_evolution(ledger_points(stocks), prices, dividends, period, TODAY)
+
+    assert [p["date"] for p in actual] == [p["date"] for p in expected]
+    for got, want in zip(actual, expected):
+        for field, value in want.items():
+            if field != "date":
+                assert got[field] == pytest.approx(value, abs=0.011)
+
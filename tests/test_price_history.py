@@ -0,0 +1,84 @@
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+
+import server
+from server import PriceHistoryStore, compute_ledger_evolution
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class FakeClient:
+    def __init__(self, payload):
+        self.payload = payload
+        self.params = None
+
+    async def get(self, url, params=None):
+        self.params = params
+        return FakeResponse(self.payload)
+
+
+def test_parses_chart_bars_in_exchange_time(monkeypatch):
+    # 13:00 UTC on two consecutive days, the second with a missing close
+    ts = int(datetime(2025, 12, 31, 13, 0, tzinfo=timezone.utc).timestamp())
+    payload = {"chart": {"result": [{
+        "meta": {"gmtoffset": -10800},
+        "timestamp": [ts, ts + 86400, ts + 2 * 86400],
+        "indicators": {"quote": [{
+            "open": [10.0, 10.5, 11.0], "high": [10.8, 11.0, 11.2], "low": [9.9, 10.1, 10.9],
+            "close": [10.5, None, 11.1], "volume": [1000, 0, 1200],
+        }]},
+    }]}}
+    client = FakeClient(payload)
+    monkeypatch.setattr(server.http_clients, "get", lambda provider: client)
+
+    bars = asyncio.run(server.fetch_yahoo_price_history("PETR4", date(2025, 12, 31).toordinal()))
+
+    assert [b[0] for b in bars] == ["2025-12-31", "2026-01-02"]
+    assert bars[1][4] == 11.1
+    assert "period1" in client.params and "range" not in client.params
+
+
+def test_backfill_groups_bars_by_year_and_skips_today(fake_db, monkeypatch):
+    fake = fake_db()
+    today = datetime.now(server.BRASIL_TZ).date()
+    days = [today - timedelta(days=400), today - timedelta(days=2), today]
+    bars = [(d.strftime("%Y-%m-%d"), 1.0, 1.0, 1.0, 1.0, 100) for d in days]
+
+    async def fake_fetch(ticker, start_ord=None):
+        assert start_ord is None  # nothing stored yet: full range
+        return bars
+
+    monkeypatch.setattr(server, "fetch_yahoo_price_history", fake_fetch)
+    store = PriceHistoryStore(interval=3600)
+
+    assert asyncio.run(store.sync_ticker("VALE3")) == 2
+    # 400 days apart: one document per year
+    years = sorted(fake.price_history.docs, key=lambda doc: doc["year"])
+    assert [doc["dates"] for doc in years] == [[bars[0][0]], [bars[1][0]]]
+    assert years[1]["close"] == [1.0]
+    assert store.stats["backfilled"] == 1
+
+
+def test_evolution_marks_past_dates_to_stored_closes():
+    today = date(2026, 3, 10)
+    start = today - timedelta(days=3)
+    points = [{"portfolio_id": "p", "ticker": "ITSA4", "date": start.strftime("%Y-%m-%d"),
+               "quantity": 10.0, "cost": 100.0, "book_value": 100.0, "lots": 1}]
+    history = {"ITSA4": (
+        np.asarray([start.toordinal(), start.toordinal() + 1], dtype=np.int64),
+        np.asarray([11.0, 12.0]),
+    )}
+
+    evolution = compute_ledger_evolution(points, {"ITSA4": 15.0}, [], "1m", today, history)
+
+    # Day 2 carries day 1's close forward; today uses the current price
+    assert [p["current"] for p in evolution] == [110.0, 120.0, 120.0, 150.0]
+    assert all(p["invested"] == 100.0 for p in evolution)
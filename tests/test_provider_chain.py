@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from server import CircuitBreaker, ProviderChain, QuoteProvider
+
+
+def quote(ticker, source):
+    return {"ticker": ticker, "price": 10.0, "source": source}
+
+
+def make_provider(name, priority, delay=0.0, result=True, calls=None):
+    async def fetch(ticker):
+        if calls is not None:
+            calls.append(name)
+        await asyncio.sleep(delay)
+        return quote(ticker, name) if result else None
+
+    return QuoteProvider(name, fetch, priority)
+
+
+def test_failover_to_next_provider():
+    calls = []
+    chain = ProviderChain(
+        [make_provider("a", 0, result=False, calls=calls), make_provider("b", 1, calls=calls)],
+        deadline=2, hedge_percentile=0.9,
+    )
+    result = asyncio.run(chain.fetch("PETR4"))
+    assert result["source"] == "b"
+    assert calls == ["a", "b"]
+
+
+def test_slow_provider_is_hedged(monkeypatch):
+    import server
+    monkeypatch.setattr(server, "QUOTE_HEDGE_DEFAULT_DELAY", 0.05)
+    chain = ProviderChain(
+        [make_provider("slow", 0, delay=1.0), make_provider("fast", 1)],
+        deadline=2, hedge_percentile=0.9,
+    )
+    started = time.monotonic()
+    result = asyncio.run(chain.fetch("PETR4"))
+    assert result["source"] == "fast"
+    assert time.monotonic() - started < 0.5
+    assert chain.stats["hedges"] == 1
+
+
+def test_deadline_bounds_the_request(monkeypatch):
+    import server
+    monkeypatch.setattr(server, "QUOTE_HEDGE_DEFAULT_DELAY", 5)
+    chain = ProviderChain([make_provider("slow", 0, delay=1.0)], deadline=0.1, hedge_percentile=0.9)
+    started = time.monotonic()
+    assert asyncio.run(chain.fetch("PETR4")) is None
+    assert time.monotonic() - started < 0.5
+    assert chain.stats["deadline_exceeded"] == 1
+
+
+def test_open_breaker_skips_provider():
+    calls = []
+    failing = make_provider("a", 0, result=False, calls=calls)
+    chain = ProviderChain([failing, make_provider("b", 1, calls=calls)], deadline=2, hedge_percentile=0.9)
+    for _ in range(failing.breaker.failure_threshold):
+        failing.record(False, 0.01)
+    assert failing.breaker.state == "open"
+    calls.clear()
+    assert asyncio.run(chain.fetch("PETR4"))["source"] == "b"
+    assert calls == ["b"]
+
+
+def test_breaker_half_open_allows_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_reorders_by_observed_latency_and_success():
+    chain = ProviderChain([make_provider("a", 0), make_provider("b", 1)], deadline=2, hedge_percentile=0.9)
+    a, b = chain.providers
+    for _ in range(QuoteProvider.MIN_SAMPLES):
+        a.record(False, 2.0)
+        b.record(True, 0.1)
+    assert [p.name for p in chain.ordered()] == ["b", "a"]
+
+
+def test_hanging_provider_moves_down_and_opens_breaker(monkeypatch):
+    import server
+    monkeypatch.setattr(server, "QUOTE_HEDGE_DEFAULT_DELAY", 0.02)
+    hanging, fast = make_provider("hanging", 0, delay=30.0), make_provider("fast", 1)
+    chain = ProviderChain([hanging, fast], deadline=2, hedge_percentile=0.9)
+
+    async def run():
+        for _ in range(hanging.breaker.failure_threshold):
+            assert (await chain.fetch("PETR4"))["source"] == "fast"
+        await asyncio.sleep(0)  # let the cancelled calls record their outcome
+
+    asyncio.run(run())
+    assert len(hanging.latencies) == hanging.breaker.failure_threshold
+    assert hanging.success_rate < fast.success_rate
+    assert hanging.breaker.state == "open"
+    assert [p.name for p in chain.ordered()] == ["fast", "hanging"]
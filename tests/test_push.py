@@ -0,0 +1,73 @@
+import asyncio
+import json
+import time
+
+import server
+from server import MarketDataIngestor, PushHub
+
+
+def parse(chunk):
+    fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines() if not line.startswith(":"))
+    return fields.get("event"), json.loads(fields["data"]) if "data" in fields else None
+
+
+def test_hub_fans_out_and_drops_oldest_for_slow_clients():
+    hub = PushHub(queue_size=2)
+    a = hub.subscribe(["price:PETR4"])
+    b = hub.subscribe(["price:PETR4", "price:VALE3"])
+
+    for price in (1, 2, 3):
+        hub.publish("price:PETR4", {"price": price})
+    hub.publish("price:ITUB4", {"price": 9})  # nobody listens
+
+    assert [a.get_nowait()[1]["price"] for _ in range(2)] == [2, 3]
+    assert b.qsize() == 2 and hub.stats["dropped"] == 2
+
+    hub.unsubscribe(a)
+    hub.unsubscribe(b)
+    assert hub.snapshot()["connections"] == 0 and hub.snapshot()["topics"] == 0
+
+
+def test_ingestor_publishes_only_moved_prices(monkeypatch):
+    hub = PushHub(queue_size=10)
+    monkeypatch.setattr(server, "push_hub", hub)
+    queue = hub.subscribe(["price:PETR4"])
+    ingestor = MarketDataIngestor(interval=60)
+
+    ingestor._set_price("PETR4", {"price": 38.5})
+    ingestor._set_price("PETR4", {"price": 38.5})
+    ingestor._set_price("PETR4", {"price": 38.7})
+
+    assert [queue.get_nowait()[1]["price"] for _ in range(queue.qsize())] == [38.5, 38.7]
+
+
+def test_stream_sends_snapshot_then_live_updates(fake_db, monkeypatch):
+    fake_db(
+        stocks=[{"user_id": "u", "ticker": "PETR4", "asset_type": "acao"}],
+        alerts=[{"alert_id": "a1", "user_id": "u", "is_read": False, "created_at": "2099-01-01T00:00:00"}],
+    )
+    monkeypatch.setattr(server, "push_hub", PushHub(queue_size=10))
+    monkeypatch.setattr(server, "PUSH_HEARTBEAT_INTERVAL", 0.05)
+    ingestor = MarketDataIngestor(interval=60)
+    ingestor.prices["PETR4"] = {"ticker": "PETR4", "price": 38.5, "updated_ts": time.time()}
+    monkeypatch.setattr(server, "market_data", ingestor)
+
+    async def scenario():
+        stream = server.push_event_stream("u", None)
+        assert (await stream.__anext__()).startswith("retry:")
+        snapshot = parse(await stream.__anext__())
+        alerts = parse(await stream.__anext__())
+
+        ingestor._set_price("PETR4", {"ticker": "PETR4", "price": 39.0})
+        live = parse(await stream.__anext__())
+        heartbeat = await stream.__anext__()
+        await stream.aclose()
+        return snapshot, alerts, live, heartbeat
+
+    snapshot, alerts, live, heartbeat = asyncio.run(scenario())
+    assert snapshot == ("prices", {"quotes": [{"ticker": "PETR4", "price": 38.5, "change": None,
+                                                "change_percent": None, "updated_at": None}]})
+    assert alerts[0] == "alerts" and alerts[1]["count"] == 1
+    assert live[0] == "prices" and live[1]["quotes"][0]["price"] == 39.0
+    assert heartbeat == ": ping\n\n"
+    assert server.push_hub.snapshot()["connections"] == 0
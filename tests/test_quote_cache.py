@@ -0,0 +1,76 @@
+import asyncio
+
+from server import QuoteCache
+
+
+def test_concurrent_misses_share_one_fetch():
+    calls = []
+
+    async def loader(ticker):
+        calls.append(ticker)
+        await asyncio.sleep(0.01)
+        return {"ticker": ticker, "price": 10.0, "source": "test"}
+
+    async def run():
+        cache = QuoteCache(ttl=60, stale_ttl=300, negative_ttl=30)
+        results = await asyncio.gather(*[cache.get("PETR4", loader) for _ in range(20)])
+        return cache, results
+
+    cache, results = asyncio.run(run())
+    assert calls == ["PETR4"]
+    assert all(r["price"] == 10.0 for r in results)
+    assert cache.stats["misses"] == 20
+    assert cache.stats["coalesced"] == 19
+
+
+def test_fresh_entry_is_a_hit():
+    async def loader(ticker):
+        return {"ticker": ticker, "price": 10.0, "source": "test"}
+
+    async def run():
+        cache = QuoteCache(ttl=60, stale_ttl=300, negative_ttl=30)
+        await cache.get("VALE3", loader)
+        await cache.get("VALE3", loader)
+        return cache
+
+    cache = asyncio.run(run())
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_stale_entry_is_served_while_refreshing():
+    prices = iter([10.0, 11.0])
+
+    async def loader(ticker):
+        return {"ticker": ticker, "price": next(prices), "source": "test"}
+
+    async def run():
+        cache = QuoteCache(ttl=0, stale_ttl=300, negative_ttl=0)
+        first = await cache.get("ITUB4", loader)
+        stale = await cache.get("ITUB4", loader)
+        await asyncio.sleep(0)  # let the background refresh finish
+        entry = cache._entries["ITUB4"]["quote"]
+        return first, stale, entry, cache
+
+    first, stale, entry, cache = asyncio.run(run())
+    assert first["price"] == 10.0
+    assert stale["price"] == 10.0
+    assert entry["price"] == 11.0
+    assert cache.stats["stale_hits"] == 1
+    assert cache.stats["refreshes"] == 1
+
+
+def test_failed_fetch_is_negatively_cached():
+    calls = []
+
+    async def loader(ticker):
+        calls.append(ticker)
+        return None
+
+    async def run():
+        cache = QuoteCache(ttl=60, stale_ttl=300, negative_ttl=30)
+        assert await cache.get("XXXX3", loader) is None
+        assert await cache.get("XXXX3", loader) is None
+
+    asyncio.run(run())
+    assert calls == ["XXXX3"]
@@ -0,0 +1,89 @@
+import asyncio
+
+import server
+
+
+def test_batch_falls_back_only_for_missing_symbols(monkeypatch):
+    batch_calls = []
+    single_calls = []
+
+    async def fake_batch(tickers):
+        batch_calls.append(list(tickers))
+        return {t: {"ticker": t, "price": 1.0, "source": "yahoo_finance"} for t in tickers if t != "TAEE11"}
+
+    async def fake_chain(ticker):
+        single_calls.append(ticker)
+        return {"ticker": ticker, "price": 2.0, "source": "tradingview"}
+
+    def fake_tv_batch(tickers):
+        return {}
+
+    monkeypatch.setattr(server, "fetch_yahoo_finance_quotes_batch", fake_batch)
+    monkeypatch.setattr(server, "fetch_tradingview_quotes_batch", fake_tv_batch)
+    monkeypatch.setattr(server, "fetch_quote_from_providers", fake_chain)
+    monkeypatch.setattr(server, "quote_cache", server.QuoteCache(60, 300, 30))
+    monkeypatch.setattr(server, "QUOTE_BATCH_SIZE", 2)
+
+    quotes = asyncio.run(server.fetch_quotes_batch(["petr4", "VALE3", "TAEE11", "PETR4"]))
+
+    assert sorted(sum(batch_calls, [])) == ["PETR4", "TAEE11", "VALE3"]
+    assert all(len(c) <= 2 for c in batch_calls)
+    assert single_calls == ["TAEE11"]
+    assert quotes["PETR4"]["source"] == "yahoo_finance"
+    assert quotes["TAEE11"]["source"] == "tradingview"
+
+    # A second call is served entirely from the cache
+    batch_calls.clear()
+    asyncio.run(server.fetch_quotes_batch(["PETR4", "VALE3"]))
+    assert batch_calls == []
+
+
+def test_tradingview_batch_runs_before_per_ticker_chain(monkeypatch):
+    single_calls = []
+
+    async def fake_batch(tickers):
+        return {}
+
+    def fake_tv_batch(tickers):
+        return {t: {"ticker": t, "price": 3.0, "source": "tradingview"} for t in tickers if t == "VALE3"}
+
+    async def fake_chain(ticker):
+        single_calls.append(ticker)
+        return None
+
+    monkeypatch.setattr(server, "fetch_yahoo_finance_quotes_batch", fake_batch)
+    monkeypatch.setattr(server, "fetch_tradingview_quotes_batch", fake_tv_batch)
+    monkeypatch.setattr(server, "fetch_quote_from_providers", fake_chain)
+    monkeypatch.setattr(server, "quote_cache", server.QuoteCache(60, 300, 30))
+
+    quotes = asyncio.run(server.fetch_quotes_batch(["VALE3", "XXXX3"]))
+
+    assert quotes == {"VALE3": {"ticker": "VALE3", "price": 3.0, "source": "tradingview"}}
+    assert single_calls == ["XXXX3"]
+    assert server.blocking_executor.snapshot()["queue_depth"] == 0
+
+
+def test_only_failed_batch_requests_count_against_the_breaker(monkeypatch):
+    async def fake_batch(tickers):
+        return None if "FAIL3" in tickers else {}  # {}: request fine, symbols unknown
+
+    async def fake_chain(ticker):
+        return None
+
+    providers = server.ProviderChain(
+        [server.QuoteProvider(name, fake_chain, priority=i) for i, name in enumerate(["yahoo_finance", "tradingview"])],
+        deadline=2, hedge_percentile=0.9,
+    )
+    monkeypatch.setattr(server, "quote_providers", providers)
+    monkeypatch.setattr(server, "fetch_yahoo_finance_quotes_batch", fake_batch)
+    monkeypatch.setattr(server, "fetch_tradingview_quotes_batch", lambda tickers: {})
+    monkeypatch.setattr(server, "fetch_quote_from_providers", fake_chain)
+    monkeypatch.setattr(server, "quote_cache", server.QuoteCache(60, 300, 30))
+    yahoo = providers.provider("yahoo_finance").breaker
+
+    for _ in range(yahoo.failure_threshold + 1):
+        asyncio.run(server.fetch_quotes_batch(["DELIST3"]))
+    assert yahoo.state == "closed" and yahoo.consecutive_failures == 0
+
+    asyncio.run(server.fetch_quotes_batch(["FAIL3"]))
+    assert yahoo.consecutive_failures == 1
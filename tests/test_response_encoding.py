@@ -0,0 +1,58 @@
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+from bson import ObjectId
+from starlette.requests import Request
+from starlette.responses import Response
+
+import server
+
+
+def _request(accept="application/json"):
+    return Request({"type": "http", "headers": [(b"accept", accept.encode())]})
+
+
+def test_fast_json_matches_default_encoding_for_documents():
+    doc = {
+        "ticker": "ITSA4",
+        "name": "Itaúsa",
+        "amount": np.float64(12.5),
+        "quantity": np.int64(100),
+        "created_at": datetime(2026, 3, 1, 12, 30, tzinfo=timezone.utc),
+        "_id": ObjectId("65f000000000000000000001"),
+        "series": np.array([1.0, 2.5]),
+    }
+    body = json.loads(server.FastJSONResponse(doc).body)
+
+    assert body == {
+        "ticker": "ITSA4",
+        "name": "Itaúsa",
+        "amount": 12.5,
+        "quantity": 100,
+        "created_at": "2026-03-01T12:30:00+00:00",
+        "_id": "65f000000000000000000001",
+        "series": [1.0, 2.5],
+    }
+
+
+def test_encoded_response_keeps_headers_and_defaults_to_json():
+    injected = Response()
+    injected.headers["X-Cache"] = "HIT"
+    injected.headers["ETag"] = 'W/"abc"'
+
+    response = server.encoded_response(_request("application/msgpack"), [{"a": 1}], injected)
+
+    assert response.headers["x-cache"] == "HIT" and response.headers["etag"] == 'W/"abc"'
+    assert response.headers["vary"] == "Accept"
+    if server.msgpack is None:
+        assert response.media_type == "application/json"
+
+
+def test_msgpack_negotiation():
+    msgpack = pytest.importorskip("msgpack")
+    response = server.encoded_response(_request("application/msgpack, application/json;q=0.5"), {"d": datetime(2026, 1, 2)})
+
+    assert response.media_type == "application/msgpack"
+    assert msgpack.unpackb(response.body) == {"d": "2026-01-02T00:00:00"}
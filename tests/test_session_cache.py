@@ -0,0 +1,43 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from server import SessionCache, User
+
+
+def make_user(user_id="user_1"):
+    return User(user_id=user_id, email=f"{user_id}@example.com", name="Test")
+
+
+def test_entry_never_outlives_session_expiry():
+    cache = SessionCache(ttl=300, max_entries=10)
+    cache.put("tok", make_user(), datetime.now(timezone.utc) - timedelta(seconds=1))
+    assert cache.get("tok") is None
+
+
+def test_hit_and_ttl_expiry():
+    cache = SessionCache(ttl=0.05, max_entries=10)
+    cache.put("tok", make_user(), datetime.now(timezone.utc) + timedelta(days=7))
+    assert cache.get("tok").user_id == "user_1"
+    time.sleep(0.06)
+    assert cache.get("tok") is None
+
+
+def test_invalidate_user_drops_all_tokens():
+    cache = SessionCache(ttl=300, max_entries=10)
+    expires = datetime.now(timezone.utc) + timedelta(days=7)
+    cache.put("a", make_user(), expires)
+    cache.put("b", make_user(), expires)
+    cache.put("c", make_user("user_2"), expires)
+    cache.invalidate_user("user_1")
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_bounded_size_evicts_oldest():
+    cache = SessionCache(ttl=300, max_entries=2)
+    expires = datetime.now(timezone.utc) + timedelta(days=7)
+    for token in ("a", "b", "c"):
+        cache.put(token, make_user(token), expires)
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
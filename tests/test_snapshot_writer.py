@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from server import SnapshotWriter
+
+
+def totals(gain):
+    return {"total_invested": 100.0, "total_current": 100.0 + gain, "total_gain": gain, "stocks_count": 1}
+
+
+def test_reference_from_previous_close_is_cached(fake_db):
+    snapshots = fake_db(portfolio_snapshots=[
+        {"user_id": "u", "portfolio_id": None, "date": "2026-03-08", "total_gain": 9.0, "total_current": 109.0},
+        {"user_id": "u", "portfolio_id": None, "date": "2026-03-09", "total_gain": 12.0, "total_current": 112.0},
+    ]).portfolio_snapshots
+    writer = SnapshotWriter(interval=30)
+
+    first = asyncio.run(writer.reference("u", None, "2026-03-10", 20.0, 120.0))
+    second = asyncio.run(writer.reference("u", None, "2026-03-10", 25.0, 125.0))
+
+    assert first == second == {"reference_gain": 12.0, "reference_current": 112.0}
+    assert snapshots.calls["find_one"] == 2  # today's and the previous snapshot, once
+
+
+def test_updates_coalesce_into_one_upsert(fake_db):
+    snapshots = fake_db().portfolio_snapshots
+    writer = SnapshotWriter(interval=30)
+    reference = {"reference_gain": 5.0, "reference_current": 105.0}
+
+    for gain in (6.0, 7.0, 8.0):
+        writer.record("u", "p1", "2026-03-10", totals(gain), reference)
+    writer.record("u", None, "2026-03-10", totals(1.0), reference)
+    asyncio.run(writer.flush())
+
+    assert len(snapshots.bulk_calls) == 1
+    assert len(snapshots.docs) == 2
+    doc = next(d for d in snapshots.docs if d["portfolio_id"] == "p1")
+    assert (doc["user_id"], doc["date"], doc["total_gain"]) == ("u", "2026-03-10", 8.0)
+    assert doc["reference_gain"] == 5.0
+    assert doc["snapshot_id"].startswith("snap_")
+    assert writer.snapshot()["pending"] == 0
+
+
+def test_failed_flush_keeps_entries(fake_db):
+    fake_db().portfolio_snapshots.bulk_error = RuntimeError("down")
+    writer = SnapshotWriter(interval=30)
+    writer.record("u", None, "2026-03-10", totals(1.0), {"reference_gain": 0, "reference_current": 0})
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(writer.flush())
+    assert writer.snapshot()["pending"] == 1
@@ -0,0 +1,50 @@
+import asyncio
+
+import server
+
+LOTS = [
+    {"user_id": "u", "portfolio_id": "p", "ticker": "ITSA4", "quantity": 10, "average_price": 10.0,
+     "current_price": 12.0, "asset_type": "acao", "operation_type": "compra"},
+    # No asset_type at all: counted as "acao"
+    {"user_id": "u", "portfolio_id": "p", "ticker": "PETR4", "quantity": 5, "average_price": 30.0, "current_price": 40.0},
+    # Bonificação: free shares, current value only; no current_price falls back to average_price
+    {"user_id": "u", "portfolio_id": "p", "ticker": "ITSA4", "quantity": 2, "average_price": 9.0,
+     "asset_type": "acao", "operation_type": "bonificacao"},
+    {"user_id": "u", "portfolio_id": "p", "ticker": "MXRF11", "quantity": 100, "average_price": 10.0,
+     "current_price": 0, "asset_type": "fii"},
+    {"user_id": "u", "portfolio_id": "other", "ticker": "VALE3", "quantity": 1, "average_price": 60.0, "current_price": 70.0},
+]
+
+
+def test_totals_with_no_lots(fake_db):
+    fake_db()
+    totals = asyncio.run(server.aggregate_portfolio_totals({"user_id": "u"}))
+    assert totals == {"invested": 0, "current": 0, "count": 0, "by_type": {}}
+
+
+def test_pipeline_applies_the_lot_rules(fake_db):
+    fake_db(stocks=[dict(lot) for lot in LOTS])
+
+    totals = asyncio.run(server.aggregate_portfolio_totals({"user_id": "u", "portfolio_id": "p"}))
+
+    assert (totals["invested"], totals["current"], totals["count"]) == (1250.0, 1338.0, 4)
+    assert totals["by_type"]["acao"] == {"_id": "acao", "invested": 250.0, "current": 338.0, "count": 3}
+    assert totals["by_type"]["fii"]["current"] == 1000.0  # current_price 0 falls back too
+    # Same numbers as the in-memory path used by the dashboard
+    in_memory = server.summarize_lot_totals([lot for lot in LOTS if lot["portfolio_id"] == "p"])
+    assert {k: totals[k] for k in ("invested", "current", "count")} == {k: in_memory[k] for k in ("invested", "current", "count")}
+    assert totals["by_type"] == in_memory["by_type"]
+
+
+def test_dividend_totals_split_received_and_pending(fake_db):
+    fake_db(dividends=[
+        {"user_id": "u", "amount": 10.0, "payment_date": "2025-12-31"},
+        {"user_id": "u", "amount": 0.5, "payment_date": "2026-01-01T00:00:00"},  # same day counts as received
+        {"user_id": "u", "amount": 2.0, "payment_date": "2026-02-01"},
+        {"user_id": "u", "amount": 3.0, "payment_date": "A_DEFINIR"},
+        {"user_id": "x", "amount": 99.0, "payment_date": "2025-01-01"},
+    ])
+    assert asyncio.run(server.aggregate_dividend_totals({"user_id": "u"}, "2026-01-01")) == {"received": 10.5, "pending": 5.0}
+
+    fake_db()
+    assert asyncio.run(server.aggregate_dividend_totals({"user_id": "u"}, "2026-01-01")) == {"received": 0, "pending": 0}